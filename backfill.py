@@ -0,0 +1,155 @@
+import datetime
+import json
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, wait
+
+import pandas as pd
+
+from bbg_session import RequestError, get_session_manager
+from bond_future_prices import BAR_FIELDS, append_bars, compact_bars, process_response
+
+# Backfill settings
+CHUNK = datetime.timedelta(days=1)  # Request size, one trading day of bars per request
+MAX_IN_FLIGHT = 4  # Concurrent requests on the session
+MAX_RETRIES = 3  # Attempts per chunk before giving up on it
+REQUEST_TIMEOUT = 120  # Seconds without a final response before a chunk request is cancelled and retried
+CHECKPOINT_DIR = 'backfill_checkpoints'  # Directory for the completed-chunk checkpoints
+
+
+def chunk_range(start_date, end_date, chunk=CHUNK):
+    """Split [start_date, end_date] into consecutive (start, end) datetime chunks."""
+    start = pd.Timestamp(start_date).to_pydatetime()
+    end = pd.Timestamp(end_date).to_pydatetime() + datetime.timedelta(days=1) - datetime.timedelta(milliseconds=1)
+    chunks = []
+    while start <= end:
+        chunk_end = min(start + chunk - datetime.timedelta(milliseconds=1), end)
+        chunks.append((start, chunk_end))
+        start = start + chunk
+    return chunks
+
+
+def chunk_key(chunk):
+    return chunk[0].strftime('%Y-%m-%dT%H:%M:%S')
+
+
+def load_checkpoint(checkpoint_file):
+    """Keys of the chunks already stored by an earlier run."""
+    if os.path.exists(checkpoint_file):
+        with open(checkpoint_file) as f:
+            return set(json.load(f)['completed'])
+    return set()
+
+
+def save_checkpoint(checkpoint_file, completed):
+    """Write the checkpoint atomically so an interrupted run never leaves it half written."""
+    os.makedirs(os.path.dirname(checkpoint_file) or '.', exist_ok=True)
+    tmp_file = checkpoint_file + '.tmp'
+    with open(tmp_file, 'w') as f:
+        json.dump({'completed': sorted(completed)}, f)
+    os.replace(tmp_file, checkpoint_file)
+
+
+def create_bar_request(manager, ticker, chunk, interval):
+    request = manager.create_request("IntradayBarRequest")
+    request.getElement("security").setValue(ticker)
+    request.getElement("eventType").setValue("TRADE")
+    request.set("startDateTime", chunk[0].strftime('%Y-%m-%dT%H:%M:%S.000Z'))
+    request.set("endDateTime", chunk[1].strftime('%Y-%m-%dT%H:%M:%S.999Z'))
+    request.set("interval", interval)
+    return request
+
+
+class Backfill:
+    """
+    Chunked historical backfill of intraday bars over the shared session.
+
+    Up to max_in_flight chunk requests are outstanding at once, multiplexed by the session manager. Partial
+    responses are decoded as they arrive, each completed chunk is handed to writer and recorded in the
+    checkpoint file, so an interrupted backfill resumes with the chunks still missing. finish is called once
+    at the end of a run. The default writer appends each chunk to the intraday store and the default finish
+    merges the appended Parquet parts. A request without its final response after request_timeout seconds is
+    cancelled and counts as a failed attempt.
+    """
+
+    def __init__(self, manager, ticker, interval=1, fields=None, writer=None, checkpoint_file=None,
+                 chunk=CHUNK, max_in_flight=MAX_IN_FLIGHT, finish=None, request_timeout=REQUEST_TIMEOUT):
+        self.manager = manager
+        self.ticker = ticker
+        self.interval = interval
+        self.fields = fields or BAR_FIELDS
+        self.writer = writer or (lambda bars: append_bars(bars, ticker, interval))
+        if finish is None and writer is None:
+            finish = lambda: compact_bars(ticker, interval)
+        self.finish = finish
+        self.checkpoint_file = checkpoint_file or os.path.join(
+            CHECKPOINT_DIR, f"{ticker.replace(' ', '_')}_{interval}m.json")
+        self.chunk = chunk
+        self.max_in_flight = max_in_flight
+        self.request_timeout = request_timeout
+
+    def decode(self, msg):
+        return process_response([msg], self.fields)
+
+    def run(self, start_date, end_date):
+        """Backfill the range and return the keys of chunks that failed after all retries."""
+        completed = load_checkpoint(self.checkpoint_file)
+        pending = [c for c in chunk_range(start_date, end_date, self.chunk) if chunk_key(c) not in completed]
+        attempts = {}
+        in_flight = {}  # future -> chunk
+        failed = []
+        try:
+            self.fetch(pending, in_flight, attempts, completed, failed)
+        finally:
+            if self.finish is not None:
+                self.finish()
+        return failed
+
+    def fetch(self, pending, in_flight, attempts, completed, failed):
+        sent = {}  # future -> send time
+        while pending or in_flight:
+            while pending and len(in_flight) < self.max_in_flight:
+                chunk = pending.pop(0)
+                attempts[chunk_key(chunk)] = attempts.get(chunk_key(chunk), 0) + 1
+                request = create_bar_request(self.manager, self.ticker, chunk, self.interval)
+                future = self.manager.send(request, on_message=self.decode)
+                in_flight[future], sent[future] = chunk, time.monotonic()
+
+            oldest = min(sent[future] for future in in_flight)
+            wait(in_flight, timeout=max(oldest + self.request_timeout - time.monotonic(), 0),
+                 return_when=FIRST_COMPLETED)
+            for future in in_flight:
+                if not future.done() and time.monotonic() - sent[future] >= self.request_timeout:
+                    # Stale, e.g. a partial stream that never finished, fails like a rejected request
+                    self.manager.cancel(future, "Request timed out")
+            done = [future for future in in_flight if future.done()]
+            for future in done:
+                del sent[future]
+                chunk = in_flight.pop(future)
+                try:
+                    frames = future.result()
+                except RequestError:
+                    # Request failed, retry the chunk from scratch
+                    if attempts[chunk_key(chunk)] < MAX_RETRIES:
+                        pending.append(chunk)
+                    else:
+                        failed.append(chunk_key(chunk))
+                    continue
+                self.complete(chunk, frames, completed)
+
+    def complete(self, chunk, frames, completed):
+        bars = pd.concat(frames) if len(frames) > 1 else frames[0]
+        if len(bars):
+            self.writer(bars)
+        completed.add(chunk_key(chunk))
+        save_checkpoint(self.checkpoint_file, completed)
+
+
+def backfill_intraday_bond_future_data(ticker, start_date, end_date, interval=1, **kwargs):
+    """Backfill a range of intraday bars into the intraday store."""
+    return Backfill(get_session_manager(), ticker, interval, **kwargs).run(start_date, end_date)
+
+
+if __name__ == "__main__":
+    failed_chunks = backfill_intraday_bond_future_data('TYA Comdty', '2023-01-01', '2023-08-31')
+    print(f"Failed chunks: {failed_chunks}")
@@ -0,0 +1,214 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+# Anomaly thresholds, overridable per scanner
+DEFAULT_THRESHOLDS = {
+    'net_basis_vs_option': 0.01,  # CTD net basis above the option-implied delivery option value (price points)
+    'implied_repo_spread': 0.0025,  # CTD implied repo away from the market repo rate (decimal)
+}
+FUTURE_ROOTS = ['ZT', 'ZF', 'ZN', 'ZB']
+
+BASKET_COLUMNS = ['contract', 'bond', 'coupon', 'conversion_factor', 'accrued_now', 'accrued_delivery',
+                  'days_to_delivery', 'interim_coupon', 'days_after_coupon']
+
+
+def gross_basis(bond_price, futures_price, conversion_factor):
+    """Gross basis of each deliverable, clean price less the converted futures price."""
+    return bond_price - futures_price * conversion_factor
+
+
+def carry(bond_price, accrued_now, accrued_delivery, repo_rate, days, interim_coupon=0.0, days_after_coupon=0.0):
+    """
+    Coupon income less repo financing of the dirty price up to delivery.
+
+    A coupon paid before delivery resets the accrual, it is added back and reinvested at repo for the
+    days_after_coupon left to delivery, as in ctd.CTDEngine.forward_price.
+    """
+    income = accrued_delivery - accrued_now + interim_coupon * (1 + repo_rate * days_after_coupon / 360.0)
+    return income - (bond_price + accrued_now) * repo_rate * days / 360.0
+
+
+def implied_repo(bond_price, futures_price, conversion_factor, accrued_now, accrued_delivery, days,
+                 interim_coupon=0.0, days_after_coupon=0.0):
+    """Repo rate earned by buying the bond and delivering it into the future, with any coupon reinvested."""
+    invoice = futures_price * conversion_factor + accrued_delivery
+    dirty = bond_price + accrued_now
+    return (invoice + interim_coupon - dirty) / (dirty * days / 360.0 - interim_coupon * days_after_coupon / 360.0)
+
+
+class BasisScanner:
+    """
+    Incremental basis scanner over the deliverable baskets of every listed contract month.
+
+    basket has one row per (contract, bond) pair with the columns in BASKET_COLUMNS. Prices arrive as ticks
+    keyed by futures contract or bond identifier and only the rows they touch are recomputed.
+    """
+
+    def __init__(self, basket, repo_rates, thresholds=None, on_anomaly=None):
+        self.basket = basket.reset_index(drop=True)[BASKET_COLUMNS].copy()
+        self.thresholds = dict(DEFAULT_THRESHOLDS, **(thresholds or {}))
+        self.on_anomaly = on_anomaly
+
+        self.contract = self.basket['contract'].to_numpy()
+        self.bond = self.basket['bond'].to_numpy()
+        self.cf = self.basket['conversion_factor'].to_numpy(dtype=float)
+        self.accrued_now = self.basket['accrued_now'].to_numpy(dtype=float)
+        self.accrued_delivery = self.basket['accrued_delivery'].to_numpy(dtype=float)
+        self.days = self.basket['days_to_delivery'].to_numpy(dtype=float)
+        self.interim_coupon = self.basket['interim_coupon'].to_numpy(dtype=float)
+        self.days_after_coupon = self.basket['days_after_coupon'].to_numpy(dtype=float)
+        self.repo = pd.Series(repo_rates).reindex(self.contract).to_numpy(dtype=float)
+
+        n = len(self.basket)
+        self.futures_price = np.full(n, np.nan)
+        self.bond_price = np.full(n, np.nan)
+        self.gross_basis = np.full(n, np.nan)
+        self.net_basis = np.full(n, np.nan)
+        self.implied_repo = np.full(n, np.nan)
+        self.option_implied = {}
+
+        # Rows touched by a tick on each futures contract or bond
+        self.rows = {}
+        for key in np.concatenate([self.contract, self.bond]):
+            self.rows.setdefault(key, [])
+        for i, (contract, bond) in enumerate(zip(self.contract, self.bond)):
+            self.rows[contract].append(i)
+            self.rows[bond].append(i)
+        self.rows = {key: np.array(rows) for key, rows in self.rows.items()}
+        self.contract_rows = {contract: self.rows[contract] for contract in np.unique(self.contract)}
+
+    def set_option_implied(self, contract, delivery_option_value):
+        """Delivery option value implied from the options market for one contract."""
+        self.option_implied[contract] = delivery_option_value
+
+    def update_prices(self, prices):
+        """Apply a batch of {symbol: price} updates without recomputing."""
+        touched = []
+        for symbol, price in prices.items():
+            rows = self.rows.get(symbol)
+            if rows is None:
+                continue
+            if symbol in self.contract_rows:
+                self.futures_price[rows] = price
+            else:
+                self.bond_price[rows] = price
+            touched.append(rows)
+        return np.unique(np.concatenate(touched)) if touched else np.array([], dtype=int)
+
+    def recompute(self, rows):
+        """Recompute basis and implied repo for the given rows only."""
+        F, P = self.futures_price[rows], self.bond_price[rows]
+        cf, ai_now, ai_del, days = self.cf[rows], self.accrued_now[rows], self.accrued_delivery[rows], self.days[rows]
+        coupon, days_after = self.interim_coupon[rows], self.days_after_coupon[rows]
+        self.gross_basis[rows] = gross_basis(P, F, cf)
+        self.net_basis[rows] = self.gross_basis[rows] - carry(P, ai_now, ai_del, self.repo[rows], days, coupon,
+                                                              days_after)
+        self.implied_repo[rows] = implied_repo(P, F, cf, ai_now, ai_del, days, coupon, days_after)
+
+    def check(self, contracts, timestamp=None):
+        """Compare the CTD of each contract against the option-implied value and the repo market."""
+        anomalies = []
+        for contract in contracts:
+            rows = self.contract_rows[contract]
+            if np.all(np.isnan(self.implied_repo[rows])):
+                continue
+            ctd = rows[np.nanargmax(self.implied_repo[rows])]
+            net_basis = self.net_basis[ctd]
+            repo_spread = self.implied_repo[ctd] - self.repo[ctd]
+
+            option_value = self.option_implied.get(contract)
+            if option_value is not None and abs(net_basis - option_value) > self.thresholds['net_basis_vs_option']:
+                # Rich basis: short futures and long bonds, cheap basis the other way round
+                side = 'sell basis' if net_basis > option_value else 'buy basis'
+                anomalies.append(self._anomaly(timestamp, contract, ctd, 'net_basis_vs_option',
+                                               net_basis - option_value, side))
+            if abs(repo_spread) > self.thresholds['implied_repo_spread']:
+                side = 'buy basis' if repo_spread > 0 else 'sell basis'
+                anomalies.append(self._anomaly(timestamp, contract, ctd, 'implied_repo_spread', repo_spread, side))
+
+        if self.on_anomaly is not None:
+            for anomaly in anomalies:
+                self.on_anomaly(anomaly)
+        return anomalies
+
+    def _anomaly(self, timestamp, contract, row, kind, value, side):
+        return {'timestamp': timestamp, 'contract': contract, 'bond': self.bond[row], 'kind': kind,
+                'value': value, 'threshold': self.thresholds[kind], 'action': side,
+                'gross_basis': self.gross_basis[row], 'net_basis': self.net_basis[row],
+                'implied_repo': self.implied_repo[row]}
+
+    def on_tick(self, symbol, price, timestamp=None):
+        """Update one price and rescan the contracts it belongs to."""
+        return self.on_ticks({symbol: price}, timestamp)
+
+    def on_ticks(self, prices, timestamp=None):
+        """Update a batch of prices and rescan only the contracts they touch."""
+        rows = self.update_prices(prices)
+        if rows.size == 0:
+            return []
+        self.recompute(rows)
+        return self.check(np.unique(self.contract[rows]), timestamp)
+
+    def scan(self, timestamp=None):
+        """Full pass over every contract month of every root."""
+        self.recompute(np.arange(len(self.basket)))
+        return self.check(list(self.contract_rows), timestamp)
+
+    def snapshot(self):
+        """Current basis analytics for the whole basket."""
+        snapshot = self.basket[['contract', 'bond']].copy()
+        snapshot['futures_price'] = self.futures_price
+        snapshot['bond_price'] = self.bond_price
+        snapshot['gross_basis'] = self.gross_basis
+        snapshot['net_basis'] = self.net_basis
+        snapshot['implied_repo'] = self.implied_repo
+        return snapshot
+
+    def replay(self, history):
+        """
+        Replay stored ticks through the scanner for backtesting the signal.
+
+        history has columns timestamp, symbol, price. Ticks sharing a timestamp are applied together.
+        """
+        anomalies = []
+        history = history.sort_values('timestamp', kind='stable')
+        for timestamp, ticks in history.groupby('timestamp', sort=False):
+            anomalies.extend(self.on_ticks(dict(zip(ticks['symbol'], ticks['price'])), timestamp))
+        return pd.DataFrame(anomalies)
+
+
+def load_tick_history(parquet_dir, tables, price_column='Close'):
+    """Stack stored intraday bars into (timestamp, symbol, price) ticks, tables maps symbol to table name."""
+    frames = []
+    for symbol, table_name in tables.items():
+        parquet_file = os.path.join(parquet_dir, f"{table_name}.parquet")
+        if not os.path.exists(parquet_file):
+            continue
+        bars = pd.read_parquet(parquet_file, engine='pyarrow', columns=[price_column])
+        frames.append(pd.DataFrame({'timestamp': bars.index, 'symbol': symbol,
+                                    'price': bars[price_column].to_numpy()}))
+    if not frames:
+        return pd.DataFrame(columns=['timestamp', 'symbol', 'price'])
+    return pd.concat(frames, ignore_index=True)
+
+
+if __name__ == "__main__":
+    basket = pd.DataFrame({
+        'contract': ['ZNZ3', 'ZNZ3', 'ZNZ3', 'ZBZ3', 'ZBZ3'],
+        'bond': ['T 4 02/15/34', 'T 3.875 08/15/33', 'T 4.5 11/15/33', 'T 4.375 08/15/43', 'T 4 11/15/42'],
+        'coupon': [4.0, 3.875, 4.5, 4.375, 4.0],
+        'conversion_factor': [0.8513, 0.8461, 0.8822, 0.7412, 0.7011],
+        'accrued_now': [0.22, 0.31, 1.71, 0.33, 1.52],
+        'accrued_delivery': [1.16, 1.22, 0.55, 1.36, 0.49],
+        'days_to_delivery': [85, 85, 85, 85, 85],
+        'interim_coupon': [0.0, 0.0, 2.25, 0.0, 2.0],  # November coupons paid before delivery
+        'days_after_coupon': [0, 0, 44, 0, 44],
+    })
+    scanner = BasisScanner(basket, {'ZNZ3': 0.053, 'ZBZ3': 0.053}, on_anomaly=print)
+    scanner.set_option_implied('ZNZ3', 0.05)
+    scanner.on_ticks({'ZNZ3': 109.25, 'ZBZ3': 118.5, 'T 4 02/15/34': 94.1, 'T 3.875 08/15/33': 93.6,
+                      'T 4.5 11/15/33': 97.9, 'T 4.375 08/15/43': 89.2, 'T 4 11/15/42': 84.3})
+    scanner.on_tick('ZNZ3', 109.5)
+    print(scanner.snapshot())
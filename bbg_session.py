@@ -0,0 +1,265 @@
+import asyncio
+import itertools
+import threading
+import time
+from concurrent.futures import Future, InvalidStateError
+
+import blpapi
+
+from request_scheduler import TransientError
+
+# Session settings
+SERVER_HOST = "localhost"
+SERVER_PORT = 8194  # Default port for Bloomberg's API
+SERVICES = ["//blp/refdata", "//blp/mktdata"]
+RECONNECT_DELAYS = [0.5, 1, 2, 5, 10]  # Seconds between reconnection attempts, the last one repeats
+
+SESSION_DOWN = {"SessionTerminated", "SessionConnectionDown", "SessionStartupFailure"}
+TRANSIENT_CATEGORIES = {"LIMIT", "TIMEOUT"}  # Request error categories worth retrying, e.g. not BAD_SECURITY
+
+_manager = None
+_manager_lock = threading.Lock()
+
+
+class RequestError(Exception):
+    """A request was rejected by Bloomberg or the session failed for good."""
+
+
+class TransientRequestError(RequestError, TransientError):
+    """A request rejected for a reason that may clear, e.g. throttling or a timeout."""
+
+
+def request_error(msg):
+    """RequestError of a failed request message, transient by the category of its error."""
+    try:
+        reason = msg.getElement("responseError" if msg.hasElement("responseError") else "reason")
+        category = reason.getElementAsString("category")
+    except Exception:
+        category = None
+    return (TransientRequestError if category in TRANSIENT_CATEGORIES else RequestError)(str(msg))
+
+
+class SessionManager:
+    """
+    One long-lived Bloomberg session with its services open, shared by every request in the process.
+
+    Requests are multiplexed over the session by correlation ID and their responses are routed back from the
+    session's event thread to a Future. When the session drops it is restarted and the outstanding requests are
+    sent again, so callers only see the delay.
+    """
+
+    def __init__(self, host=SERVER_HOST, port=SERVER_PORT, services=None):
+        self.host = host
+        self.port = port
+        self.services = list(services or SERVICES)
+        self.session = None
+        self.service_handles = {}  # service name -> Service of the latest opened session, for creating requests
+        self.pending = {}  # correlation id value -> (request, on_message, future, results)
+        self.subscribers = []  # Event handlers for non-request events, e.g. subscription data
+        self.subscriptions = {}  # correlation id value -> (topic, fields, options), restored on reconnect
+        self.lock = threading.RLock()
+        self.ids = itertools.count(1)
+        self.stopping = False
+        self.reconnecting = False
+
+    def start(self):
+        """Start the session and open the services, returns False if Bloomberg is unreachable."""
+        session = self._open_session()
+        if session is None:
+            return False
+        self._install(session)
+        return True
+
+    def _install(self, session):
+        self.session = session
+        self.service_handles = {service: session.getService(service) for service in self.services}
+
+    def _open_session(self):
+        session_options = blpapi.SessionOptions()
+        session_options.setServerHost(self.host)
+        session_options.setServerPort(self.port)
+        session = blpapi.Session(session_options, self._on_event)
+        if not session.start():
+            return None
+        for service in self.services:
+            if not session.openService(service):
+                print(f"Failed to open {service} service.")
+                session.stop()
+                return None
+        return session
+
+    def stop(self):
+        self.stopping = True
+        if self.session is not None:
+            self.session.stop()
+            self.session = None
+        with self.lock:
+            for _, _, future, _ in self.pending.values():
+                future.set_exception(RequestError("Session stopped"))
+            self.pending.clear()
+
+    def create_request(self, request_type, service="//blp/refdata"):
+        """New request of a service, from the kept Service so it also works while the session is reconnecting."""
+        with self.lock:
+            handle = self.service_handles[service]
+        return handle.createRequest(request_type)
+
+    def send(self, request, on_message=None):
+        """
+        Send a request and return a Future of its decoded messages.
+
+        on_message is called on the event thread with every partial and final response message and the Future
+        resolves to the list of its return values, or of the raw messages without it.
+        """
+        correlation_id = blpapi.CorrelationId(next(self.ids))
+        future = Future()
+        with self.lock:
+            # Register before sending, the response can arrive before sendRequest returns
+            self.pending[correlation_id.value()] = (request, on_message, future, [])
+            # While reconnecting the request only waits in pending, the reconnect sends it once on the new session
+            if not self.reconnecting:
+                self.session.sendRequest(request, correlationId=correlation_id)
+        return future
+
+    def cancel(self, future, reason="Request cancelled"):
+        """Stop waiting for a sent request, its Future fails with RequestError and late messages are dropped."""
+        with self.lock:
+            for correlation_id, (_, _, pending_future, _) in list(self.pending.items()):
+                if pending_future is future:
+                    del self.pending[correlation_id]
+                    if not self.reconnecting:
+                        self.session.cancel(blpapi.CorrelationId(correlation_id))
+                    break
+        try:
+            future.set_exception(RequestError(reason))
+        except InvalidStateError:
+            pass  # Completed meanwhile
+
+    def request(self, request, on_message=None, timeout=None):
+        """Send a request and wait for its result."""
+        return self.send(request, on_message).result(timeout)
+
+    async def request_async(self, request, on_message=None):
+        """Send a request and await its result without blocking the event loop."""
+        return await asyncio.wrap_future(self.send(request, on_message))
+
+    def subscribe_events(self, handler):
+        """Receive every event that is not a request response, e.g. //blp/mktdata updates."""
+        self.subscribers.append(handler)
+
+    def subscribe(self, topics):
+        """
+        Subscribe to (topic, fields, options, correlation id value) tuples on the session.
+
+        Subscriptions are remembered and re-established after a reconnect, their data arrives at the handlers
+        registered with subscribe_events(). While reconnecting they are only recorded, the reconnect subscribes
+        them on the new session.
+        """
+        subscriptions = blpapi.SubscriptionList()
+        with self.lock:
+            for topic, fields, options, correlation_id in topics:
+                self.subscriptions[correlation_id] = (topic, fields, options)
+                subscriptions.add(topic, fields, options, blpapi.CorrelationId(correlation_id))
+            if not self.reconnecting:
+                self.session.subscribe(subscriptions)
+
+    def unsubscribe(self, correlation_ids):
+        subscriptions = blpapi.SubscriptionList()
+        with self.lock:
+            for correlation_id in correlation_ids:
+                topic, fields, options = self.subscriptions.pop(correlation_id)
+                subscriptions.add(topic, fields, options, blpapi.CorrelationId(correlation_id))
+            # While reconnecting there is nothing to cancel, the reconnect only restores the remaining ones
+            if not self.reconnecting:
+                self.session.unsubscribe(subscriptions)
+
+    def _on_event(self, event, session):
+        event_type = event.eventType()
+        if event_type in (blpapi.Event.PARTIAL_RESPONSE, blpapi.Event.RESPONSE, blpapi.Event.REQUEST_STATUS):
+            for msg in event:
+                self._on_response(event_type, msg)
+        elif event_type == blpapi.Event.SESSION_STATUS:
+            for msg in event:
+                if str(msg.messageType()) in SESSION_DOWN and not self.stopping and session is self.session:
+                    self._start_reconnect()
+        if event_type not in (blpapi.Event.PARTIAL_RESPONSE, blpapi.Event.RESPONSE):
+            for handler in self.subscribers:
+                handler(event, session)
+
+    def _on_response(self, event_type, msg):
+        for correlation_id in msg.correlationIds():
+            with self.lock:
+                entry = self.pending.get(correlation_id.value())
+            if entry is None:
+                continue
+            request, on_message, future, results = entry
+
+            if event_type == blpapi.Event.REQUEST_STATUS or msg.hasElement("responseError"):
+                with self.lock:
+                    self.pending.pop(correlation_id.value(), None)
+                future.set_exception(request_error(msg))
+                continue
+            try:
+                results.append(on_message(msg) if on_message is not None else msg)
+            except Exception as exc:
+                with self.lock:
+                    self.pending.pop(correlation_id.value(), None)
+                future.set_exception(exc)
+                continue
+            if event_type == blpapi.Event.RESPONSE:
+                with self.lock:
+                    self.pending.pop(correlation_id.value(), None)
+                future.set_result(results)
+
+    def _start_reconnect(self):
+        with self.lock:
+            if self.reconnecting:
+                return
+            self.reconnecting = True
+        threading.Thread(target=self._reconnect, daemon=True).start()
+
+    def _reconnect(self):
+        """Restart the session with backoff, resend every outstanding request and restore the subscriptions."""
+        for attempt in itertools.count():
+            if self.stopping:
+                return
+            time.sleep(RECONNECT_DELAYS[min(attempt, len(RECONNECT_DELAYS) - 1)])
+            session = self._open_session()
+            if session is not None:
+                break
+        # The new session, the resend list and the end of the reconnect are switched under the lock that send()
+        # holds, so every request is sent exactly once on the new session
+        with self.lock:
+            self._install(session)
+            self.reconnecting = False
+            outstanding = list(self.pending.items())
+            for correlation_id, (request, on_message, future, results) in outstanding:
+                results.clear()  # Partial results of the lost session are discarded
+                self.session.sendRequest(request, correlationId=blpapi.CorrelationId(correlation_id))
+            if self.subscriptions:
+                subscriptions = blpapi.SubscriptionList()
+                for correlation_id, (topic, fields, options) in self.subscriptions.items():
+                    subscriptions.add(topic, fields, options, blpapi.CorrelationId(correlation_id))
+                self.session.subscribe(subscriptions)
+
+
+def get_session_manager():
+    """The process-wide session manager, started on first use."""
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            manager = SessionManager()
+            if not manager.start():
+                raise RequestError("Failed to start session.")
+            _manager = manager
+        return _manager
+
+
+def reset_session_manager():
+    """Stop the shared session, the next get_session_manager() starts a new one."""
+    global _manager
+    with _manager_lock:
+        if _manager is not None:
+            _manager.stop()
+            _manager = None
+
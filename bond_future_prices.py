@@ -1,82 +1,98 @@
-import blpapi
+import numpy as np
 import pandas as pd
 
+from bbg_session import RequestError, get_session_manager
+from request_scheduler import get_scheduler
 
-def retrieve_intraday_bond_future_data(ticker, start_date, end_date, interval=1, fields=None):
-    # Create a SessionOptions object to manage session settings
-    if fields is None:
-        fields = ["Open", "High", "Low", "Close", "Volume"]
+BAR_FIELDS = ["Open", "High", "Low", "Close", "Volume"]
 
-    session_options = blpapi.SessionOptions()
-    session_options.setServerHost("localhost")  # Bloomberg API server host
 
-    # Create a Session object
-    session = blpapi.Session(session_options)
+def retrieve_intraday_bond_future_data(ticker, start_date, end_date, interval=1, fields=None, store=False,
+                                       manager=None):
+    if fields is None:
+        fields = BAR_FIELDS
 
     try:
-        # Start the session
-        if not session.start():
-            print("Failed to start session.")
-            return None
-
-        # Open a service to get intraday data (replace with the appropriate service name)
-        if not session.openService("//blp/refdata"):
-            print("Failed to open //blp/refdata service.")
-            return None
+        # Shared, already started session with //blp/refdata open
+        manager = manager or get_session_manager()
 
         # Create a request for intraday bond future data (replace with the appropriate security)
-        request = session.createRequest("IntradayBarRequest")
+        request = manager.create_request("IntradayBarRequest")
         request.getElement("security").setValue(ticker)  # Replace with your bond future security
         request.getElement("eventType").setValue("TRADE")
         request.set("startDateTime", f"{start_date}T00:00:00.000Z")
         request.set("endDateTime", f"{end_date}T23:59:59.999Z")
         request.set("interval", interval)  # 1-minute interval
 
-        # Send the request
-        session.sendRequest(request)
+        # Decode each partial and final response into typed columns and build the frame once at the end
+        key = ('IntradayBarRequest', ticker, start_date, end_date, interval, tuple(fields))
+        frames = get_scheduler().call('bloomberg', key, manager.send, request,
+                                      on_message=lambda msg: process_response([msg], fields))
+    except RequestError as exc:
+        print(f"Intraday bar request failed: {exc}")
+        return None
+
+    data_df = pd.concat(frames) if len(frames) > 1 else frames[0]
+    if store:
+        store_bars(data_df, ticker, interval)
+    return data_df
 
-        # Create an empty DataFrame to store the intraday data
-        data_df = pd.DataFrame(columns=["Date", "Time"] + fields)
 
-        # Wait for responses
-        while True:
-            event = session.nextEvent()
-            if event.eventType() == blpapi.Event.RESPONSE:
-                data_df = process_response(event, data_df)
-                break
+def count_bars(event):
+    """Number of bars in all messages of an event, to size the column buffers."""
+    n_bars = 0
+    for msg in event:
+        if msg.hasElement("barData"):
+            n_bars += msg.getElement("barData").getElement("barTickData").numValues()
+    return n_bars
 
-    finally:
-        # Stop the session
-        session.stop()
 
-    return data_df
+def process_response(event, fields=None):
+    """Decode the bars of a response event straight into preallocated numpy columns."""
+    if fields is None:
+        fields = BAR_FIELDS
 
+    n_bars = count_bars(event)
+    times = np.empty(n_bars, dtype=object)
+    columns = {field: np.empty(n_bars, dtype=np.float64) for field in fields}
+    readers = [(columns[field], field.lower()) for field in fields]
 
-def process_response(event, data_df):
+    i = 0
     for msg in event:
-        if msg.hasElement("bar_data"):
-            bar_data = msg.getElement("bar_data")
-            for i in range(bar_data.numValues()):
-                bar = bar_data.getValueAsElement(i)
-                date = bar.getElementAsDatetime("time").date()
-                time = bar.getElementAsDatetime("time").time()
-                open_price = bar.getElementAsFloat("open")
-                high_price = bar.getElementAsFloat("high")
-                low_price = bar.getElementAsFloat("low")
-                close_price = bar.getElementAsFloat("close")
-                volume = bar.getElementAsFloat("volume")
-
-                data_df = data_df.append({
-                                        "Date": date,
-                                        "Time": time,
-                                        "Open": open_price,
-                                        "High": high_price,
-                                        "Low": low_price,
-                                        "Close": close_price,
-                                        "Volume": volume
-                                        }, ignore_index=True)
+        if msg.hasElement("barData"):
+            bar_data = msg.getElement("barData").getElement("barTickData")
+            for j in range(bar_data.numValues()):
+                bar = bar_data.getValueAsElement(j)
+                times[i] = bar.getElementAsDatetime("time")
+                for column, name in readers:
+                    column[i] = bar.getElementAsFloat(name)
+                i += 1
 
-    return data_df
+    index = pd.DatetimeIndex(pd.to_datetime(times[:i]), name="Datetime")
+    return pd.DataFrame({field: column[:i] for field, column in columns.items()}, index=index)
+
+
+def store_bars(data_df, ticker, interval, db_file=None, parquet_dir=None):
+    """Write decoded bars into the intraday data store."""
+    import intraday_data_store as store
+
+    table_name = store.table_name_for(ticker, f"{interval}m")
+    store.store_intraday_data(data_df, table_name, db_file or store.DB_FILE, parquet_dir or store.PARQUET_DIR)
+
+
+def append_bars(data_df, ticker, interval, db_file=None, parquet_dir=None):
+    """Append a chunk of decoded bars to the intraday data store, see compact_bars."""
+    import intraday_data_store as store
+
+    table_name = store.table_name_for(ticker, f"{interval}m")
+    store.append_intraday_data(data_df, table_name, db_file or store.DB_FILE, parquet_dir or store.PARQUET_DIR)
+
+
+def compact_bars(ticker, interval, parquet_dir=None):
+    """Merge the appended chunks of a ticker into its Parquet file."""
+    import intraday_data_store as store
+
+    store.compact_parquet_parts(store.table_name_for(ticker, f"{interval}m"), parquet_dir or store.PARQUET_DIR)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,177 @@
+import os
+import time
+import uuid
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from reference_data import fetch_reference_data
+
+# Store settings
+CHAIN_STORE_DIR = 'chain_store'  # Root of the date-partitioned chain history
+SNAPSHOT_INTERVAL = 300  # Seconds between chain captures
+ROW_GROUP_SIZE = 50000  # Rows per row group of a compacted day, small enough for expiry pruning
+
+# Bloomberg field -> store column
+CHAIN_FIELDS = {
+    "OPT_UNDL_TICKER": "underlying",
+    "OPT_PUT_CALL": "option_type",
+    "OPT_EXPIRE_DT": "expiry",
+    "STRIKE_PX": "strike",
+    "PX_LAST": "price",
+    "PX_BID": "bid",
+    "PX_ASK": "ask",
+    "IVOL_MID": "iv",
+    "OPT_DELTA": "delta",
+    "OPT_GAMMA": "gamma",
+    "OPT_VEGA": "vega",
+    "OPT_THETA": "theta",
+    "OPT_RHO": "rho",
+}
+
+CHAIN_SCHEMA = pa.schema([
+    ('snapshot_time', pa.timestamp('us')),
+    ('ticker', pa.dictionary(pa.int32(), pa.string())),
+    ('underlying', pa.dictionary(pa.int32(), pa.string())),
+    ('option_type', pa.dictionary(pa.int8(), pa.string())),
+    ('expiry', pa.date32()),
+    ('strike', pa.float64()),
+    ('price', pa.float64()),
+    ('bid', pa.float64()),
+    ('ask', pa.float64()),
+    ('iv', pa.float64()),
+    ('delta', pa.float64()),
+    ('gamma', pa.float64()),
+    ('vega', pa.float64()),
+    ('theta', pa.float64()),
+    ('rho', pa.float64()),
+])
+SORT_KEYS = [('expiry', 'ascending'), ('strike', 'ascending'), ('snapshot_time', 'ascending')]
+
+
+def chain_from_reference_data(frame, snapshot_time):
+    """Store rows of one chain snapshot from a fetch_reference_data frame indexed by option ticker."""
+    chain = frame.reindex(columns=list(CHAIN_FIELDS)).rename(columns=CHAIN_FIELDS)
+    chain.insert(0, 'ticker', frame.index.astype(str))
+    chain.insert(0, 'snapshot_time', pd.Timestamp(snapshot_time))
+    chain['option_type'] = chain['option_type'].astype(str).str[:1].str.upper().where(chain['option_type'].notna())
+    chain['expiry'] = pd.to_datetime(chain['expiry']).dt.date
+    # A snapshot without any string values (security errors, expired contracts) leaves these columns float NaN,
+    # which Arrow cannot encode as dictionary<string>, so they are object columns with None for the gaps
+    for column in ['ticker', 'underlying', 'option_type']:
+        chain[column] = chain[column].astype(object).where(chain[column].notna(), None)
+    return chain.reset_index(drop=True)
+
+
+def partition_dir(store_dir, date):
+    return os.path.join(store_dir, f"date={pd.Timestamp(date).date().isoformat()}")
+
+
+def write_snapshot(chain, store_dir=CHAIN_STORE_DIR):
+    """Append one chain snapshot as a new file in the partition of its capture date, never overwriting one."""
+    snapshot_time = pd.Timestamp(chain['snapshot_time'].iloc[0])
+    day_dir = partition_dir(store_dir, snapshot_time)
+    os.makedirs(day_dir, exist_ok=True)
+    table = pa.Table.from_pandas(chain, schema=CHAIN_SCHEMA, preserve_index=False).sort_by(SORT_KEYS)
+    snapshot_file = os.path.join(day_dir, f"chain-{snapshot_time.strftime('%H%M%S%f')}-{uuid.uuid4().hex[:8]}.parquet")
+    pq.write_table(table, snapshot_file, compression='snappy')
+    return snapshot_file
+
+
+def compact_day(date, store_dir=CHAIN_STORE_DIR):
+    """
+    Merge the snapshot files of one day into a single file sorted by expiry and strike.
+
+    Row group statistics of the compacted file let the reader skip everything outside the requested expiry.
+    Snapshots whose time is already in the day file were merged by a compaction that stopped before removing
+    them, they are only removed, so rerunning after a crash never duplicates rows.
+    """
+    day_dir = partition_dir(store_dir, date)
+    snapshot_files = sorted(f for f in os.listdir(day_dir) if f.startswith('chain-'))
+    if not snapshot_files:
+        return None
+    day_file = os.path.join(day_dir, 'day.parquet')
+    merged = set()
+    if os.path.exists(day_file):
+        merged = set(pq.read_table(day_file, columns=['snapshot_time']).column('snapshot_time').unique().to_pylist())
+    tables = [pq.read_table(os.path.join(day_dir, f), schema=CHAIN_SCHEMA) for f in snapshot_files]
+    tables = [t for t in tables if len(t) and t.column('snapshot_time')[0].as_py() not in merged]
+
+    if tables:
+        table = pa.concat_tables(tables).unify_dictionaries().sort_by(SORT_KEYS)
+        if os.path.exists(day_file):
+            table = pa.concat_tables([pq.read_table(day_file, schema=CHAIN_SCHEMA), table]).sort_by(SORT_KEYS)
+        # Dot-prefixed, so dataset scans of the partition ignore it while it is written
+        tmp_file = os.path.join(day_dir, '.day.parquet.tmp')
+        pq.write_table(table, tmp_file, row_group_size=ROW_GROUP_SIZE, compression='snappy')
+        os.replace(tmp_file, day_file)
+    for f in snapshot_files:
+        os.remove(os.path.join(day_dir, f))
+    return day_file
+
+
+def chain_dataset(store_dir=CHAIN_STORE_DIR):
+    partitioning = ds.partitioning(pa.schema([('date', pa.date32())]), flavor='hive')
+    return ds.dataset(store_dir, format='parquet', schema=CHAIN_SCHEMA.append(pa.field('date', pa.date32())),
+                      partitioning=partitioning, exclude_invalid_files=False)
+
+
+def load_chain_history(expiry=None, start=None, end=None, underlying=None, option_type=None, columns=None,
+                       store_dir=CHAIN_STORE_DIR):
+    """
+    All strikes of the chain snapshots taken between start and end, optionally for one expiry and underlying.
+
+    Only the date partitions inside [start, end] are opened and the expiry and underlying filters are pushed
+    down to the Parquet row groups, so months of history cost only the rows that are actually returned.
+    """
+    if not os.path.isdir(store_dir):
+        return pd.DataFrame(columns=columns or CHAIN_SCHEMA.names)
+    dataset = chain_dataset(store_dir)
+
+    filters = []
+    if start is not None:
+        start = pd.Timestamp(start)
+        filters += [ds.field('date') >= start.date(), ds.field('snapshot_time') >= start.to_pydatetime()]
+    if end is not None:
+        end = pd.Timestamp(end)
+        filters += [ds.field('date') <= end.date(), ds.field('snapshot_time') <= end.to_pydatetime()]
+    if expiry is not None:
+        filters.append(ds.field('expiry') == pd.Timestamp(expiry).date())
+    if underlying is not None:
+        filters.append(ds.field('underlying') == underlying)
+    if option_type is not None:
+        filters.append(ds.field('option_type') == option_type)
+    condition = None
+    for f in filters:
+        condition = f if condition is None else condition & f
+
+    table = dataset.to_table(columns=columns or CHAIN_SCHEMA.names, filter=condition)
+    order = [c for c in ('snapshot_time', 'strike') if c in table.column_names]
+    return table.to_pandas().sort_values(order, ignore_index=True) if order else table.to_pandas()
+
+
+def capture_chain(option_tickers, manager=None):
+    """Snapshot price, IV and Greeks of a whole chain in one reference data request."""
+    snapshot_time = pd.Timestamp.now().floor('ms')
+    frame = fetch_reference_data(option_tickers, list(CHAIN_FIELDS), ttl=0, manager=manager)
+    return chain_from_reference_data(frame, snapshot_time)
+
+
+def record_chains(option_tickers, interval=SNAPSHOT_INTERVAL, n_snapshots=None, store_dir=CHAIN_STORE_DIR,
+                  manager=None):
+    """Capture the chain every interval seconds, compacting each day's snapshots once the day has rolled."""
+    last_date = None
+    count = 0
+    while n_snapshots is None or count < n_snapshots:
+        started = time.monotonic()
+        chain = capture_chain(option_tickers, manager)
+        snapshot_date = chain['snapshot_time'].iloc[0].date()
+        if last_date is not None and snapshot_date != last_date:
+            compact_day(last_date, store_dir)
+        write_snapshot(chain, store_dir)
+        last_date = snapshot_date
+        count += 1
+        if n_snapshots is None or count < n_snapshots:
+            time.sleep(max(interval - (time.monotonic() - started), 0))
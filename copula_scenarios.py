@@ -0,0 +1,137 @@
+import numpy as np
+import pandas as pd
+from scipy import stats
+from scipy.special import gammaln
+
+from var_engine import CONFIDENCE, var_es
+
+# Scenario settings
+CHUNK_SIZE = 100_000  # Scenarios per sampled chunk, bounds the memory of one chunk to CHUNK_SIZE x factors
+N_SCENARIOS = 1_000_000
+DOF_GRID = np.array([2.5, 3, 4, 5, 6, 8, 10, 15, 20, 30, 50, 100])  # t copula degrees of freedom searched
+
+
+def pseudo_observations(returns):
+    """Ranks scaled into (0, 1), column by column, rank / (n + 1)."""
+    returns = np.asarray(returns, dtype=float)
+    ranks = np.argsort(np.argsort(returns, axis=0), axis=0) + 1
+    return ranks / (len(returns) + 1)
+
+
+def t_copula_log_likelihood(u, correlation, dof):
+    """Log density of the t copula at the pseudo observations u, summed over rows."""
+    n_assets = u.shape[1]
+    x = stats.t.ppf(u, dof)
+    cholesky = np.linalg.cholesky(correlation)
+    whitened = np.linalg.solve(cholesky, x.T)
+    quadratic = np.sum(whitened ** 2, axis=0)
+    log_det = 2 * np.sum(np.log(np.diagonal(cholesky)))
+    joint = (gammaln((dof + n_assets) / 2) - gammaln(dof / 2) - 0.5 * n_assets * np.log(dof * np.pi)
+             - 0.5 * log_det - (dof + n_assets) / 2 * np.log1p(quadratic / dof))
+    return np.sum(joint - np.sum(stats.t.logpdf(x, dof), axis=1))
+
+
+class CopulaScenarios:
+    """
+    Gaussian or t copula over empirical or parametric marginals, sampled in fixed-size chunks.
+
+    The correlation matrix is the correlation of the normal scores of the pseudo observations, computed once
+    for all pairs; a t copula adds the degrees of freedom maximising the copula likelihood over DOF_GRID.
+    Each chunk draws independent normals, correlates them through the Cholesky factor, maps them to uniforms
+    and then through each marginal's quantile function. Chunks have their own child seed, so a run is
+    reproducible for a seed and chunk size and never holds more than one chunk of scenarios.
+    """
+
+    def __init__(self, returns, copula='gaussian', marginals='empirical', chunk_size=CHUNK_SIZE):
+        returns = returns.dropna()
+        self.factors = list(returns.columns)
+        self.copula = copula
+        self.marginals = marginals
+        self.chunk_size = chunk_size
+        values = returns.to_numpy(dtype=float)
+
+        u = pseudo_observations(values)
+        self.correlation = np.corrcoef(stats.norm.ppf(u), rowvar=False)
+        self.cholesky = np.linalg.cholesky(self.correlation)
+        self.dof = None
+        if copula == 't':
+            log_likelihoods = [t_copula_log_likelihood(u, self.correlation, dof) for dof in DOF_GRID]
+            self.dof = float(DOF_GRID[int(np.argmax(log_likelihoods))])
+        elif copula != 'gaussian':
+            raise ValueError(f"Unknown copula {copula}")
+
+        if marginals == 'empirical':
+            self.sorted_returns = np.sort(values, axis=0)
+        elif marginals == 'normal':
+            self.marginal_params = values.mean(axis=0), values.std(axis=0, ddof=1)
+        elif marginals == 't':
+            self.marginal_params = np.array([stats.t.fit(values[:, j]) for j in range(values.shape[1])]).T
+        else:
+            raise ValueError(f"Unknown marginals {marginals}")
+
+    def uniforms(self, rng, n):
+        z = rng.standard_normal((n, len(self.factors))) @ self.cholesky.T
+        if self.copula == 't':
+            scale = np.sqrt(rng.chisquare(self.dof, size=(n, 1)) / self.dof)
+            return stats.t.cdf(z / scale, self.dof)
+        return stats.norm.cdf(z)
+
+    def quantiles(self, u):
+        """Marginal quantile functions applied column by column to uniforms of shape (n, factors)."""
+        if self.marginals == 'empirical':
+            # Linear interpolation between the order statistics, at the same plotting positions as the ranks
+            n_obs = len(self.sorted_returns)
+            position = np.clip(u * (n_obs + 1) - 1, 0, n_obs - 1)
+            lower = np.floor(position).astype(np.int64)
+            upper = np.minimum(lower + 1, n_obs - 1)
+            columns = np.arange(u.shape[1])
+            low, high = self.sorted_returns[lower, columns], self.sorted_returns[upper, columns]
+            return low + (position - lower) * (high - low)
+        if self.marginals == 'normal':
+            mean, std = self.marginal_params
+            return mean + std * stats.norm.ppf(u)
+        dof, loc, scale = self.marginal_params
+        return stats.t.ppf(u, dof, loc, scale)
+
+    def chunks(self, n_scenarios=N_SCENARIOS, seed=0):
+        """Generator of (chunk, factors) scenario arrays of factor returns, n_scenarios in total."""
+        n_chunks = max(1, -(-n_scenarios // self.chunk_size))
+        for i, child in enumerate(np.random.SeedSequence(seed).spawn(n_chunks)):
+            n = min(self.chunk_size, n_scenarios - i * self.chunk_size)
+            yield self.quantiles(self.uniforms(np.random.default_rng(child), n))
+
+    def sample(self, n_scenarios, seed=0):
+        """A small sample as a frame, e.g. for plots; large runs should consume chunks() instead."""
+        return pd.DataFrame(np.concatenate(list(self.chunks(n_scenarios, seed))), columns=self.factors)
+
+    def stream_pnl(self, pnl, n_scenarios=N_SCENARIOS, seed=0):
+        """Apply a P&L function to every chunk and concatenate its results, scenarios are dropped after use."""
+        return np.concatenate([pnl(chunk) for chunk in self.chunks(n_scenarios, seed)])
+
+    def linear_pnl(self, exposures, n_scenarios=N_SCENARIOS, seed=0):
+        """Scenario P&L of dollar exposures per factor, (factors,) for a book or (factors, positions)."""
+        exposures = exposures.reindex(self.factors).fillna(0.0).to_numpy(dtype=float)
+        return self.stream_pnl(lambda chunk: chunk @ exposures, n_scenarios, seed)
+
+    def revaluation_pnl(self, levels, revalue, n_scenarios=N_SCENARIOS, seed=0):
+        """Full revaluation P&L, revalue maps (scenarios, factors) levels to book values, as in VaREngine."""
+        levels = levels.reindex(self.factors).to_numpy(dtype=float)
+        base = revalue(levels[None, :])
+        return self.stream_pnl(lambda chunk: revalue(levels * np.exp(chunk)) - base, n_scenarios, seed)
+
+    def report(self, exposures, n_scenarios=N_SCENARIOS, confidence=CONFIDENCE, seed=0):
+        """VaR and ES of a linear book under the copula scenarios."""
+        value_at_risk, shortfall = var_es(self.linear_pnl(exposures, n_scenarios, seed), confidence)
+        return pd.Series({'VaR': value_at_risk, 'ES': shortfall}, name=f'{self.copula}_copula')
+
+
+if __name__ == "__main__":
+    from intraday_data_store import FUTURE_SYMBOLS
+    from var_engine import VaREngine, load_factor_returns
+
+    returns = load_factor_returns(FUTURE_SYMBOLS, interval='5m', resample='1D')
+    book = pd.Series(1_000_000.0, index=returns.columns)  # $1mm long each future
+    report = VaREngine(returns).report(book)
+    for copula in ['gaussian', 't']:
+        report.loc[f'{copula}_copula'] = CopulaScenarios(returns, copula).report(book)
+    print(report)
@@ -0,0 +1,148 @@
+import numpy as np
+
+# Engine settings
+CHUNK_ELEMENTS = 4_000_000  # Pair values per chunk of the batch computation, bounds the working memory
+RESYNC = 1000  # Updates between exact recomputations of the running sums from the window
+
+
+def pair_indices(n_assets):
+    """Row and column index of each unordered pair, in the column order of the correlation arrays."""
+    return np.triu_indices(n_assets, 1)
+
+
+def pair_names(assets, suffix='_Corr'):
+    i, j = pair_indices(len(assets))
+    return [f'{assets[a]}_{assets[b]}{suffix}' for a, b in zip(i, j)]
+
+
+def window_sums(values, window):
+    """Sum over the trailing window of every row, with the first window-1 rows covering a partial window."""
+    cumulative = np.cumsum(values, axis=0)
+    sums = cumulative.copy()
+    sums[window:] -= cumulative[:-window]
+    return sums
+
+
+def correlation_from_sums(n, sx, sy, sxx, syy, sxy):
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return (n * sxy - sx * sy) / np.sqrt((n * sxx - sx ** 2) * (n * syy - sy ** 2))
+
+
+def rolling_pair_correlations(returns, window, chunk_elements=CHUNK_ELEMENTS):
+    """
+    Rolling correlation of every unordered pair of columns, shape (T, N(N-1)/2) as float32.
+
+    Window sums of x, x^2 and the pair cross products come from running sums in one pass over the rows,
+    O(T N^2) in total. Rows are processed in chunks, each extended by the window-1 rows before it, so the
+    working memory stays bounded for 100+ instruments at intraday frequency. A window with a missing value in
+    either column gives NaN, like pandas rolling(window).corr().
+    """
+    returns = np.asarray(returns, dtype=np.float64)
+    n_rows, n_assets = returns.shape
+    i, j = pair_indices(n_assets)
+    missing = np.isnan(returns)
+    values = np.where(missing, 0.0, returns)
+    out = np.full((n_rows, len(i)), np.nan, dtype=np.float32)
+
+    chunk = max(chunk_elements // max(len(i), 1) - window, 1)
+    for start in range(0, n_rows, chunk):
+        stop = min(start + chunk, n_rows)
+        lead = max(start - window + 1, 0)  # Rows before the chunk that fall in its first windows
+        x = values[lead:stop]
+        sx = window_sums(x, window)[start - lead:]
+        spread = window * window_sums(x ** 2, window)[start - lead:] - sx ** 2
+        n_missing = window_sums(missing[lead:stop].astype(np.int64), window)[start - lead:]
+
+        # Cross products of each asset with every later one, written straight into the pair layout
+        sxy = np.empty((stop - start, len(i)))
+        column = 0
+        for a in range(n_assets - 1):
+            block = slice(column, column + n_assets - a - 1)
+            sxy[:, block] = window_sums(x[:, a:a + 1] * x[:, a + 1:], window)[start - lead:]
+            column = block.stop
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            corr = (window * sxy - sx[:, i] * sx[:, j]) / np.sqrt(spread[:, i] * spread[:, j])
+        full = np.arange(start, stop) >= window - 1
+        valid = full[:, None] & (n_missing[:, i] + n_missing[:, j] == 0)
+        out[start:stop] = np.where(valid, corr, np.nan)
+    return out
+
+
+class RollingCorrelation:
+    """
+    Incremental rolling correlation matrix of N series.
+
+    Keeps the last window rows in a ring buffer with the running sums of x, x^2 and the pair cross products,
+    so a new bar costs O(N^2) instead of a recomputation over the window. The sums are recomputed exactly from
+    the buffer every RESYNC updates to stop floating point drift. Missing values enter the sums as zeros and are
+    counted per asset, so as in rolling_pair_correlations only the windows containing one give NaN.
+    """
+
+    def __init__(self, n_assets, window):
+        self.window = window
+        self.i, self.j = pair_indices(n_assets)
+        self.buffer = np.zeros((window, n_assets))
+        self.missing = np.zeros((window, n_assets), dtype=bool)
+        self.n_missing = np.zeros(n_assets, dtype=np.int64)  # Missing values of each asset in the window
+        self.position = 0
+        self.count = 0
+        self.updates = 0
+        self.sx = np.zeros(n_assets)
+        self.sxx = np.zeros(n_assets)
+        self.sxy = np.zeros(len(self.i))
+
+    @classmethod
+    def from_history(cls, returns, window):
+        """Engine primed with the last window rows of a (T, N) history."""
+        returns = np.asarray(returns, dtype=np.float64)
+        engine = cls(returns.shape[1], window)
+        for row in returns[-window:]:
+            engine.update(row)
+        return engine
+
+    def update(self, row):
+        """Add one bar of returns and return the pair correlations, NaN until the window is full."""
+        row = np.asarray(row, dtype=np.float64)
+        missing = np.isnan(row)
+        row = np.where(missing, 0.0, row)
+        old = self.buffer[self.position]
+        if self.count == self.window:
+            self.sx -= old
+            self.sxx -= old ** 2
+            self.sxy -= old[self.i] * old[self.j]
+            self.n_missing -= self.missing[self.position]
+        else:
+            self.count += 1
+        self.buffer[self.position] = row
+        self.missing[self.position] = missing
+        self.n_missing += missing
+        self.position = (self.position + 1) % self.window
+        self.sx += row
+        self.sxx += row ** 2
+        self.sxy += row[self.i] * row[self.j]
+
+        self.updates += 1
+        if self.updates % RESYNC == 0:
+            self.resync()
+        return self.correlations()
+
+    def resync(self):
+        rows = self.buffer[:self.count] if self.count < self.window else self.buffer
+        self.sx = rows.sum(axis=0)
+        self.sxx = (rows ** 2).sum(axis=0)
+        self.sxy = (rows[:, self.i] * rows[:, self.j]).sum(axis=0)
+
+    def correlations(self):
+        if self.count < self.window:
+            return np.full(len(self.i), np.nan, dtype=np.float32)
+        i, j = self.i, self.j
+        correlations = correlation_from_sums(self.window, self.sx[i], self.sx[j], self.sxx[i], self.sxx[j], self.sxy)
+        return np.where(self.n_missing[i] + self.n_missing[j] == 0, correlations, np.nan).astype(np.float32)
+
+    def matrix(self):
+        """Full symmetric correlation matrix of the current window."""
+        n_assets = len(self.sx)
+        matrix = np.eye(n_assets, dtype=np.float32)
+        matrix[self.i, self.j] = matrix[self.j, self.i] = self.correlations()
+        return matrix
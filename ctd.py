@@ -0,0 +1,288 @@
+import hashlib
+import os
+
+import numpy as np
+import pandas as pd
+from scipy.stats import norm
+
+# CTD engine settings
+CACHE_DIR = 'ctd_cache'  # Directory for cached conversion factors and coupon schedules
+NOTIONAL_YIELD = 0.06  # CBOT conversion factor yield
+QUARTER_ROUNDED_ROOTS = ['ZN', 'TN', 'ZB', 'UB']  # Maturity rounded down to quarters, the rest to months
+
+BASKET_COLUMNS = ['contract', 'bond', 'coupon', 'maturity', 'delivery_month', 'delivery_date']
+STATIC_VERSION = 2  # Part of the cache key, bumped when the cached static data changes meaning
+
+
+def month_index(dates):
+    """Months since 1970-01 of each date."""
+    return np.asarray(dates, dtype='datetime64[D]').astype('datetime64[M]').astype(np.int64)
+
+
+def coupon_date(months, day):
+    """Coupon date in the given month on the bond's payment day, clipped to the end of the month."""
+    month_start = np.asarray(months).astype('datetime64[M]')
+    days_in_month = ((month_start + 1).astype('datetime64[D]') - month_start.astype('datetime64[D]')).astype(np.int64)
+    return month_start.astype('datetime64[D]') + (np.minimum(day, days_in_month) - 1)
+
+
+def payment_day(maturity):
+    """
+    Coupon day of month of each bond, the maturity's day, or 31 for a maturity on the last day of its month.
+
+    With the end-of-month rule a Nov-30 maturity pays on May 31 and a Feb-28 maturity on Aug 31, coupon_date
+    clips 31 to the end of each month.
+    """
+    maturity = np.asarray(maturity, dtype='datetime64[D]')
+    day = (maturity - maturity.astype('datetime64[M]').astype('datetime64[D]')).astype(np.int64) + 1
+    end_of_month = (maturity + 1).astype('datetime64[M]') != maturity.astype('datetime64[M]')
+    return np.where(end_of_month, 31, day)
+
+
+def conversion_factor(coupon, maturity, delivery_month, root):
+    """
+    CBOT conversion factor, the price per unit par of the bond at a 6% yield.
+
+    Time to maturity is measured from the first day of the delivery month and rounded down to whole quarters
+    for ZN/TN/ZB/UB and to whole months for ZT/ZF.
+    """
+    coupon = np.asarray(coupon, dtype=float) / 100.0
+    months = month_index(maturity) - month_index(delivery_month)
+    quarterly = np.isin(np.asarray(root), QUARTER_ROUNDED_ROOTS)
+    months = np.where(quarterly, months - months % 3, months)
+
+    n, z = np.divmod(months, 12)
+    v = np.where(z < 7, z, np.where(quarterly, 3, z - 6))
+    half_yield = 1 + NOTIONAL_YIELD / 2
+    a = 1 / half_yield ** (v / 6)
+    b = (coupon / 2) * (6 - v) / 6
+    c = np.where(z < 7, 1 / half_yield ** (2 * n), 1 / half_yield ** (2 * n + 1))
+    d = (coupon / NOTIONAL_YIELD) * (1 - c)
+    return np.round(a * (coupon / 2 + c + d) - b, 4)
+
+
+def coupon_schedule(maturity, settle):
+    """Previous and next coupon dates and the number of remaining coupons, for semi-annual bonds."""
+    maturity = np.asarray(maturity, dtype='datetime64[D]')
+    settle = np.broadcast_to(np.asarray(settle, dtype='datetime64[D]'), maturity.shape)
+    pay_day = payment_day(maturity)
+    m_maturity = month_index(maturity)
+
+    # Latest coupon month not before the settlement month, stepping forward if that coupon already passed
+    k = (m_maturity - month_index(settle)) // 6
+    next_coupon = coupon_date(m_maturity - 6 * k, pay_day)
+    passed = next_coupon <= settle
+    k = np.where(passed, k - 1, k)
+    next_coupon = coupon_date(m_maturity - 6 * k, pay_day)
+    previous_coupon = coupon_date(m_maturity - 6 * (k + 1), pay_day)
+    return previous_coupon, next_coupon, k + 1
+
+
+def accrued_interest(coupon, previous_coupon, next_coupon, settle):
+    """Actual/actual accrued interest per 100 par."""
+    period = (next_coupon - previous_coupon).astype(np.int64)
+    accrued_days = (np.asarray(settle, dtype='datetime64[D]') - previous_coupon).astype(np.int64)
+    return np.asarray(coupon, dtype=float) / 2 * accrued_days / period
+
+
+def bond_price(yields, coupon, previous_coupon, next_coupon, n_coupons, settle):
+    """Clean price per 100 par from the semi-annual yield, vectorised over bonds (and yield scenarios)."""
+    yields = np.asarray(yields, dtype=float)
+    coupon = np.asarray(coupon, dtype=float)
+    period = (next_coupon - previous_coupon).astype(np.int64)
+    w = (next_coupon - np.asarray(settle, dtype='datetime64[D]')).astype(np.int64) / period
+
+    # Padded cash flow times in coupon periods, masked beyond each bond's last coupon
+    periods = np.arange(n_coupons.max())
+    alive = periods[None, :] < n_coupons[:, None]
+    times = periods[None, :] + w[:, None]
+    cash_flows = np.where(alive, coupon[:, None] / 2, 0.0)
+    cash_flows[np.arange(len(coupon)), n_coupons - 1] += 100.0
+
+    discount = (1 + yields[..., None] / 2) ** -times
+    full_price = np.sum(cash_flows * discount, axis=-1)
+    return full_price - accrued_interest(coupon, previous_coupon, next_coupon, settle)
+
+
+def bond_yield(prices, coupon, previous_coupon, next_coupon, n_coupons, settle, iterations=50):
+    """Semi-annual yield from the clean price by vectorised Newton iterations."""
+    yields = np.full(len(coupon), 0.05)
+    bump = 1e-6
+    for _ in range(iterations):
+        price = bond_price(yields, coupon, previous_coupon, next_coupon, n_coupons, settle)
+        slope = (bond_price(yields + bump, coupon, previous_coupon, next_coupon, n_coupons, settle) - price) / bump
+        step = (price - prices) / slope
+        yields = yields - step
+        if np.max(np.abs(step)) < 1e-12:
+            break
+    return yields
+
+
+class CTDEngine:
+    """
+    Cheapest-to-deliver analytics over the deliverable baskets of all contracts and contract months.
+
+    basket has one row per (contract, bond) pair with the columns in BASKET_COLUMNS. Conversion factors and
+    coupon calendars depend only on the basket, so they are computed once and cached on disk.
+    """
+
+    def __init__(self, basket, cache_dir=CACHE_DIR):
+        self.basket = basket.reset_index(drop=True)[BASKET_COLUMNS].copy()
+        for column in ['maturity', 'delivery_month', 'delivery_date']:
+            self.basket[column] = pd.to_datetime(self.basket[column])
+
+        self.contract = self.basket['contract'].to_numpy()
+        self.bond = self.basket['bond'].to_numpy()
+        self.coupon = self.basket['coupon'].to_numpy(dtype=float)
+        self.maturity = self.basket['maturity'].to_numpy().astype('datetime64[D]')
+        self.delivery_date = self.basket['delivery_date'].to_numpy().astype('datetime64[D]')
+
+        static = self.load_static(cache_dir)
+        self.conversion_factor = static['conversion_factor']
+        self.delivery_previous_coupon = static['delivery_previous_coupon']
+        self.delivery_next_coupon = static['delivery_next_coupon']
+        self.accrued_delivery = static['accrued_delivery']
+
+    def static_key(self):
+        """Hash of the basket definition, used as the cache file name."""
+        definition = f"{STATIC_VERSION}\n{self.basket.to_csv(index=False)}".encode()
+        return hashlib.sha1(definition).hexdigest()[:16]
+
+    def load_static(self, cache_dir):
+        """Load the static basket data from the cache, building and storing it on a miss."""
+        cache_file = os.path.join(cache_dir, f"{self.static_key()}.npz") if cache_dir else None
+        if cache_file and os.path.exists(cache_file):
+            with np.load(cache_file) as cached:
+                return dict(cached)
+
+        root = np.array([contract[:2] for contract in self.contract])
+        previous_coupon, next_coupon, _ = coupon_schedule(self.maturity, self.delivery_date)
+        static = {
+            'conversion_factor': conversion_factor(self.coupon, self.maturity,
+                                                   self.basket['delivery_month'].to_numpy(), root),
+            'delivery_previous_coupon': previous_coupon,
+            'delivery_next_coupon': next_coupon,
+            'accrued_delivery': accrued_interest(self.coupon, previous_coupon, next_coupon, self.delivery_date),
+        }
+        if cache_file:
+            os.makedirs(cache_dir, exist_ok=True)
+            np.savez(cache_file, **static)
+        return static
+
+    def forward_price(self, prices, settle, repo, previous_coupon, next_coupon):
+        """Clean forward price at delivery, financing the dirty price and any coupon paid before delivery."""
+        days = (self.delivery_date - settle).astype(np.int64)
+        accrued = accrued_interest(self.coupon, previous_coupon, next_coupon, settle)
+        interim_coupon = np.where(next_coupon <= self.delivery_date, self.coupon / 2, 0.0)
+        days_after_coupon = np.maximum((self.delivery_date - next_coupon).astype(np.int64), 0)
+
+        dirty_forward = (prices + accrued) * (1 + repo * days / 360.0) \
+            - interim_coupon * (1 + repo * days_after_coupon / 360.0)
+        return dirty_forward - self.accrued_delivery
+
+    def analytics(self, settle, futures_prices, bond_prices, repo_rates):
+        """
+        Basis, implied repo, CTD and hedge ratios for every deliverable of every contract at once.
+
+        futures_prices and repo_rates are keyed by contract, bond_prices by bond.
+        """
+        settle = np.datetime64(pd.Timestamp(settle).date(), 'D')
+        F = pd.Series(futures_prices).reindex(self.contract).to_numpy(dtype=float)
+        P = pd.Series(bond_prices).reindex(self.bond).to_numpy(dtype=float)
+        repo = pd.Series(repo_rates).reindex(self.contract).to_numpy(dtype=float)
+        cf = self.conversion_factor
+
+        previous_coupon, next_coupon, n_coupons = coupon_schedule(self.maturity, settle)
+        accrued = accrued_interest(self.coupon, previous_coupon, next_coupon, settle)
+        days = (self.delivery_date - settle).astype(np.int64)
+        interim_coupon = np.where(next_coupon <= self.delivery_date, self.coupon / 2, 0.0)
+        days_after_coupon = np.maximum((self.delivery_date - next_coupon).astype(np.int64), 0)
+
+        forward = self.forward_price(P, settle, repo, previous_coupon, next_coupon)
+        invoice = F * cf + self.accrued_delivery
+        dirty = P + accrued
+        implied = (invoice + interim_coupon - dirty) / (dirty * days / 360.0 - interim_coupon * days_after_coupon / 360.0)
+
+        yields = bond_yield(P, self.coupon, previous_coupon, next_coupon, n_coupons, settle)
+        dv01 = (bond_price(yields - 1e-4, self.coupon, previous_coupon, next_coupon, n_coupons, settle)
+                - bond_price(yields + 1e-4, self.coupon, previous_coupon, next_coupon, n_coupons, settle)) / 2
+
+        result = self.basket[['contract', 'bond']].copy()
+        result['conversion_factor'] = cf
+        result['accrued'] = accrued
+        result['yield'] = yields
+        result['dv01'] = dv01
+        result['forward_price'] = forward
+        result['gross_basis'] = P - F * cf
+        result['net_basis'] = forward - F * cf
+        result['implied_repo'] = implied
+
+        # CTD is the highest implied repo in each contract's basket
+        ctd_rows = result.groupby('contract', sort=False)['implied_repo'].idxmax()
+        result['is_ctd'] = False
+        result.loc[ctd_rows.to_numpy(), 'is_ctd'] = True
+        ctd_dv01 = (result['dv01'] / cf).where(result['is_ctd']).groupby(result['contract']).transform('max')
+        result['futures_dv01'] = ctd_dv01
+        result['hedge_ratio'] = result['dv01'] / ctd_dv01  # futures per 100 par of each bond
+        return result
+
+    def delivery_option(self, settle, analytics, repo_rates, yield_vol, n_scenarios=201):
+        """
+        Switch option value per contract in futures points from parallel yield scenarios.
+
+        Each deliverable is repriced on a grid of yield shifts spanning +-4 standard deviations up to delivery,
+        the cheapest converted forward is taken per scenario and the gain over today's CTD is averaged under
+        the normal density of the shift.
+        """
+        settle = np.datetime64(pd.Timestamp(settle).date(), 'D')
+        repo = pd.Series(repo_rates).reindex(self.contract).to_numpy(dtype=float)
+        previous_coupon, next_coupon, n_coupons = coupon_schedule(self.maturity, settle)
+
+        # Each row's horizon is its own contract's delivery, shifts are (scenarios, rows)
+        T = (self.delivery_date - settle).astype(np.int64) / 365.0
+        shifts = np.linspace(-4, 4, n_scenarios)[:, None] * yield_vol * np.sqrt(np.maximum(T, 0.0))[None, :]
+        weights = norm.pdf(np.linspace(-4, 4, n_scenarios))
+        weights = weights / weights.sum()
+
+        yields = analytics['yield'].to_numpy()[None, :] + shifts
+        prices = bond_price(yields, self.coupon, previous_coupon, next_coupon, n_coupons, settle)
+        converted = self.forward_price(prices, settle, repo, previous_coupon, next_coupon) / self.conversion_factor
+
+        frame = pd.DataFrame(converted.T)
+        frame['contract'] = self.contract
+        cheapest = frame.groupby('contract', sort=False).min()
+        ctd = frame[analytics['is_ctd'].to_numpy()].set_index('contract').reindex(cheapest.index)
+        return pd.Series((ctd.to_numpy() - cheapest.to_numpy()) @ weights, index=cheapest.index,
+                         name='delivery_option')
+
+    def scanner_basket(self, settle):
+        """Basket rows in the layout basis_scanner.BasisScanner expects, from the cached static data."""
+        settle = np.datetime64(pd.Timestamp(settle).date(), 'D')
+        previous_coupon, next_coupon, _ = coupon_schedule(self.maturity, settle)
+        basket = self.basket[['contract', 'bond', 'coupon']].copy()
+        basket['conversion_factor'] = self.conversion_factor
+        basket['accrued_now'] = accrued_interest(self.coupon, previous_coupon, next_coupon, settle)
+        basket['accrued_delivery'] = self.accrued_delivery
+        basket['days_to_delivery'] = (self.delivery_date - settle).astype(np.int64)
+        basket['interim_coupon'] = np.where(next_coupon <= self.delivery_date, self.coupon / 2, 0.0)
+        basket['days_after_coupon'] = np.maximum((self.delivery_date - next_coupon).astype(np.int64), 0)
+        return basket
+
+
+if __name__ == "__main__":
+    basket = pd.DataFrame({
+        'contract': ['ZNZ3'] * 3 + ['ZBZ3'] * 2,
+        'bond': ['T 4 02/15/34', 'T 3.875 08/15/33', 'T 4.5 11/15/33', 'T 4.375 08/15/43', 'T 4 11/15/42'],
+        'coupon': [4.0, 3.875, 4.5, 4.375, 4.0],
+        'maturity': ['2034-02-15', '2033-08-15', '2033-11-15', '2043-08-15', '2042-11-15'],
+        'delivery_month': ['2023-12-01'] * 5,
+        'delivery_date': ['2023-12-29'] * 5,
+    })
+    engine = CTDEngine(basket)
+    settle = '2023-10-02'
+    analytics = engine.analytics(settle, {'ZNZ3': 107.5, 'ZBZ3': 112.0},
+                                 {'T 4 02/15/34': 93.1, 'T 3.875 08/15/33': 92.6, 'T 4.5 11/15/33': 96.2,
+                                  'T 4.375 08/15/43': 89.2, 'T 4 11/15/42': 84.3},
+                                 {'ZNZ3': 0.053, 'ZBZ3': 0.053})
+    print(analytics)
+    print(engine.delivery_option(settle, analytics, {'ZNZ3': 0.053, 'ZBZ3': 0.053}, yield_vol=0.01))
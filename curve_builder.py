@@ -0,0 +1,141 @@
+import threading
+
+import numpy as np
+import QuantLib as ql
+
+# Curve settings
+CONVEXITY_VOL = 0.0085  # Normal short-rate volatility for the futures convexity adjustment (Ho-Lee)
+MONTH_CODES = {'F': 1, 'G': 2, 'H': 3, 'J': 4, 'K': 5, 'M': 6, 'N': 7, 'Q': 8, 'U': 9, 'V': 10, 'X': 11, 'Z': 12}
+FUTURE_FREQUENCIES = {'SER': ql.Monthly, 'SFR': ql.Quarterly}  # 1M and 3M SOFR futures roots
+
+
+def parse_sofr_future(ticker, today):
+    """(reference month, reference year, frequency) of a SOFR future ticker such as 'SFRZ3 Comdty'."""
+    code = ticker.split()[0]
+    root, month_code, year_digits = code[:3], code[3], code[4:]
+    year = int(year_digits)
+    if year < 100:
+        # Single or double digit year, nearest year not before today's decade
+        decade = today.year() - today.year() % (10 ** len(year_digits))
+        year = decade + year if decade + year >= today.year() else decade + 10 ** len(year_digits) + year
+    return MONTH_CODES[month_code], year, FUTURE_FREQUENCIES[root]
+
+
+def ho_lee_convexity(t1, t2, volatility=CONVEXITY_VOL):
+    """Futures minus forward rate adjustment, 0.5 * sigma^2 * t1 * t2."""
+    return 0.5 * volatility ** 2 * t1 * t2
+
+
+class SofrCurveBuilder:
+    """
+    SOFR discount curve bootstrapped from deposits, SOFR futures and OIS swaps.
+
+    Every market quote lives in its own SimpleQuote, so a tick is applied with set_quote() and QuantLib
+    re-bootstraps lazily on the next query instead of the curve being rebuilt from scratch. Pricers should hold
+    handle, which stays valid across rebuilds. Vectorised discount, zero and forward queries run in numpy on the
+    curve nodes, which is exact for the log-linear discount interpolation used here.
+
+    QuantLib objects are not thread-safe, so quote updates and curve evaluation run under the builder's lock;
+    code using curve or handle directly while quotes are streamed in holds lock around it as well.
+    """
+
+    def __init__(self, today, deposits=None, futures=None, swaps=None, convexity_vol=CONVEXITY_VOL,
+                 day_count=ql.Actual365Fixed()):
+        self.today = today
+        self.day_count = day_count
+        self.convexity_vol = convexity_vol
+        self.quotes = {}
+        self.convexity = {}
+        self.index = ql.Sofr()
+        self.lock = threading.RLock()
+        ql.Settings.instance().evaluationDate = today
+
+        helpers = []
+        # Deposits, quoted as rates, keyed by tenor string e.g. '1M'
+        for tenor, rate in (deposits or {}).items():
+            quote = self.quotes[tenor] = ql.SimpleQuote(rate)
+            helpers.append(ql.DepositRateHelper(ql.QuoteHandle(quote), ql.Period(tenor), 0, self.index.fixingCalendar(),
+                                                ql.ModifiedFollowing, False, ql.Actual360()))
+
+        # SOFR futures, quoted as prices, keyed by ticker, with a convexity adjustment quote each; contracts whose
+        # reference period has already started are skipped, they would need SOFR fixings the index does not have
+        last_future_date = today
+        for ticker, price in (futures or {}).items():
+            month, year, frequency = parse_sofr_future(ticker, today)
+            quote = ql.SimpleQuote(price)
+            adjustment = ql.SimpleQuote(0.0)
+            helper = ql.SofrFutureRateHelper(ql.QuoteHandle(quote), month, year, frequency, ql.QuoteHandle(adjustment))
+            if helper.earliestDate() <= today:
+                continue
+            self.quotes[ticker], self.convexity[ticker] = quote, adjustment
+            start = self.day_count.yearFraction(today, helper.earliestDate())
+            end = self.day_count.yearFraction(today, helper.maturityDate())
+            adjustment.setValue(ho_lee_convexity(max(start, 0.0), end, convexity_vol))
+            last_future_date = max(last_future_date, helper.latestDate())
+            helpers.append(helper)
+
+        # OIS swaps, quoted as rates, keyed by tenor string e.g. '5Y'; tenors inside the futures strip are skipped
+        for tenor, rate in (swaps or {}).items():
+            quote = ql.SimpleQuote(rate)
+            helper = ql.OISRateHelper(2, ql.Period(tenor), ql.QuoteHandle(quote), self.index)
+            if helper.latestDate() <= last_future_date:
+                continue
+            self.quotes[tenor] = quote
+            helpers.append(helper)
+
+        self.helpers = helpers
+        self.curve = ql.PiecewiseLogLinearDiscount(today, helpers, day_count)
+        self.curve.enableExtrapolation()
+        self.handle = ql.RelinkableYieldTermStructureHandle(self.curve)
+        self._nodes = None
+        self._observer = ql.Observer(self._invalidate)
+        self._observer.registerWith(self.curve)
+
+    def _invalidate(self):
+        self._nodes = None
+
+    def set_quote(self, key, value):
+        """Apply one market tick, the bootstrap reruns lazily on the next query."""
+        with self.lock:
+            self.quotes[key].setValue(value)
+
+    def set_quotes(self, values):
+        with self.lock:
+            for key, value in values.items():
+                self.set_quote(key, value)
+
+    def nodes(self):
+        """Curve node times and log discount factors, cached until a quote changes."""
+        with self.lock:
+            if self._nodes is None:
+                dates, discounts = zip(*self.curve.nodes())
+                times = np.array([self.day_count.yearFraction(self.today, d) for d in dates])
+                self._nodes = times, np.log(np.array(discounts))
+            return self._nodes
+
+    def discount(self, times):
+        """Discount factors for an array of year fractions, log-linear between nodes and flat-forward beyond."""
+        node_times, log_discounts = self.nodes()
+        times = np.asarray(times, dtype=float)
+        segment = np.clip(np.searchsorted(node_times, times) - 1, 0, len(node_times) - 2)
+        t0, t1 = node_times[segment], node_times[segment + 1]
+        slope = (log_discounts[segment + 1] - log_discounts[segment]) / (t1 - t0)
+        return np.exp(log_discounts[segment] + slope * (times - t0))
+
+    def zero_rate(self, times):
+        """Continuously compounded zero rates."""
+        times = np.maximum(np.asarray(times, dtype=float), 1e-8)
+        return -np.log(self.discount(times)) / times
+
+    def forward_rate(self, start, end):
+        """Continuously compounded forward rates between two arrays of times."""
+        start, end = np.asarray(start, dtype=float), np.asarray(end, dtype=float)
+        return np.log(self.discount(start) / self.discount(end)) / (end - start)
+
+    def bond_price(self, coupon, maturity, frequency=2):
+        """Clean price per 100 par of a bullet bond issued today, discounted off the curve."""
+        n_coupons = int(round(maturity * frequency))
+        times = np.arange(1, n_coupons + 1) / frequency
+        cash_flows = np.full(n_coupons, 100 * coupon / frequency)
+        cash_flows[-1] += 100
+        return float(cash_flows @ self.discount(times))
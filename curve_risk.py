@@ -0,0 +1,187 @@
+import numpy as np
+import pandas as pd
+
+from chain_analytics import black76
+from ctd import accrued_interest, coupon_date, coupon_schedule, month_index, payment_day
+
+# Risk settings
+KEY_RATE_TENORS = np.array([0.25, 0.5, 1, 2, 3, 5, 7, 10, 20, 30])  # Key rate nodes in years
+BUMP = 0.0001  # 1bp zero rate bump
+CONTRACT_SIZE = 100_000  # Face value of a Treasury future without a contract_size column, e.g. TU is $200,000
+N_FACTORS = 3  # Principal components of zero rate changes used for factor risk
+
+POSITION_COLUMNS = ['contract', 'quantity', 'option_type', 'strike', 'expiry', 'volatility']
+
+
+def key_rate_shifts(times, tenors=KEY_RATE_TENORS):
+    """Triangular key rate shapes at each time, shape (n tenors, *times.shape); they sum to one everywhere."""
+    times = np.asarray(times, dtype=float)
+    eye = np.eye(len(tenors))
+    return np.stack([np.interp(times, tenors, eye[k]) for k in range(len(tenors))])
+
+
+def curve_shapes(tenors=KEY_RATE_TENORS):
+    """Parallel, twist (2s10s steepener) and butterfly (wings up, belly down) as key rate vectors."""
+    twist = np.clip((tenors - 2) / (10 - 2) * 2 - 1, -1, 1)
+    return pd.DataFrame({'parallel': np.ones(len(tenors)), 'twist': twist, 'butterfly': 2 * np.abs(twist) - 1},
+                        index=pd.Index(tenors, name='tenor')).T
+
+
+def pca_factors(zero_rates, n_factors=N_FACTORS):
+    """
+    Loadings of the first principal components of daily zero rate changes at the key tenors.
+
+    zero_rates has one column per key tenor. Each loading is scaled to a one standard deviation daily move,
+    returned with the share of variance it explains.
+    """
+    changes = zero_rates.diff().dropna().to_numpy()
+    eigenvalues, eigenvectors = np.linalg.eigh(np.cov(changes, rowvar=False))
+    order = np.argsort(eigenvalues)[::-1][:n_factors]
+    loadings = eigenvectors[:, order].T * np.sqrt(eigenvalues[order])[:, None]
+    # Sign convention, a positive factor move raises the average rate
+    loadings *= np.where(loadings.sum(axis=1) < 0, -1, 1)[:, None]
+    names = [f'PC{i + 1}' for i in range(len(order))]
+    return (pd.DataFrame(loadings, index=names, columns=zero_rates.columns),
+            pd.Series(eigenvalues[order] / eigenvalues.sum(), index=names))
+
+
+class CurveRiskEngine:
+    """
+    Curve risk of a Treasury futures and futures options book against a SofrCurveBuilder curve.
+
+    The CTD cash flows of every contract and the option expiries are laid out once as padded arrays. A risk run
+    stacks all curve scenarios, e.g. every key rate bumped up and down, into one array of zero rate shifts and
+    reprices the whole book for all of them in one vectorised pass over the base discount factors, instead of
+    rebuilding a curve per instrument per bump. Each position is worth contract_size / 100 dollars per point of
+    its contract.
+    """
+
+    def __init__(self, builder, contracts, positions, tenors=KEY_RATE_TENORS):
+        self.builder = builder
+        self.tenors = np.asarray(tenors, dtype=float)
+        self.today = np.datetime64(builder.today.ISO(), 'D')
+        self.contracts = contracts
+        self.positions = positions.reset_index(drop=True)
+        self.contract_index = contracts.index.get_indexer(self.positions['contract'])
+        contract_size = contracts.get('contract_size', pd.Series(CONTRACT_SIZE, index=contracts.index))
+        self.multiplier = contract_size.to_numpy(dtype=float)[self.contract_index] / 100
+        self.is_option = self.positions['option_type'].isin(['C', 'P']).to_numpy()
+        self.lay_out_cash_flows()
+
+    def year_fraction(self, dates):
+        return (np.asarray(dates, dtype='datetime64[D]') - self.today).astype(np.int64) / 365.0
+
+    def lay_out_cash_flows(self):
+        """CTD coupons and principal after delivery, padded to a (contracts, flows) array."""
+        maturity = self.contracts['maturity'].to_numpy(dtype='datetime64[D]')
+        delivery = self.contracts['delivery_date'].to_numpy(dtype='datetime64[D]')
+        coupon = self.contracts['coupon'].to_numpy(dtype=float)
+        previous_coupon, next_coupon, n_coupons = coupon_schedule(maturity, delivery)
+        pay_day = payment_day(maturity)
+
+        periods = np.arange(n_coupons.max())
+        alive = periods[None, :] < n_coupons[:, None]
+        dates = coupon_date(month_index(next_coupon)[:, None] + 6 * periods[None, :], pay_day[:, None])
+        self.flow_times = np.where(alive, self.year_fraction(dates), 0.0)
+        self.flows = np.where(alive, coupon[:, None] / 2, 0.0)
+        self.flows[np.arange(len(coupon)), n_coupons - 1] += 100.0
+        self.delivery_times = self.year_fraction(delivery)
+        self.delivery_accrued = accrued_interest(coupon, previous_coupon, next_coupon, delivery)
+        self.conversion_factor = self.contracts['conversion_factor'].to_numpy(dtype=float)
+
+        options = self.positions[self.is_option]
+        self.expiry_times = np.maximum(self.year_fraction(pd.to_datetime(options['expiry']).to_numpy()), 0.0)
+        self.strikes = options['strike'].to_numpy(dtype=float)
+        self.volatilities = options['volatility'].to_numpy(dtype=float)
+        self.is_call = (options['option_type'] == 'C').to_numpy()
+
+    def discount(self, times, shifts):
+        """Base discount factors with each scenario's zero rate shift, shape (scenarios, *times.shape)."""
+        base = self.builder.discount(times)
+        zero_shift = np.tensordot(shifts, key_rate_shifts(times, self.tenors), axes=1)
+        return base * np.exp(-zero_shift * np.asarray(times))
+
+    def values(self, shifts):
+        """Position values in dollars for key rate shift vectors of shape (scenarios, tenors)."""
+        shifts = np.atleast_2d(shifts)
+        flow_discount = self.discount(self.flow_times, shifts)
+        delivery_discount = self.discount(self.delivery_times, shifts)
+        forward = np.sum(self.flows * flow_discount, axis=-1) / delivery_discount - self.delivery_accrued
+        futures_prices = forward / self.conversion_factor
+
+        prices = futures_prices[:, self.contract_index]
+        if self.is_option.any():
+            T = self.expiry_times
+            rates = -np.log(self.discount(np.maximum(T, 1e-8), shifts)) / np.maximum(T, 1e-8)
+            premium, _, _ = black76(prices[:, self.is_option], self.strikes, T, self.volatilities, rates, self.is_call)
+            prices[:, self.is_option] = premium
+        return prices * self.positions['quantity'].to_numpy(dtype=float) * self.multiplier
+
+    def sensitivities(self, shapes, bump=BUMP):
+        """Central difference value change per position for a bump of each shape, positive when rates fall."""
+        shapes = np.asarray(shapes, dtype=float)
+        values = self.values(np.concatenate([-bump * shapes, bump * shapes]))
+        down, up = values[:len(shapes)], values[len(shapes):]
+        return (down - up) / 2
+
+    def key_rate_dv01(self):
+        """Dollar value of a 1bp fall in each key rate, per position, with a total row."""
+        dv01 = self.sensitivities(np.eye(len(self.tenors)))
+        frame = pd.DataFrame(dv01.T, index=self.position_labels(), columns=pd.Index(self.tenors, name='tenor'))
+        frame.loc['total'] = frame.sum()
+        return frame
+
+    def curve_risk(self):
+        """Dollar value of a 1bp parallel fall, twist flattener and butterfly belly rise, per position."""
+        shapes = curve_shapes(self.tenors)
+        risk = self.sensitivities(shapes.to_numpy())
+        frame = pd.DataFrame(risk.T, index=self.position_labels(), columns=shapes.index)
+        frame.loc['total'] = frame.sum()
+        return frame
+
+    def factor_risk(self, zero_rates, n_factors=N_FACTORS):
+        """Dollar P&L of a one standard deviation daily move of each principal component, per position."""
+        loadings, explained = pca_factors(zero_rates, n_factors)
+        pnl = self.values(loadings.to_numpy()) - self.values(np.zeros(len(self.tenors)))
+        frame = pd.DataFrame(pnl.T, index=self.position_labels(), columns=loadings.index)
+        frame.loc['total'] = frame.sum()
+        return frame, explained
+
+    def position_labels(self):
+        labels = []
+        for _, row in self.positions.iterrows():
+            if row['option_type'] in ('C', 'P'):
+                labels.append(f"{row['contract']} {pd.Timestamp(row['expiry']):%b%y} {row['strike']:g}{row['option_type']}")
+            else:
+                labels.append(row['contract'])
+        return labels
+
+
+def example_book():
+    """TU/FV/TY/US futures with their CTDs and a few TY options, for the current delivery cycle."""
+    contracts = pd.DataFrame({'coupon': [4.625, 3.75, 4.125, 4.375],
+                              'maturity': pd.to_datetime(['2028-09-30', '2030-06-30', '2033-08-15', '2043-08-15']),
+                              'conversion_factor': [0.9761, 0.8894, 0.8642, 0.7627],
+                              'delivery_date': pd.to_datetime(['2026-12-31'] * 4),
+                              'contract_size': [200_000, 100_000, 100_000, 100_000]},
+                             index=pd.Index(['TU', 'FV', 'TY', 'US'], name='contract'))
+    positions = pd.DataFrame([
+        ['TU', 50, None, np.nan, None, np.nan],
+        ['FV', -80, None, np.nan, None, np.nan],
+        ['TY', 120, None, np.nan, None, np.nan],
+        ['US', -30, None, np.nan, None, np.nan],
+        ['TY', -100, 'C', 118.5, '2026-11-20', 0.065],
+        ['TY', 150, 'P', 116.5, '2026-11-20', 0.07],
+    ], columns=POSITION_COLUMNS)
+    return contracts, positions
+
+
+if __name__ == "__main__":
+    import QuantLib as ql
+
+    from sofr_yield_curve import build_sofr_curve
+
+    builder = build_sofr_curve(ql.Date.todaysDate())
+    engine = CurveRiskEngine(builder, *example_book())
+    print(engine.key_rate_dv01().round(0))
+    print(engine.curve_risk().round(0))
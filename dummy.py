@@ -1,50 +1,36 @@
-import pandas as pd
-from sklearn.cluster import KMeans
+from correlation_engine import pair_names
+from regime_clustering import correlation_features, get_regime_clusterer, load_aligned_prices
+from regime_service import get_regime_service
 
 # Step 1: Data Preprocessing
 # Load data (assuming you have CSV files with date and price columns for each asset)
 assets = ['USDJPY', 'USDEUR', 'Oil', 'Gold', 'GermanBond', 'Nasdaq', 'USTreasuryBond']
-data = {}
-
-for asset in assets:
-    data[asset] = pd.read_csv(f'{asset}_prices.csv', index_col='Date', parse_dates=True)
-
-# Check for missing values and fill gaps if necessary
-for asset in assets:
-    data[asset] = data[asset].resample('D').ffill().dropna()
+# All assets in one aligned, forward filled daily frame, cached as a single Parquet file after the first read
+prices = load_aligned_prices(assets)
 
 # Normalize data if needed (e.g., dividing by the first value)
-# data['AssetName'] = data['AssetName'] / data['AssetName'].iloc[0]
+# prices = prices / prices.iloc[0]
 
 # Step 2: Convert Levels to Returns
-for asset in assets:
-    data[asset]['Return'] = data[asset]['Price'].pct_change().dropna()
+returns = prices.pct_change()
 
 # Step 3: Regime Identification Techniques
 
 # Rolling Correlations
 window_size = 30  # Adjust window size as needed
-rolling_correlations = pd.DataFrame()
+# Every unordered pair at once from running sums, one column per pair
+rolling_correlations = correlation_features(returns, window_size)
 
-for asset1 in assets:
-    for asset2 in assets:
-        if asset1 != asset2:
-            correlation = data[asset1]['Return'].rolling(window=window_size).corr(data[asset2]['Return'])
-            rolling_correlations[f'{asset1}_{asset2}_Corr'] = correlation
-
-# Cluster Analysis (K-Means Clustering)
+# Cluster Analysis (Mini-batch K-Means, persisted centroids only learn from the new windows)
 n_clusters = 3  # Adjust the number of clusters as needed
-X = rolling_correlations.dropna().values
-kmeans = KMeans(n_clusters=n_clusters, random_state=0).fit(X)
-rolling_correlations['Cluster'] = kmeans.labels_
+X = rolling_correlations.values
+clusterer = get_regime_clusterer('correlation_kmeans', rolling_correlations, n_clusters)
+rolling_correlations['Cluster'] = clusterer.labels(rolling_correlations[pair_names(assets)])
 
 # Regime Switching Models (e.g., Hidden Markov Model)
-# You may need to install the "hmmlearn" library for this part
-from hmmlearn import hmm
-
-model = hmm.GaussianHMM(n_components=n_clusters, covariance_type="full", n_iter=1000)
-model.fit(X)
-states = model.predict(X)
+# Fitted once and persisted, later runs only filter the new days
+service = get_regime_service('correlation_hmm', rolling_correlations[pair_names(assets)], n_clusters)
+states = service.filter_states(X).argmax(axis=1)
 rolling_correlations['HMM_State'] = states
 
 # Print the results
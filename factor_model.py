@@ -0,0 +1,208 @@
+import os
+import pickle
+import shutil
+import time
+
+import numpy as np
+import pandas as pd
+from sklearn.decomposition import IncrementalPCA
+
+# Factor model settings
+FACTOR_DIR = 'factor_data'  # Stored factor scores and loadings, one directory per model
+N_FACTORS = 3  # Principal components kept
+HALF_LIFE = 276 * 5  # Bars, a week of nearly round-the-clock 5 minute futures bars
+CHUNK_ROWS = 10000  # Bars per streamed chunk
+REFRESH = 500  # Bars between full eigendecompositions, subspace iteration steps in between
+
+
+def decay_for(half_life):
+    return 0.5 ** (1.0 / half_life)
+
+
+def align_signs(loadings, previous):
+    """Flip factors to keep the sign of the previous loadings, or a positive sum on the first fit."""
+    reference = previous if previous is not None else np.ones_like(loadings)
+    signs = np.where(np.sum(loadings * reference, axis=0) < 0, -1.0, 1.0)
+    return loadings * signs
+
+
+class FactorModel:
+    """
+    Streaming PCA factor model of asset returns.
+
+    With method 'ewma' the model keeps an exponentially weighted mean and covariance, decayed and updated once
+    per chunk of bars with one matrix product. The loadings follow with a single subspace iteration step per
+    chunk, an O(N^2 k) warm-started eigen update, with a full eigendecomposition every REFRESH bars to resync.
+    With method 'incremental' every chunk is a partial_fit of sklearn's IncrementalPCA, giving equal weight
+    to the whole history. Scores of a chunk use the loadings fitted before it, so they carry no look-ahead.
+    """
+
+    def __init__(self, assets, n_factors=N_FACTORS, method='ewma', half_life=HALF_LIFE, refresh=REFRESH):
+        self.assets = list(assets)
+        self.n_factors = n_factors
+        self.method = method
+        self.lam = decay_for(half_life)
+        self.refresh = refresh
+        n_assets = len(self.assets)
+
+        self.mean = np.zeros(n_assets)
+        self.covariance = np.zeros((n_assets, n_assets))
+        self.weight = 0.0  # Total weight seen, for the bias correction of the early estimates
+        self.loadings = None  # (assets, factors)
+        self.eigenvalues = None
+        self.n_bars = 0
+        self.bars_since_refresh = 0
+        self.last_timestamp = None  # Last bar streamed by run_factor_model
+        self.ipca = IncrementalPCA(n_components=n_factors) if method == 'incremental' else None
+
+    def update(self, chunk):
+        """Add a (bars, assets) chunk of returns and return its factor scores under the previous loadings."""
+        chunk = np.asarray(chunk, dtype=float)
+        scores = self.transform(chunk) if self.loadings is not None else np.full((len(chunk), self.n_factors),
+                                                                                   np.nan)
+        if self.method == 'incremental':
+            self.ipca.partial_fit(chunk)
+            self.mean = self.ipca.mean_
+            self.loadings = align_signs(self.ipca.components_.T, self.loadings)
+            self.eigenvalues = self.ipca.explained_variance_
+        elif self.method == 'ewma':
+            self.update_moments(chunk)
+            self.update_loadings(len(chunk))
+        else:
+            raise ValueError(f"Unknown factor model method {self.method}")
+        self.n_bars += len(chunk)
+        return scores
+
+    def update_moments(self, chunk):
+        """Decay the moments by lam^n and add the chunk with weights (1 - lam) lam^(n-1-t)."""
+        n = len(chunk)
+        weights = (1 - self.lam) * self.lam ** np.arange(n - 1, -1, -1)
+        decay = self.lam ** n
+        chunk_weight = weights.sum()
+
+        # Second moment about the running mean, then shifted to the new mean
+        mean = decay * self.mean * self.weight + weights @ chunk
+        total = decay * self.weight + chunk_weight
+        mean /= total
+        centred = chunk - mean
+        shift = self.mean - mean
+        self.covariance = (decay * self.weight * (self.covariance + np.outer(shift, shift))
+                           + (centred * weights[:, None]).T @ centred) / total
+        self.mean, self.weight = mean, total
+
+    def update_loadings(self, n_new):
+        self.bars_since_refresh += n_new
+        if self.loadings is None or self.bars_since_refresh >= self.refresh:
+            eigenvalues, eigenvectors = np.linalg.eigh(self.covariance)
+            order = np.argsort(eigenvalues)[::-1][:self.n_factors]
+            loadings, self.eigenvalues = eigenvectors[:, order], eigenvalues[order]
+            self.bars_since_refresh = 0
+        else:
+            # One orthogonal iteration step from the current loadings, then Rayleigh-Ritz within the subspace
+            basis, _ = np.linalg.qr(self.covariance @ self.loadings)
+            eigenvalues, rotation = np.linalg.eigh(basis.T @ self.covariance @ basis)
+            order = np.argsort(eigenvalues)[::-1]
+            loadings, self.eigenvalues = basis @ rotation[:, order], eigenvalues[order]
+        self.loadings = align_signs(loadings, self.loadings)
+
+    def transform(self, chunk):
+        return (np.asarray(chunk, dtype=float) - self.mean) @ self.loadings
+
+    def factor_names(self):
+        return [f'PC{i + 1}' for i in range(self.n_factors)]
+
+    def loadings_frame(self):
+        return pd.DataFrame(self.loadings, index=self.assets, columns=self.factor_names())
+
+    def explained_variance_ratio(self):
+        if self.method == 'incremental':
+            return pd.Series(self.ipca.explained_variance_ratio_, index=self.factor_names())
+        return pd.Series(self.eigenvalues / np.trace(self.covariance), index=self.factor_names())
+
+    def settings(self):
+        return self.assets, self.n_factors, self.method, self.lam, self.refresh
+
+    def save(self, model_file):
+        os.makedirs(os.path.dirname(model_file) or '.', exist_ok=True)
+        tmp_file = model_file + '.tmp'
+        with open(tmp_file, 'wb') as f:
+            pickle.dump(self, f)
+        os.replace(tmp_file, model_file)
+
+
+def model_file_for(name, factor_dir=FACTOR_DIR):
+    return os.path.join(factor_dir, name, 'model.pkl')
+
+
+def load_factor_model(name, factor_dir=FACTOR_DIR):
+    """The persisted model state of a stored factor model, None when there is none."""
+    model_file = model_file_for(name, factor_dir)
+    if not os.path.exists(model_file):
+        return None
+    with open(model_file, 'rb') as f:
+        return pickle.load(f)
+
+
+def write_factor_data(model, index, scores, name, factor_dir=FACTOR_DIR):
+    """Append a chunk of scores and a snapshot of the loadings as Parquet parts under factor_dir/name."""
+    directory = os.path.join(factor_dir, name)
+    os.makedirs(os.path.join(directory, 'scores'), exist_ok=True)
+    os.makedirs(os.path.join(directory, 'loadings'), exist_ok=True)
+    stamp = f"{pd.Timestamp(index[0]):%Y%m%d%H%M%S}-{time.time_ns()}"
+    pd.DataFrame(scores.astype(np.float32), index=index, columns=model.factor_names()).to_parquet(
+        os.path.join(directory, 'scores', f"scores-{stamp}.parquet"))
+    loadings = model.loadings_frame().rename_axis('asset').reset_index()
+    loadings.insert(0, 'timestamp', pd.Timestamp(index[-1]))
+    loadings.to_parquet(os.path.join(directory, 'loadings', f"loadings-{stamp}.parquet"), index=False)
+
+
+def load_factor_scores(name, start=None, end=None, factor_dir=FACTOR_DIR):
+    scores = pd.read_parquet(os.path.join(factor_dir, name, 'scores')).sort_index()
+    # A part written before an interrupted run saved its state is written again by the next run, keep the latest
+    scores = scores[~scores.index.duplicated(keep='last')]
+    return scores.loc[start:end]
+
+
+def load_loadings(name, at=None, factor_dir=FACTOR_DIR):
+    """Loadings in force at a time, the latest snapshot by default, as an (assets, factors) frame."""
+    snapshots = pd.read_parquet(os.path.join(factor_dir, name, 'loadings'))
+    if at is not None:
+        snapshots = snapshots[snapshots['timestamp'] <= pd.Timestamp(at)]
+    latest = snapshots[snapshots['timestamp'] == snapshots['timestamp'].max()]
+    return latest.drop(columns='timestamp').set_index('asset')
+
+
+def run_factor_model(returns, name, n_factors=N_FACTORS, method='ewma', half_life=HALF_LIFE,
+                     chunk_rows=CHUNK_ROWS, factor_dir=FACTOR_DIR):
+    """
+    Stream a return frame through a factor model chunk by chunk, storing the scores and loadings.
+
+    The model state is persisted with the last streamed bar after every chunk, so a later run with the same
+    settings resumes from it and only streams the newer bars. A stored model with other assets or settings is
+    replaced, together with its scores and loadings.
+    """
+    model = FactorModel(returns.columns, n_factors, method, half_life)
+    stored = load_factor_model(name, factor_dir)
+    if stored is not None and stored.settings() == model.settings():
+        model = stored
+        returns = returns[returns.index > model.last_timestamp]
+    elif os.path.isdir(os.path.join(factor_dir, name)):
+        shutil.rmtree(os.path.join(factor_dir, name))
+
+    for start in range(0, len(returns), chunk_rows):
+        chunk = returns.iloc[start:start + chunk_rows]
+        scores = model.update(chunk.to_numpy(dtype=float))
+        write_factor_data(model, chunk.index, scores, name, factor_dir)
+        model.last_timestamp = chunk.index[-1]
+        model.save(model_file_for(name, factor_dir))
+    return model
+
+
+if __name__ == "__main__":
+    from intraday_data_store import FUTURE_SYMBOLS
+    from var_engine import load_factor_returns
+
+    returns = load_factor_returns(FUTURE_SYMBOLS, interval='5m')
+    model = run_factor_model(returns, 'futures_5m')
+    print(model.loadings_frame())
+    print(model.explained_variance_ratio())
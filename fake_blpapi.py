@@ -0,0 +1,498 @@
+'''
+In-process stand-in for the parts of blpapi this codebase uses, for tests and offline benchmarks.
+
+Call install() before importing the Bloomberg modules so that "import blpapi" resolves to this module.
+Requests are answered from REQUEST_HANDLERS with deterministic synthetic data, split into PARTIAL_RESPONSE
+events followed by a final RESPONSE, and events of concurrent requests are interleaved so that callers
+must route them by correlation ID. FakeSession.drop() simulates a lost connection and fail_next injects
+request failures. Subscriptions are acknowledged with SubscriptionStarted and fed by a MockPublisher, which
+publishes random-walk SUBSCRIPTION_DATA at a target rate for load tests.
+'''
+import datetime
+import itertools
+import queue
+import sys
+import threading
+import time
+import zlib
+
+import numpy as np
+
+
+class Event:
+    ADMIN = 1
+    SESSION_STATUS = 2
+    SUBSCRIPTION_STATUS = 3
+    REQUEST_STATUS = 4
+    RESPONSE = 5
+    PARTIAL_RESPONSE = 6
+    SUBSCRIPTION_DATA = 8
+    SERVICE_STATUS = 9
+    TIMEOUT = 10
+
+    def __init__(self, event_type, messages=()):
+        self._event_type = event_type
+        self._messages = list(messages)
+
+    def eventType(self):
+        return self._event_type
+
+    def __iter__(self):
+        return iter(self._messages)
+
+
+class CorrelationId:
+    _ids = itertools.count(1)
+
+    def __init__(self, value=None):
+        self._value = next(self._ids) if value is None else value
+
+    def value(self):
+        return self._value
+
+    def __eq__(self, other):
+        return isinstance(other, CorrelationId) and other._value == self._value
+
+    def __hash__(self):
+        return hash(self._value)
+
+    def __repr__(self):
+        return f"CorrelationId({self._value!r})"
+
+
+class Element:
+    """Read/write view over nested dicts, lists and scalars, with the blpapi accessor names."""
+
+    def __init__(self, name, value=None):
+        self._name = name
+        self._value = value
+
+    def name(self):
+        return self._name
+
+    def hasElement(self, name):
+        value = _deref(self._value)
+        return isinstance(value, dict) and name in value
+
+    def getElement(self, name):
+        value = _deref(self._value)
+        if not isinstance(value, dict):
+            # Sub-element of a request being built
+            value = {}
+            self._value.set(value) if isinstance(self._value, _Ref) else setattr(self, '_value', value)
+        if name not in value:
+            value[name] = None
+        return Element(name, _Ref(value, name))
+
+    def numValues(self):
+        value = _deref(self._value)
+        return len(value) if isinstance(value, list) else int(value is not None)
+
+    def getValueAsElement(self, index=0):
+        return Element(self._name, _deref(self._value)[index])
+
+    def getValue(self, index=0):
+        value = _deref(self._value)
+        return value[index] if isinstance(value, list) else value
+
+    def values(self):
+        value = _deref(self._value)
+        items = value if isinstance(value, list) else [value]
+        return [Element(self._name, item) if isinstance(item, dict) else item for item in items]
+
+    def getElementValue(self, name):
+        return _deref(self._value)[name]
+
+    def getElementAsFloat(self, name):
+        return float(self.getElementValue(name))
+
+    def getElementAsInteger(self, name):
+        return int(self.getElementValue(name))
+
+    def getElementAsString(self, name):
+        return str(self.getElementValue(name))
+
+    def getElementAsDatetime(self, name):
+        return self.getElementValue(name)
+
+    # Request building
+    def setValue(self, value):
+        self._value.set(value)
+
+    def appendValue(self, value):
+        self._value.append(value)
+
+    def set(self, name, value):
+        self.getElement(name).setValue(value)
+
+    def append(self, name, value):
+        self.getElement(name).appendValue(value)
+
+    def toPy(self):
+        return _deref(self._value)
+
+
+class _Ref:
+    """Slot inside a parent dict, so request elements can be assigned and appended in place."""
+
+    def __init__(self, parent, key):
+        self.parent, self.key = parent, key
+
+    def get(self):
+        return self.parent[self.key]
+
+    def set(self, value):
+        self.parent[self.key] = value
+
+    def append(self, value):
+        if not isinstance(self.parent[self.key], list):
+            self.parent[self.key] = []
+        self.parent[self.key].append(value)
+
+
+def _deref(value):
+    return value.get() if isinstance(value, _Ref) else value
+
+
+class Message(Element):
+    def __init__(self, message_type, value, correlation_id=None, topic=None):
+        super().__init__(message_type, value)
+        self._correlation_id = correlation_id
+        self._topic = topic
+
+    def messageType(self):
+        return self._name
+
+    def correlationIds(self):
+        return [self._correlation_id] if self._correlation_id is not None else []
+
+    def topicName(self):
+        return self._topic
+
+
+class Request(Element):
+    def __init__(self, request_type):
+        super().__init__(request_type, {})
+
+    def requestType(self):
+        return self._name
+
+
+class Service:
+    def __init__(self, name):
+        self._name = name
+
+    def name(self):
+        return self._name
+
+    def createRequest(self, request_type):
+        return Request(request_type)
+
+
+class SubscriptionList:
+    def __init__(self):
+        self.entries = []  # (topic, fields, options, correlation id)
+
+    def add(self, topic, fields=None, options=None, correlationId=None):
+        fields = fields.split(",") if isinstance(fields, str) else list(fields or [])
+        self.entries.append((topic, fields, options, correlationId or CorrelationId()))
+        return 0
+
+    def size(self):
+        return len(self.entries)
+
+
+class SessionOptions:
+    def __init__(self):
+        self.host, self.port = "localhost", 8194
+
+    def setServerHost(self, host):
+        self.host = host
+
+    def setServerPort(self, port):
+        self.port = port
+
+
+def intraday_bars(request):
+    """Deterministic one-bar-per-interval random walk over the requested range."""
+    security = request.getElement("security").toPy()
+    start = datetime.datetime.fromisoformat(request.getElement("startDateTime").toPy().rstrip("Z"))
+    end = datetime.datetime.fromisoformat(request.getElement("endDateTime").toPy().rstrip("Z"))
+    interval = int(request.getElement("interval").toPy() or 1)
+
+    minutes = int((end - start).total_seconds() // 60) // interval + 1
+    times = [start + datetime.timedelta(minutes=i * interval) for i in range(max(minutes, 0))]
+    # Seed per (security, start) so overlapping requests return the same bars
+    rng = np.random.default_rng(zlib.crc32(f"{security}{start.isoformat()}".encode()))
+    close = 110 + np.cumsum(rng.normal(0, 0.01, len(times)))
+    bars = [{"time": t, "open": c - 0.005, "high": c + 0.01, "low": c - 0.01, "close": c, "volume": 100 + i % 50,
+             "numEvents": 10} for i, (t, c) in enumerate(zip(times, close))]
+    return "IntradayBarResponse", [{"barData": {"barTickData": chunk}} for chunk in _chunks(bars)]
+
+
+def _chunks(items, size=None):
+    size = size or FakeSession.partial_size
+    return [items[i:i + size] for i in range(0, len(items), size)] or [[]]
+
+
+# Reference data served by the fake, security -> {field: value}; missing values are synthesised
+REFERENCE_DATA = {}
+
+
+def reference_value(security, field):
+    if field in REFERENCE_DATA.get(security, {}):
+        return REFERENCE_DATA[security][field]
+    seed = zlib.crc32(f"{security}|{field}".encode())
+    if field.endswith("_DT"):
+        return datetime.date(2023, 9, 1) + datetime.timedelta(days=seed % 120)
+    return 90 + (seed % 1000) / 100
+
+
+def reference_data(request):
+    """One securityData entry per requested security with every requested field."""
+    securities = request.getElement("securities").toPy() or []
+    fields = request.getElement("fields").toPy() or []
+    security_data = [{"security": security, "sequenceNumber": i,
+                      "fieldData": {field: reference_value(security, field) for field in fields}}
+                     for i, security in enumerate(securities)]
+    return "ReferenceDataResponse", [{"securityData": chunk} for chunk in _chunks(security_data)]
+
+
+# Request type -> handler returning (response message type, [message payloads])
+REQUEST_HANDLERS = {
+    "IntradayBarRequest": intraday_bars,
+    "ReferenceDataRequest": reference_data,
+}
+
+
+class FakeSession:
+    """Single in-process session answering requests through REQUEST_HANDLERS."""
+    partial_size = 500  # Items per partial response message
+
+    def __init__(self, options=None, eventHandler=None):
+        self.options = options or SessionOptions()
+        self.event_handler = eventHandler
+        self.events = queue.Queue()
+        self.in_flight = {}  # correlation id -> pending (event type, message) list
+        self.services = {}
+        self.started = False
+        self.lock = threading.Lock()
+        self.dispatcher = None
+        self.fail_next = 0  # Number of upcoming requests answered with a RequestFailure
+        self.hang_next = 0  # Number of upcoming requests that are never answered
+        self.subscriptions = {}  # correlation id -> (topic, fields)
+
+    def start(self):
+        self.started = True
+        self._push(Event(Event.SESSION_STATUS, [Message("SessionStarted", {})]))
+        if self.event_handler is not None:
+            self.dispatcher = threading.Thread(target=self._dispatch, daemon=True)
+            self.dispatcher.start()
+        return True
+
+    def startAsync(self):
+        return self.start()
+
+    def stop(self):
+        if self.started:
+            self.started = False
+            self._push(Event(Event.SESSION_STATUS, [Message("SessionTerminated", {})]))
+        if self.dispatcher is not None and self.dispatcher is not threading.current_thread():
+            self.dispatcher.join(timeout=1)
+        return True
+
+    def drop(self):
+        """Simulate a lost connection, outstanding requests are never answered."""
+        with self.lock:
+            self.in_flight.clear()
+        self.started = False
+        self._push(Event(Event.SESSION_STATUS, [Message("SessionConnectionDown", {})]))
+
+    def openService(self, name):
+        self.services[name] = Service(name)
+        return True
+
+    def getService(self, name):
+        if name not in self.services:
+            self.openService(name)
+        return self.services[name]
+
+    def createRequest(self, request_type):
+        return Request(request_type)
+
+    def sendRequest(self, request, correlationId=None, identity=None):
+        correlation_id = correlationId or CorrelationId()
+        if self.fail_next > 0:
+            self.fail_next -= 1
+            failure = {"reason": {"category": "TIMEOUT", "description": "Injected failure"}}
+            self._push(Event(Event.REQUEST_STATUS, [Message("RequestFailure", failure, correlation_id)]))
+            return correlation_id
+        if self.hang_next > 0:
+            self.hang_next -= 1
+            return correlation_id
+
+        message_type, payloads = REQUEST_HANDLERS[request.requestType()](request)
+        with self.lock:
+            self.in_flight[correlation_id] = [(Event.PARTIAL_RESPONSE, Message(message_type, p, correlation_id))
+                                              for p in payloads]
+            self.in_flight[correlation_id][-1] = (Event.RESPONSE, self.in_flight[correlation_id][-1][1])
+        return correlation_id
+
+    def cancel(self, correlationId):
+        with self.lock:
+            self.in_flight.pop(correlationId, None)
+
+    def subscribe(self, subscriptionList, identity=None):
+        with self.lock:
+            for topic, fields, _, correlation_id in subscriptionList.entries:
+                self.subscriptions[correlation_id] = (topic, fields)
+        self._push(Event(Event.SUBSCRIPTION_STATUS, [Message("SubscriptionStarted", {}, correlation_id)
+                                                     for _, _, _, correlation_id in subscriptionList.entries]))
+
+    def unsubscribe(self, subscriptionList):
+        with self.lock:
+            for _, _, _, correlation_id in subscriptionList.entries:
+                self.subscriptions.pop(correlation_id, None)
+
+    def publish(self, messages):
+        """Deliver one SUBSCRIPTION_DATA event of (correlation id, {field: value}) updates."""
+        self._push(Event(Event.SUBSCRIPTION_DATA, [Message("MarketDataEvents", values, correlation_id)
+                                                   for correlation_id, values in messages]))
+
+    def _pump(self):
+        """Move one message of every in-flight request onto the event queue, round robin."""
+        with self.lock:
+            for correlation_id in list(self.in_flight):
+                event_type, message = self.in_flight[correlation_id].pop(0)
+                self.events.put(Event(event_type, [message]))
+                if not self.in_flight[correlation_id]:
+                    del self.in_flight[correlation_id]
+
+    def _push(self, event):
+        self.events.put(event)
+
+    def nextEvent(self, timeout=0):
+        """Next event, or a TIMEOUT event when nothing arrives in time (immediately for timeout=0)."""
+        if self.events.empty():
+            self._pump()
+        try:
+            return self.events.get(timeout=timeout / 1000) if timeout else self.events.get_nowait()
+        except queue.Empty:
+            return Event(Event.TIMEOUT)
+
+    def tryNextEvent(self):
+        if self.events.empty():
+            self._pump()
+        try:
+            return self.events.get_nowait()
+        except queue.Empty:
+            return None
+
+    def _dispatch(self):
+        while self.started or not self.events.empty():
+            event = self.nextEvent(50)
+            if event.eventType() != Event.TIMEOUT:
+                self.event_handler(event, self)
+
+
+Session = FakeSession
+
+
+class MockPublisher:
+    """
+    Publishes random-walk updates for every subscription of a session at about rate updates per second,
+    starting from the topic's PX_LAST reference value.
+
+    Updates are grouped batch per event like the real API does under load. Each update carries one or two of
+    the subscribed fields, so consumers see partial updates that must be coalesced.
+    """
+
+    def __init__(self, session, rate=5000, batch=50, seed=0):
+        self.session = session
+        self.rate = rate
+        self.batch = batch
+        self.rng = np.random.default_rng(seed)
+        self.prices = {}  # correlation id -> last price
+        self.published = 0
+        self.running = False
+        self.thread = None
+
+    def next_updates(self):
+        with self.session.lock:
+            subscriptions = list(self.session.subscriptions.items())
+        if not subscriptions:
+            return []
+        picks = self.rng.integers(len(subscriptions), size=self.batch)
+        moves = self.rng.normal(0, 0.001, self.batch)
+        updates = []
+        for pick, move in zip(picks, moves):
+            correlation_id, (topic, fields) = subscriptions[pick]
+            price = self.prices[correlation_id] = self.prices.get(correlation_id, reference_value(topic, "PX_LAST")) + move
+            values = {}
+            for field in fields[:2] if fields else ["LAST_PRICE"]:
+                values[field] = price - 0.005 if field == "BID" else price + 0.005 if field == "ASK" else price
+            updates.append((correlation_id, values))
+        return updates
+
+    def run(self):
+        interval = self.batch / self.rate
+        next_time = time.perf_counter()
+        while self.running:
+            updates = self.next_updates()
+            if updates:
+                self.session.publish(updates)
+                self.published += len(updates)
+            next_time += interval
+            time.sleep(max(next_time - time.perf_counter(), 0))
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.running = False
+        if self.thread is not None:
+            self.thread.join()
+
+
+def install():
+    """Make "import blpapi" resolve to this module."""
+    sys.modules["blpapi"] = sys.modules[__name__]
+    return sys.modules[__name__]
+
+
+if __name__ == "__main__":
+    # Offline benchmark of request multiplexing and streaming through the shared session manager
+    install()
+    from bbg_session import get_session_manager, reset_session_manager
+
+    manager = get_session_manager()
+    n_requests = 200
+    start = time.perf_counter()
+    futures = []
+    for i in range(n_requests):
+        request = manager.create_request("ReferenceDataRequest")
+        request.append("securities", f"SR3{i} Comdty")
+        request.append("fields", "PX_LAST")
+        futures.append(manager.send(request))
+    for future in futures:
+        future.result()
+    elapsed = time.perf_counter() - start
+    print(f"{n_requests} concurrent requests in {elapsed * 1e3:.1f} ms on one session")
+
+    from market_data import MarketDataService
+
+    service = MarketDataService(manager)
+    service.subscribe([f"SFR{m}{y} Comdty" for y in range(4, 9) for m in "HMUZ"] + [f"TY{i} Comdty" for i in range(80)])
+    received = [0]
+    consumer = service.add_consumer(lambda batch: received.__setitem__(0, received[0] + len(batch)))
+    publisher = MockPublisher(manager.session, rate=20000).start()
+    time.sleep(2)
+    publisher.stop()
+    time.sleep(0.2)
+    print(f"Published {publisher.published / 2:.0f} updates/s, coalesced {service.updates}, "
+          f"consumer received {received[0]} batched, {consumer.conflated} conflated")
+    service.stop()
+    reset_session_manager()
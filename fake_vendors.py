@@ -0,0 +1,92 @@
+'''
+Local stand-ins for market data vendors, for tests and offline benchmarks of the request scheduler.
+
+A StandInVendor answers yfinance-style download() calls with deterministic synthetic prices after a
+configurable latency and fails a configurable share of calls. It records every call, so tests can check the
+rate limit, the concurrency cap and how many identical requests were merged.
+'''
+import threading
+import time
+import zlib
+
+import numpy as np
+import pandas as pd
+
+from request_scheduler import TransientError
+
+
+class VendorError(TransientError):
+    """Injected vendor failure, e.g. a rate limit rejection or a dropped connection."""
+
+
+class StandInVendor:
+    def __init__(self, latency=0.05, failure_rate=0.0, seed=0):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.rng = np.random.default_rng(seed)
+        self.lock = threading.Lock()
+        self.calls = []  # (start time, arguments)
+        self.active = 0
+        self.max_active = 0
+
+    def download(self, tickers, start=None, end=None, interval='1d', period='60d', **kwargs):
+        """Daily or intraday closes of the tickers, shaped like yf.download."""
+        with self.lock:
+            self.calls.append((time.monotonic(), (tickers, start, end, interval, period)))
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+            fail = self.rng.random() < self.failure_rate
+        try:
+            time.sleep(self.latency)
+            if fail:
+                raise VendorError("Injected vendor failure")
+            return synthetic_prices(tickers, start, end, interval, period)
+        finally:
+            with self.lock:
+                self.active -= 1
+
+    def call_rate(self):
+        """Observed calls per second over the recorded calls."""
+        times = [t for t, _ in self.calls]
+        return (len(times) - 1) / (times[-1] - times[0]) if len(times) > 1 and times[-1] > times[0] else np.nan
+
+
+def synthetic_prices(tickers, start=None, end=None, interval='1d', period='60d'):
+    """Deterministic OHLCV random walk per ticker, one column level per field like a multi-ticker download."""
+    tickers = [tickers] if isinstance(tickers, str) else list(tickers)
+    freq = 'B' if interval == '1d' else interval.replace('m', 'min')
+    end = pd.Timestamp(end) if end is not None else pd.Timestamp('2023-09-29')
+    start = pd.Timestamp(start) if start is not None else end - pd.Timedelta(days=int(period.rstrip('d')))
+    index = pd.date_range(start, end, freq=freq, name='Date' if interval == '1d' else 'Datetime')
+    columns = {}
+    for ticker in tickers:
+        rng = np.random.default_rng(zlib.crc32(ticker.encode()))
+        close = 100 * np.exp(np.cumsum(rng.normal(0, 0.005, len(index))))
+        columns.update({('Open', ticker): close, ('High', ticker): close * 1.002, ('Low', ticker): close * 0.998,
+                        ('Close', ticker): close, ('Adj Close', ticker): close,
+                        ('Volume', ticker): np.full(len(index), 1000.0)})
+    return pd.DataFrame(columns, index=index)
+
+
+if __name__ == "__main__":
+    # Offline benchmark: dashboards requesting overlapping tickers through the shared scheduler
+    from concurrent.futures import wait
+
+    from request_scheduler import RequestScheduler, request_key
+
+    vendor = StandInVendor(latency=0.2, failure_rate=0.1)
+    scheduler = RequestScheduler()
+    tickers = ['ZN=F', 'ZB=F', 'ZF=F', 'ZT=F', 'ES=F', 'NQ=F']
+    start = time.perf_counter()
+    futures = []
+    for dashboard in range(10):
+        for ticker in tickers:
+            key = request_key(ticker, period='60d')
+            futures.append(scheduler.submit_threadsafe('yahoo', key, vendor.download, ticker, period='60d'))
+    done, _ = wait(futures)
+    elapsed = time.perf_counter() - start
+    failed = sum(f.exception() is not None for f in done)
+    print(f"{len(futures)} requests, {len(vendor.calls)} vendor calls in {elapsed:.2f} s, {failed} failed, "
+          f"max {vendor.max_active} concurrent, {vendor.call_rate():.2f} calls/s")
+    print(scheduler.metrics())
+    scheduler.stop()
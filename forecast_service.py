@@ -0,0 +1,198 @@
+import json
+import os
+import pickle
+import warnings
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+
+# Service settings
+MODEL_DIR = 'forecast_models'  # Cached ARIMA fits and Prophet parameters, one file per symbol and model
+FORECAST_DIR = 'forecast_data'  # Stored forecasts, one Parquet file per symbol and model
+HORIZON = 12  # Periods forecast ahead
+ALPHA = 0.05  # Confidence intervals at 1 - ALPHA
+SEASONAL_PERIOD = 12  # m of the seasonal ARIMA search
+RESEARCH_EVERY = 20  # Incremental updates before the ARIMA orders are searched again
+N_CHANGEPOINTS = 25  # Prophet trend changepoints, fixed so cached parameters fit the next model
+MODELS = ['arima', 'prophet']
+
+FORECAST_COLUMNS = ['origin', 'date', 'forecast', 'lower', 'upper']
+
+
+def load_closes(symbols, interval='5m', resample='1D', parquet_dir=None):
+    """Closes of each stored symbol, resampled to the forecast frequency, as a dict of series."""
+    from intraday_data_store import PARQUET_DIR, load_data_from_parquet, table_name_for
+
+    closes = {}
+    for symbol in symbols:
+        data = load_data_from_parquet(parquet_dir or PARQUET_DIR, table_name_for(symbol, interval))
+        if data.empty:
+            continue
+        close = data['Close'].squeeze()
+        if resample is not None:
+            close = close.resample(resample).last()
+        close = close.dropna()
+        closes[symbol] = close.tz_localize(None) if close.index.tz is not None else close
+    return closes
+
+
+def cache_file(symbol, model, extension, model_dir=MODEL_DIR):
+    return os.path.join(model_dir, f"{symbol.replace('=', '_')}_{model}.{extension}")
+
+
+def future_dates(index, periods):
+    """Dates after the last observation at the series' own frequency, business days when it has none."""
+    freq = pd.infer_freq(index[-10:]) if len(index) >= 10 else None
+    return pd.date_range(index[-1], periods=periods + 1, freq=freq or 'B', inclusive='right')
+
+
+def fit_arima(close):
+    import pmdarima as pm
+
+    return pm.auto_arima(close.to_numpy(), seasonal=True, m=SEASONAL_PERIOD, stepwise=True,
+                         suppress_warnings=True, error_action="ignore")
+
+
+def arima_forecast(symbol, close, horizon=HORIZON, alpha=ALPHA, model_dir=MODEL_DIR):
+    """
+    Forecast with the cached ARIMA model brought up to date.
+
+    New observations since the cached fit are added with ARIMA.update, which refits the parameters from the
+    previous estimates with the chosen orders, the stepwise order search is only run when nothing is cached or
+    every RESEARCH_EVERY updates.
+    """
+    path = cache_file(symbol, 'arima', 'pkl', model_dir)
+    cached = None
+    if os.path.exists(path):
+        with open(path, 'rb') as f:
+            cached = pickle.load(f)
+
+    if cached is not None and cached['updates'] < RESEARCH_EVERY and close.index[-1] >= cached['last_timestamp']:
+        model = cached['model']
+        new = close[close.index > cached['last_timestamp']]
+        state = None
+        if len(new):
+            model.update(new.to_numpy())
+            state = {'model': model, 'last_timestamp': close.index[-1], 'updates': cached['updates'] + 1}
+    else:
+        model = fit_arima(close)
+        state = {'model': model, 'last_timestamp': close.index[-1], 'updates': 0}
+
+    if state is not None:  # Nothing to store when there are no new bars
+        os.makedirs(model_dir, exist_ok=True)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(state, f)
+        os.replace(tmp_path, path)
+
+    forecast, conf_int = model.predict(n_periods=horizon, return_conf_int=True, alpha=alpha)
+    return pd.DataFrame({'origin': close.index[-1], 'date': future_dates(close.index, horizon),
+                         'forecast': np.asarray(forecast), 'lower': conf_int[:, 0], 'upper': conf_int[:, 1]})
+
+
+def prophet_init(model):
+    """Fitted Prophet parameters in the form fit() accepts as a warm start."""
+    params = {name: float(model.params[name][0][0]) for name in ['k', 'm', 'sigma_obs']}
+    params.update({name: model.params[name][0].tolist() for name in ['delta', 'beta']})
+    return params
+
+
+def prophet_forecast(symbol, close, horizon=HORIZON, alpha=ALPHA, model_dir=MODEL_DIR):
+    """
+    Forecast with Prophet refitted on the full history, warm-started from the cached parameters.
+
+    Prophet cannot add observations to a fit, but starting the optimiser at the previous optimum makes the
+    nightly refit a few iterations.
+    """
+    from prophet import Prophet
+
+    path = cache_file(symbol, 'prophet', 'json', model_dir)
+    init = None
+    if os.path.exists(path):
+        with open(path) as f:
+            init = {name: np.asarray(value) if isinstance(value, list) else value
+                    for name, value in json.load(f).items()}
+
+    model = Prophet(seasonality_mode='multiplicative', daily_seasonality=False, weekly_seasonality=False,
+                    yearly_seasonality=True, interval_width=1 - alpha, n_changepoints=N_CHANGEPOINTS)
+    df = pd.DataFrame({'ds': close.index, 'y': close.to_numpy()})
+    if init is not None and len(init['delta']) == N_CHANGEPOINTS:
+        model.fit(df, init=init)
+    else:
+        model.fit(df)
+
+    os.makedirs(model_dir, exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(prophet_init(model), f)
+
+    future = pd.DataFrame({'ds': future_dates(close.index, horizon)})
+    forecast = model.predict(future)
+    return pd.DataFrame({'origin': close.index[-1], 'date': forecast['ds'], 'forecast': forecast['yhat'],
+                         'lower': forecast['yhat_lower'], 'upper': forecast['yhat_upper']})
+
+
+def forecast_task(symbol, model, close, horizon=HORIZON, alpha=ALPHA, model_dir=MODEL_DIR):
+    """Worker task, one symbol and model."""
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        if model == 'arima':
+            return arima_forecast(symbol, close, horizon, alpha, model_dir)
+        if model == 'prophet':
+            return prophet_forecast(symbol, close, horizon, alpha, model_dir)
+    raise ValueError(f"Unknown forecast model {model}")
+
+
+def store_forecast(forecast, symbol, model, forecast_dir=FORECAST_DIR):
+    """
+    Add a forecast to the stored ones, replacing an earlier forecast from the same origin.
+
+    The file is written to a temporary file and swapped in, so an interrupted run leaves the stored forecasts
+    intact.
+    """
+    os.makedirs(forecast_dir, exist_ok=True)
+    path = os.path.join(forecast_dir, f"{symbol.replace('=', '_')}_{model}.parquet")
+    if os.path.exists(path):
+        stored = pd.read_parquet(path)
+        forecast = pd.concat([stored[stored['origin'] != forecast['origin'].iloc[0]], forecast])
+    tmp_path = path + '.tmp'
+    forecast[FORECAST_COLUMNS].sort_values(['origin', 'date']).to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, path)
+
+
+def load_forecasts(symbol, model, origin=None, forecast_dir=FORECAST_DIR):
+    """Stored forecasts of a symbol, the latest origin by default."""
+    stored = pd.read_parquet(os.path.join(forecast_dir, f"{symbol.replace('=', '_')}_{model}.parquet"))
+    origin = stored['origin'].max() if origin is None else pd.Timestamp(origin)
+    return stored[stored['origin'] == origin].set_index('date')
+
+
+def run_forecasts(closes, models=MODELS, horizon=HORIZON, alpha=ALPHA, n_workers=None, model_dir=MODEL_DIR,
+                  forecast_dir=FORECAST_DIR):
+    """
+    Forecast every series with every model in a process pool and store the results.
+
+    closes maps symbols to price series. Returns the forecasts keyed by (symbol, model), failures are reported
+    as the exception instead of stopping the other series.
+    """
+    results = {}
+    with ProcessPoolExecutor(max_workers=n_workers) as executor:
+        futures = {executor.submit(forecast_task, symbol, model, close, horizon, alpha, model_dir): (symbol, model)
+                   for symbol, close in closes.items() for model in models}
+        for future in as_completed(futures):
+            symbol, model = futures[future]
+            try:
+                results[symbol, model] = future.result()
+            except Exception as e:
+                results[symbol, model] = e
+                continue
+            store_forecast(results[symbol, model], symbol, model, forecast_dir)
+    return results
+
+
+if __name__ == "__main__":
+    from intraday_data_store import FUTURE_SYMBOLS
+
+    for (symbol, model), result in sorted(run_forecasts(load_closes(FUTURE_SYMBOLS)).items()):
+        print(symbol, model)
+        print(result)
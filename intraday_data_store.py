@@ -1,8 +1,11 @@
 import yfinance as yf
 import pandas as pd
+import glob
 import os
 from sqlalchemy import create_engine, text
 
+from request_scheduler import scheduled_call
+
 # Symbols
 FUTURE_SYMBOL = 'ES=F'  # Example: S&P 500 E-mini futures
 FUTURE_SYMBOLS = ['ES=F', 'ZN=F', 'ZB=F', 'ZT=F', 'ZF=F', 'NQ=F', 'HG=F',  'CL=F', 'RTY=F'] #'DX-Y.NYB',
@@ -34,7 +37,7 @@ def create_index(db_engine, table_name, column_name):
 
 def download_intraday_data(symbol, interval, period='60d'):
     """Download intraday data for a given symbol."""
-    data = yf.download(tickers=symbol, interval=interval, period=period)
+    data = scheduled_call('yahoo', yf.download, tickers=symbol, interval=interval, period=period)
     return data
 
 
@@ -71,18 +74,30 @@ def load_data_from_db(table_name, db_engine):
     """Load the data from the SQLite database."""
     try:
         query = text(f"SELECT * FROM {table_name}")
-        return pd.read_sql(query, db_engine, index_col='Datetime', parse_dates=True)
+        return pd.read_sql(query, db_engine, index_col='Datetime', parse_dates=['Datetime'])
     except Exception:  # Handle case where table does not exist
         return pd.DataFrame()
 
 
+def stored_timestamps(table_name, db_engine, start, end):
+    """Timestamps already in the database between start and end, read through the Datetime index."""
+    try:
+        query = text(f"SELECT Datetime FROM {table_name} WHERE Datetime BETWEEN :start AND :end")
+        # Same text form as the timestamps written by to_sql, so the string comparison orders them
+        params = {'start': f"{start:%Y-%m-%d %H:%M:%S.%f}", 'end': f"{end:%Y-%m-%d %H:%M:%S.%f}"}
+        return pd.DatetimeIndex(pd.read_sql(query, db_engine, params=params, parse_dates=['Datetime'])['Datetime'])
+    except Exception:  # Handle case where table does not exist
+        return pd.DatetimeIndex([])
+
+
 def compare_and_update_data(new_data, existing_data):
     """Compare and update the existing data if new data is better."""
     if existing_data.empty:
         return new_data
 
-    # Combine datasets and drop duplicates
-    combined_data = pd.concat([existing_data, new_data]).drop_duplicates()
+    # Combine datasets, a bar of the new data replaces the stored bar at the same time
+    combined_data = pd.concat([existing_data, new_data])
+    combined_data = combined_data[~combined_data.index.duplicated(keep='last')]
 
     # Sort by datetime to maintain order
     combined_data = combined_data.sort_index()
@@ -90,28 +105,41 @@ def compare_and_update_data(new_data, existing_data):
     return combined_data
 
 
+def table_name_for(symbol, interval):
+    """Store table name of a symbol at a bar interval."""
+    return f"{symbol.replace('=', '_').replace(' ', '_')}_{interval}"
+
+
 def update_intraday_data(symbol, interval, db_file, parquet_dir):
     """Main function to update intraday data in the database and Parquet file."""
-    table_name = f"{symbol.replace('=', '_')}_{interval}"
-
-    # Get a database connection
-    db_engine = get_database_connection(db_file)
+    table_name = table_name_for(symbol, interval)
 
     # Download new data
     new_data = download_intraday_data(symbol, interval)
 
+    store_intraday_data(new_data, table_name, db_file, parquet_dir)
+
+
+def store_intraday_data(new_data, table_name, db_file, parquet_dir):
+    """Merge new bars with the stored ones and write them to the database and Parquet file."""
+    # Get a database connection
+    db_engine = get_database_connection(db_file)
+
     # Load existing data from both the database and Parquet file
     existing_data_db = load_data_from_db(table_name, db_engine)
     existing_data_parquet = load_data_from_parquet(parquet_dir, table_name)
 
     # Combine the existing data from both sources
-    existing_data = pd.concat([existing_data_db, existing_data_parquet]).drop_duplicates()
+    existing_data = pd.concat([existing_data_db, existing_data_parquet])
+    existing_data = existing_data[~existing_data.index.duplicated(keep='last')]
 
     # Compare and update with the new data
     updated_data = compare_and_update_data(new_data, existing_data)
 
-    # Store the updated data in the database in batches to avoid the "too many SQL variables" error
-    batch_insert_data(updated_data, table_name, db_engine)
+    # Insert only the bars not in the database yet, in batches to avoid the "too many SQL variables" error
+    new_rows = updated_data[~updated_data.index.isin(existing_data_db.index)]
+    if len(new_rows):
+        batch_insert_data(new_rows, table_name, db_engine)
 
     # Store the updated data in a Parquet file
     store_data_in_parquet(updated_data, parquet_dir, table_name)
@@ -119,6 +147,43 @@ def update_intraday_data(symbol, interval, db_file, parquet_dir):
     print(f"Data updated and stored in table '{table_name}' in database '{db_file}' and Parquet file '{parquet_dir}'")
 
 
+
+def parquet_parts_dir(parquet_dir, table_name):
+    return os.path.join(parquet_dir, f"{table_name}_parts")
+
+
+def append_intraday_data(new_data, table_name, db_file, parquet_dir):
+    """
+    Append a chunk of bars without reading the stored history.
+
+    Only the bars not in the database yet are inserted, and the chunk is written as its own Parquet part file,
+    so each chunk of a backfill costs its own size. compact_parquet_parts merges the parts into the table's
+    Parquet file.
+    """
+    new_data = new_data[~new_data.index.duplicated(keep='last')].sort_index()
+    db_engine = get_database_connection(db_file)
+    stored = stored_timestamps(table_name, db_engine, new_data.index[0], new_data.index[-1])
+    new_rows = new_data[~new_data.index.isin(stored)]
+    if len(new_rows):
+        batch_insert_data(new_rows, table_name, db_engine)
+
+    parts_dir = parquet_parts_dir(parquet_dir, table_name)
+    os.makedirs(parts_dir, exist_ok=True)
+    new_data.to_parquet(os.path.join(parts_dir, f"{new_data.index[0]:%Y%m%dT%H%M%S}.parquet"), engine='pyarrow')
+
+
+def compact_parquet_parts(table_name, parquet_dir):
+    """Merge the appended part files into the table's Parquet file, a single rewrite per backfill run."""
+    parts = sorted(glob.glob(os.path.join(parquet_parts_dir(parquet_dir, table_name), '*.parquet')))
+    if not parts:
+        return
+    new_data = pd.concat([pd.read_parquet(part, engine='pyarrow') for part in parts])
+    updated_data = compare_and_update_data(new_data, load_data_from_parquet(parquet_dir, table_name))
+    store_data_in_parquet(updated_data, parquet_dir, table_name)
+    for part in parts:
+        os.remove(part)
+
+
 if __name__ == "__main__":
     # Run the update process daily
     for sym in FUTURE_SYMBOLS:
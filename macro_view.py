@@ -1,21 +1,33 @@
 import datetime
+from collections import namedtuple
 
-import matplotlib.pyplot as plt
 import numpy as np
-import seaborn as sns
-import statsmodels.api as sm
+import pandas as pd
 import statsmodels.formula.api as smf
 import yfinance as yf
 from dateutil.relativedelta import *
-from hmmlearn import hmm
 from scipy.stats import pearsonr
-from sklearn.mixture import GaussianMixture
-from statsmodels.graphics.tsaplots import plot_acf
+from statsmodels.genmod.families import Gaussian
 from statsmodels.tsa.regime_switching.markov_regression import MarkovRegression
 
+from model_selection import best_n_states, comparison_table, run_model_selection
+from regime_analytics import get_regime_analytics
+from regime_service import get_regime_service
+from request_scheduler import scheduled_call
+from rolling_regression import rolling_formula
+
 symbols = ['ZN=F', 'DX-Y.NYB', 'CL=F', 'GC=F', 'NQ=F']  # , 'RX=F', 'ZN=F', '^TNX'
+# GLM formulas of multiple_regression, add interaction terms later
+REGRESSION_FORMULAS = ['ZN ~ DXY + CL + GC + NQ + DXY * CL * GC * NQ',
+                       'ZN ~ Lag1ZN + DXY + CL + DXY * CL + DXY * GC + CL * GC + DXY * NQ']
+
+# Results of the headless analyses, the plotting functions below only render these
+RegressionResults = namedtuple('RegressionResults', ['returns', 'data', 'models', 'coefficients', 'forecast'])
+RegimeResults = namedtuple('RegimeResults', ['returns', 'states', 'transition_matrix', 'analytics'])
 
 def reg_coef(x, y, label=None, color=None, cmap=None, **kwargs):
+    import matplotlib.pyplot as plt
+
     ax = plt.gca()
     r, p = pearsonr(x, y)
     norm = plt.Normalize(-1, 1)
@@ -25,7 +37,7 @@ def reg_coef(x, y, label=None, color=None, cmap=None, **kwargs):
     ax.set_axis_off()
 
 def get_market_data(start_date, end_date, returnChange=False):
-    closing_prices = yf.download(symbols, start=start_date, end=end_date)['Adj Close'].rename(
+    closing_prices = scheduled_call('yahoo', yf.download, symbols, start=start_date, end=end_date)['Adj Close'].rename(
         columns={'ZN=F': 'ZN', 'DX-Y.NYB': 'DXY', 'CL=F': 'CL', 'GC=F': 'GC', 'NQ=F': 'NQ'})
     if returnChange:
         return closing_prices.diff().dropna()
@@ -33,7 +45,8 @@ def get_market_data(start_date, end_date, returnChange=False):
         return closing_prices.dropna()
 
 
-def multiple_regression(start_date, end_date):
+def regression_analysis(start_date, end_date):
+    """GLM fits of ZN on DXY/CL/GC/NQ and the last model's forecast of the final week, without any plotting."""
     #5 day of prediction period
 
     ooSampleED = end_date
@@ -41,125 +54,107 @@ def multiple_regression(start_date, end_date):
     ooSampleSD  = end_date
     returns = get_market_data(start_date, end_date.strftime('%Y-%m-%d'))
 
-    sns.set(font_scale=1)
-    sns.set_style("white")
-    for param in ['text.color', 'axes.labelcolor', 'xtick.color', 'ytick.color']:
-        plt.rcParams[param] = 'cornflowerblue'
-    plt.rcParams['font.family'] = 'Verdana'
-    g = sns.PairGrid(returns, height=2)
-    g.map_diag(plt.hist, color='turquoise')
-    g.map_lower(plt.scatter, color='fuchsia')
-    g.map_upper(reg_coef, cmap=plt.get_cmap('PiYG'))
-    plt.setp(g.axes, xticks=[], yticks=[])
-
-    g.fig.suptitle('ZN Correlations', fontsize=30)
-    g.fig.tight_layout()
-    plt.show()
-
-    plot_acf(returns['ZN'].diff().dropna(), lags=90)
-    plt.show()
-
     y = returns[['ZN']][1:]
     x = returns[['ZN', 'DXY', 'CL', 'GC', 'NQ']].shift(1).dropna().rename(
         columns={'ZN': 'Lag1ZN'})
 
     dta = y.merge(x, on='Date')
-    print(dta)
-    formula = 'ZN ~ DXY + CL + GC + NQ + DXY * CL * GC * NQ'  # add interaction terms later
-    mod1 = smf.glm(formula=formula, data=dta, family=sm.families.Gaussian()).fit()
-    print(mod1.summary())
-
-    formula = 'ZN ~ Lag1ZN + DXY + CL + DXY * CL + DXY * GC + CL * GC + DXY * NQ'  # add interaction terms later
-    mod1 = smf.glm(formula=formula, data=dta, family=sm.families.Gaussian()).fit()
-    print(mod1.summary())
+    models = {formula: smf.glm(formula=formula, data=dta, family=Gaussian()).fit()
+              for formula in REGRESSION_FORMULAS}
     ooSampleReturns = get_market_data(ooSampleSD, ooSampleED)
-    print(ooSampleReturns)
     test_data = ooSampleReturns[['ZN', 'DXY', 'CL', 'GC', 'NQ']].shift(1).dropna().rename(
                         columns={'ZN': 'Lag1ZN'})
-    print(test_data)
-    print(mod1.predict(test_data))
+    forecast = models[REGRESSION_FORMULAS[-1]].predict(test_data)
+    coefficients = pd.DataFrame({formula: model.params for formula, model in models.items()})
+    return RegressionResults(returns, dta, models, coefficients, forecast)
+
 
+def multiple_regression(start_date, end_date, plot=True):
+    results = regression_analysis(start_date, end_date)
+    if plot:
+        plot_correlations(results.returns)
+        plot_autocorrelation(results.returns['ZN'])
 
-def hmm_regimes(n_states, start_date, end_date):
+    print(results.data)
+    for model in results.models.values():
+        print(model.summary())
+    print(results.forecast)
+    return results
+
+
+def rolling_regression(start_date, end_date, window=252):
+    """Rolling betas of ZN on its lag and DXY/CL/GC/NQ with interactions, every window solved at once."""
     returns = get_market_data(start_date, end_date)
-    n_samples = returns.shape[0]
-    print(returns)
+    dta = returns[['ZN']].join(returns[['ZN', 'DXY', 'CL', 'GC', 'NQ']].shift(1).rename(
+        columns={'ZN': 'Lag1ZN'})).dropna()
+    formula = 'ZN ~ Lag1ZN + DXY + CL + DXY * CL + DXY * GC + CL * GC + DXY * NQ'
+    results = rolling_formula(formula, dta, window=window)
+    print(results.params.dropna().tail())
+    print(results.tvalues.dropna().tail())
+    print(pd.DataFrame({'ZN': dta['ZN'], 'forecast': results.forecast}).dropna().tail())
+    return results
+
+
+def hmm_analysis(n_states, start_date, end_date, returnChange=False):
+    """HMM regime of every day and the transition matrix, without any plotting."""
+    returns = get_market_data(start_date, end_date, returnChange)
     returns_array = returns.to_numpy().reshape(-1, len(symbols))
 
-    model = hmm.GaussianHMM(n_components=n_states, covariance_type="full")
-    model.fit(returns_array)
+    # Persisted online model, only refitted when none is stored or a scheduled refit is due
+    service = get_regime_service(f'macro_hmm_{n_states}' + ('_diff' if returnChange else ''), returns, n_states)
     # need to add the regime to the data frame to interpret
-    hidden_states = model.predict(returns_array)
-    transition_matrix = model.transmat_
+    hidden_states = service.filter_states(returns_array).argmax(axis=1)
+    return RegimeResults(returns, pd.Series(hidden_states, index=returns.index), service.transmat,
+                         get_regime_analytics(hidden_states, returns, n_states))
 
-    plt.figure(figsize=(12, 6))
-    for i in range(n_states):
-        plt.plot(np.arange(n_samples), returns, label=f"Regime {i + 1}", linestyle='-', linewidth=1)
-    plt.title("Market Regimes Over Time")
-    plt.xlabel("Time")
-    plt.ylabel("Returns")
-    plt.legend()
-    plt.show()
+
+def hmm_regimes(n_states, start_date, end_date, plot=True, returnChange=False):
+    results = hmm_analysis(n_states, start_date, end_date, returnChange)
+    print(results.returns)
+    if plot:
+        plot_hmm_regimes(results)
 
     # Print transition matrix
     print("Transition Matrix:")
-    print(transition_matrix)
+    print(results.transition_matrix)
+    return results
 
 
-def gmm_regimes(n_components, start_date, end_date):
-    returns = get_market_data(start_date, end_date)
-    n_samples = returns.shape[0]
-    print(returns)
+def gmm_analysis(n_components, start_date, end_date, returnChange=False):
+    """GMM regime of every day with its transition, duration and conditional statistics, without any plotting."""
+    returns = get_market_data(start_date, end_date, returnChange)
     # Fit the GMM model and get regime assignments
-    returns_array = 1e4 * returns.to_numpy().reshape(-1, len(symbols))
-    print(returns_array)
-    model = GaussianMixture(n_components=n_components, covariance_type="full", random_state=6, verbose=2)
-    model.fit(returns_array)
-    regime_assignments = model.predict(returns_array)
+    service = get_regime_service(f'macro_gmm_{n_components}' + ('_diff' if returnChange else ''), returns,
+                                 n_components, kind='gmm', scale=1e4)
+    regime_assignments = service.filter_states(returns.to_numpy()).argmax(axis=1)
+    analytics = get_regime_analytics(regime_assignments, returns, n_components)
+    # need to add the regime to the data frame to interpret
+    return RegimeResults(returns, pd.Series(regime_assignments, index=returns.index),
+                         analytics.transition_matrix(), analytics)
+
+
+def gmm_regimes(n_components, start_date, end_date, plot=True, returnChange=False):
+    results = gmm_analysis(n_components, start_date, end_date, returnChange)
+    print(results.returns)
+    returns_array = 1e4 * results.returns.to_numpy().reshape(-1, len(symbols))
+    regime_assignments = results.states.to_numpy()
     print('regime_assignments')
     print(regime_assignments)
-
-    min_regime_length = min(np.bincount(regime_assignments))
-    # Plot each regime separately
-    time_axis = np.arange(regime_assignments.shape[0])
-    plt.figure(figsize=(12, 6))
-    plt.plot(time_axis, regime_assignments, label="Regimes", linestyle='-', linewidth=1)
+    print(results.analytics.durations())
     for i in range(n_components):
-        regime_indices = np.where(regime_assignments == i)[0]
-        regime_data = returns_array[regime_indices, -1]
-        print(regime_data)
-        time_axis = np.arange(regime_data.shape[0])
-        # plt.plot(time_axis, regime_data, label=f"Regime {i + 1}", linestyle='-', linewidth=1)
-
-    # Create a dictionary to store majority regimes for each market
-    majority_regimes = {}
-
-    # Iterate through each market (column) in your returns data
-    for i, market_name in enumerate(symbols):
-        market_data = returns_array[:, i]  # Extract data for the current market
-        market_regime_counts = np.bincount(regime_assignments)  # Count occurrences of each regime
-        majority_regime = np.argmax(market_regime_counts)  # Find the regime with the highest count
-        majority_regimes[market_name] = majority_regime  # Assign the majority regime to the market
-
-    # Print or access the majority regimes for each market
-    for market_name, majority_regime in majority_regimes.items():
-        print(f"Market: {market_name}, Majority Regime: {majority_regime}")
+        print(returns_array[regime_assignments == i, -1])
 
-    plt.title("Market Regimes Over Time (GMM)")
-    plt.xlabel("Time")
-    plt.ylabel("Returns")
-    plt.legend()
-    plt.show()
-
-    # Print transition matrix
-    # need to add the regime to the data frame to interpret
-    transition_matrix = np.zeros((n_components, n_components))
-    for i in range(1, len(regime_assignments)):
-        transition_matrix[regime_assignments[i - 1], regime_assignments[i]] += 1
-    transition_matrix = transition_matrix / np.sum(transition_matrix, axis=1, keepdims=True)
+    # The regimes are shared by all markets, so the majority regime is counted once
+    majority_regime = results.analytics.majority_regime()
+    for market_name in symbols:
+        print(f"Market: {market_name}, Majority Regime: {majority_regime}")
+    print(results.analytics.conditional_stats())
+    if plot:
+        plot_gmm_regimes(results)
 
     print("Transition Matrix:")
-    print(transition_matrix)
+    print(results.transition_matrix)
+    return results
 
 
 def markov_regression(n_regimes, start_date, end_date):
@@ -174,11 +169,78 @@ def markov_regression(n_regimes, start_date, end_date):
     print(res.summary())
 
 
+def plot_correlations(returns):
+    """Pair grid of the markets, histograms, scatters and correlation coefficients, styled locally."""
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
+    style = {param: 'cornflowerblue' for param in ['text.color', 'axes.labelcolor', 'xtick.color', 'ytick.color']}
+    style['font.family'] = 'Verdana'
+    with sns.axes_style("white"), sns.plotting_context(font_scale=1), plt.rc_context(style):
+        g = sns.PairGrid(returns, height=2)
+        g.map_diag(plt.hist, color='turquoise')
+        g.map_lower(plt.scatter, color='fuchsia')
+        g.map_upper(reg_coef, cmap=plt.get_cmap('PiYG'))
+        plt.setp(g.axes, xticks=[], yticks=[])
+
+        g.fig.suptitle('ZN Correlations', fontsize=30)
+        g.fig.tight_layout()
+        plt.show()
+
+
+def plot_autocorrelation(prices, lags=90):
+    import matplotlib.pyplot as plt
+    from statsmodels.graphics.tsaplots import plot_acf
+
+    plot_acf(prices.diff().dropna(), lags=lags)
+    plt.show()
+
+
+def plot_hmm_regimes(results):
+    import matplotlib.pyplot as plt
+
+    n_samples = results.returns.shape[0]
+    plt.figure(figsize=(12, 6))
+    for i in range(results.transition_matrix.shape[0]):
+        plt.plot(np.arange(n_samples), results.returns, label=f"Regime {i + 1}", linestyle='-', linewidth=1)
+    plt.title("Market Regimes Over Time")
+    plt.xlabel("Time")
+    plt.ylabel("Returns")
+    plt.legend()
+    plt.show()
+
+
+def plot_gmm_regimes(results):
+    import matplotlib.pyplot as plt
+
+    plt.figure(figsize=(12, 6))
+    plt.plot(np.arange(len(results.states)), results.states.to_numpy(), label="Regimes", linestyle='-', linewidth=1)
+    plt.title("Market Regimes Over Time (GMM)")
+    plt.xlabel("Time")
+    plt.ylabel("Returns")
+    plt.legend()
+    plt.show()
+
+
+def select_regimes(start_date, end_date, family='hmm', criterion='bic', returnChange=False):
+    """
+    Number of regimes of a family picked by the parallel, cached model selection.
+
+    Selected on the same series hmm_regimes and gmm_regimes fit, pass them the same returnChange.
+    """
+    returns = get_market_data(start_date, end_date, returnChange)
+    table = comparison_table(run_model_selection(returns[['ZN', 'DXY', 'CL', 'GC', 'NQ']]))
+    print(table)
+    return best_n_states(table, family, criterion)
+
+
 if __name__ == "__main__":
     start_date = '2010-01-01'
     end_date = '2023-09-19'
     regimes = 4
+    # regimes = select_regimes(start_date, end_date, 'hmm')
     # hmm_regimes(regimes, start_date, end_date)
     # gmm_regimes(regimes, start_date, end_date)
     # markov_regression(regimes, start_date, end_date)
+    # rolling_regression(start_date, end_date)
     multiple_regression(start_date, end_date)
@@ -0,0 +1,194 @@
+import itertools
+import threading
+from collections import OrderedDict
+
+import blpapi
+
+from bbg_session import get_session_manager
+
+# Subscription settings
+SUBSCRIPTION_FIELDS = ["LAST_PRICE", "BID", "ASK"]  # Default fields for futures, options and swaps
+QUEUE_SIZE = 1000  # Maximum securities with a pending update per consumer before the oldest is dropped
+
+
+class ConflatingQueue:
+    """
+    Bounded queue of the latest update per security.
+
+    An update for a security that is already waiting is merged into the waiting one instead of being queued
+    behind it, so a slow consumer always sees the current state and the queue never holds more than one entry
+    per security. When maxsize distinct securities are waiting the oldest entry is dropped.
+    """
+
+    def __init__(self, maxsize=QUEUE_SIZE):
+        self.maxsize = maxsize
+        self.pending = OrderedDict()  # security -> merged field values
+        self.condition = threading.Condition()
+        self.conflated = 0
+        self.dropped = 0
+        self.closed = False
+
+    def put(self, security, values):
+        with self.condition:
+            if security in self.pending:
+                self.pending[security].update(values)
+                self.conflated += 1
+            else:
+                if len(self.pending) >= self.maxsize:
+                    self.pending.popitem(last=False)
+                    self.dropped += 1
+                self.pending[security] = dict(values)
+            self.condition.notify()
+
+    def get_batch(self, timeout=None):
+        """Every pending update as {security: fields}, empty if nothing arrives within timeout."""
+        with self.condition:
+            if not self.pending and not self.closed:
+                self.condition.wait(timeout)
+            batch, self.pending = dict(self.pending), OrderedDict()
+            return batch
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+
+    def __len__(self):
+        return len(self.pending)
+
+
+class MarketDataService:
+    """
+    Streaming //blp/mktdata subscriptions on the shared session, fanned out to in-process consumers.
+
+    Updates are coalesced per security into the latest known field values and pushed to every interested
+    consumer's ConflatingQueue. Each consumer drains its queue on its own thread, so a slow consumer (e.g. a
+    curve rebuild) only ever skips stale updates and never holds up the event thread or the other consumers.
+    """
+
+    def __init__(self, manager=None, fields=None):
+        self.manager = manager or get_session_manager()
+        self.fields = list(fields or SUBSCRIPTION_FIELDS)
+        self.ids = itertools.count(1_000_000)  # Kept apart from the request correlation IDs
+        self.topics = {}  # correlation id value -> security
+        self.topic_fields = {}  # correlation id value -> subscribed fields
+        self.latest = {}  # security -> latest field values
+        self.consumers = []  # (securities or None for all, queue)
+        self.failed = {}  # security -> failure reason
+        self.updates = 0
+        self.lock = threading.Lock()
+        self.manager.subscribe_events(self._on_event)
+
+    def subscribe(self, securities, fields=None, options=None):
+        """Subscribe to securities not subscribed yet."""
+        fields = list(fields or self.fields)
+        topics = []
+        with self.lock:
+            subscribed = set(self.topics.values())
+            for security in securities:
+                if security in subscribed:
+                    continue
+                correlation_id = next(self.ids)
+                self.topics[correlation_id] = security
+                self.topic_fields[correlation_id] = fields
+                self.latest.setdefault(security, {})
+                topics.append((security, fields, options, correlation_id))
+        if topics:
+            self.manager.subscribe(topics)
+
+    def unsubscribe(self, securities):
+        securities = set(securities)
+        with self.lock:
+            correlation_ids = [cid for cid, security in self.topics.items() if security in securities]
+            for correlation_id in correlation_ids:
+                del self.topics[correlation_id], self.topic_fields[correlation_id]
+        if correlation_ids:
+            self.manager.unsubscribe(correlation_ids)
+
+    def add_consumer(self, callback, securities=None, maxsize=QUEUE_SIZE):
+        """
+        Call callback({security: fields}) on a consumer thread with conflated batches of updates.
+
+        securities restricts the consumer to those securities, all subscribed securities by default. Returns the
+        consumer's queue, whose conflated and dropped counters show how far behind it runs.
+        """
+        consumer_queue = ConflatingQueue(maxsize)
+        with self.lock:
+            self.consumers.append((None if securities is None else set(securities), consumer_queue))
+        threading.Thread(target=self._consume, args=(consumer_queue, callback), daemon=True).start()
+        return consumer_queue
+
+    def remove_consumer(self, consumer_queue):
+        with self.lock:
+            self.consumers = [(s, q) for s, q in self.consumers if q is not consumer_queue]
+        consumer_queue.close()
+
+    def snapshot(self, securities=None):
+        """Latest coalesced field values per security, empty for a security not subscribed or not ticked yet."""
+        with self.lock:
+            return {security: dict(self.latest.get(security, {})) for security in (securities or self.latest)}
+
+    def stop(self):
+        self.unsubscribe(list(self.topics.values()))
+        for _, consumer_queue in list(self.consumers):
+            self.remove_consumer(consumer_queue)
+
+    def _consume(self, consumer_queue, callback):
+        while not consumer_queue.closed:
+            batch = consumer_queue.get_batch(timeout=0.5)
+            if not batch:
+                continue
+            try:
+                callback(batch)
+            except Exception as exc:
+                print(f"Market data consumer failed: {exc}")
+
+    def _on_event(self, event, session):
+        event_type = event.eventType()
+        if event_type == blpapi.Event.SUBSCRIPTION_DATA:
+            for msg in event:
+                self._on_data(msg)
+        elif event_type == blpapi.Event.SUBSCRIPTION_STATUS:
+            for msg in event:
+                self._on_status(msg)
+
+    def _on_data(self, msg):
+        for correlation_id in msg.correlationIds():
+            security = self.topics.get(correlation_id.value())
+            if security is None:
+                continue
+            fields = self.topic_fields.get(correlation_id.value(), self.fields)
+            values = {field: msg.getElementAsFloat(field) for field in fields if msg.hasElement(field)}
+            if not values:
+                continue
+            with self.lock:
+                self.latest[security].update(values)
+                self.updates += 1
+                consumers = list(self.consumers)
+            for securities, consumer_queue in consumers:
+                if securities is None or security in securities:
+                    consumer_queue.put(security, values)
+
+    def _on_status(self, msg):
+        for correlation_id in msg.correlationIds():
+            security = self.topics.get(correlation_id.value())
+            if security is None:
+                continue
+            if str(msg.messageType()) == "SubscriptionFailure":
+                self.failed[security] = str(msg)
+                print(f"Subscription to {security} failed: {msg}")
+            elif str(msg.messageType()) == "SubscriptionStarted":
+                self.failed.pop(security, None)
+
+
+_service = None
+_service_lock = threading.Lock()
+
+
+def get_market_data_service():
+    """The process-wide market data service on the shared session."""
+    global _service
+    with _service_lock:
+        if _service is None:
+            _service = MarketDataService()
+        return _service
@@ -0,0 +1,157 @@
+import hashlib
+import json
+import os
+import warnings
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+from hmmlearn import hmm
+from sklearn.mixture import GaussianMixture
+from statsmodels.tsa.regime_switching.markov_regression import MarkovRegression
+
+# Selection settings
+CACHE_DIR = 'model_selection_cache'  # One JSON file per fitted (data, family, n_states, seed)
+FAMILIES = ['hmm', 'gmm', 'markov']
+STATE_RANGE = range(2, 7)  # Candidate numbers of regimes
+N_SEEDS = 4  # Random restarts per family and number of regimes
+TEST_FRACTION = 0.2  # Trailing share of the sample held out for the out-of-sample log-likelihood
+N_ITER = 200  # EM iterations
+MARKOV_SEARCH_REPS = 10  # Random starting points searched by MarkovRegression.fit
+
+SCORE_COLUMNS = ['log_likelihood', 'n_params', 'aic', 'bic', 'oos_log_likelihood', 'converged']
+# Failures that the same data, family, number of regimes and seed always reproduce, e.g. a singular covariance
+DETERMINISTIC_ERRORS = (ValueError, ArithmeticError)  # np.linalg.LinAlgError is a ValueError
+
+
+def data_key(data):
+    """Hash of the values, index and columns of a frame, the data part of the cache key."""
+    digest = hashlib.sha1(np.ascontiguousarray(data.to_numpy(dtype=float)).tobytes())
+    digest.update(pd.util.hash_pandas_object(data.index, index=False).to_numpy().tobytes())
+    digest.update(','.join(map(str, data.columns)).encode())
+    return digest.hexdigest()[:16]
+
+
+def fit_scores(family, data, n_train, n_states, seed):
+    """
+    Fit one model on the first n_train rows and score it.
+
+    The out-of-sample log-likelihood is that of the held-out rows given the training rows, i.e. the
+    log-likelihood of the whole sample minus that of the training rows under the training parameters, so the
+    filtered state and any time trend carry over the split.
+    """
+    train = data[:n_train]
+    if family == 'hmm':
+        model = hmm.GaussianHMM(n_components=n_states, covariance_type="full", n_iter=N_ITER, random_state=seed)
+        model.fit(train)
+        log_likelihood = model.score(train)
+        scores = {'log_likelihood': log_likelihood, 'aic': model.aic(train), 'bic': model.bic(train),
+                  'oos_log_likelihood': model.score(data) - log_likelihood,
+                  'converged': bool(model.monitor_.converged)}
+        scores['n_params'] = int(round((scores['bic'] + 2 * log_likelihood) / np.log(n_train)))
+        return scores
+
+    if family == 'gmm':
+        model = GaussianMixture(n_components=n_states, covariance_type="full", max_iter=N_ITER, random_state=seed)
+        model.fit(train)
+        return {'log_likelihood': model.score(train) * n_train, 'n_params': int(model._n_parameters()),
+                'aic': model.aic(train), 'bic': model.bic(train),
+                'oos_log_likelihood': model.score_samples(data[n_train:]).sum(),
+                'converged': bool(model.converged_)}
+
+    if family == 'markov':
+        # First column regressed on the others with a time trend, as in macro_view.markov_regression
+        def markov_model(rows):
+            return MarkovRegression(rows[:, 0], k_regimes=n_states, trend='ct', exog=rows[:, 1:],
+                                    switching_variance=True)
+
+        np.random.seed(seed)  # search_reps draws its starting points from the global generator
+        results = markov_model(train).fit(search_reps=MARKOV_SEARCH_REPS, maxiter=N_ITER, disp=False)
+        return {'log_likelihood': results.llf, 'n_params': len(results.params), 'aic': results.aic,
+                'bic': results.bic,
+                'oos_log_likelihood': markov_model(data).loglike(results.params) - results.llf,
+                'converged': bool(results.mle_retvals.get('converged', True))}
+    raise ValueError(f"Unknown regime model family {family}")
+
+
+def cached_fit(cache_file, family, data, n_train, n_states, seed):
+    """
+    Worker task, fits and stores the scores, or records a deterministic failure so it is not retried every run.
+
+    Any other failure, e.g. a MemoryError of an overloaded worker, is reported but not cached, so the next run
+    fits the combination again.
+    """
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')  # EM convergence warnings of every restart, the scores record it
+            scores = fit_scores(family, data, n_train, n_states, seed)
+        scores = {k: (v if isinstance(v, bool) else float(v)) for k, v in scores.items()}
+    except DETERMINISTIC_ERRORS as e:
+        scores = {'error': f"{type(e).__name__}: {e}"}
+    except Exception as e:
+        return {'error': f"{type(e).__name__}: {e}"}
+    os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+    with open(cache_file, 'w') as f:
+        json.dump(scores, f)
+    return scores
+
+
+def run_model_selection(data, families=FAMILIES, state_range=STATE_RANGE, n_seeds=N_SEEDS,
+                        test_fraction=TEST_FRACTION, n_workers=None, cache_dir=CACHE_DIR):
+    """
+    Fit every family for every number of regimes and seed, in a process pool, and return one row per fit.
+
+    data is a frame of returns, for the markov family the first column is the regressand and the others the
+    regressors. Fits are cached on disk under the hash of the data and the test split, so a rerun only fits
+    the new combinations.
+    """
+    values = data.to_numpy(dtype=float)
+    n_train = int(len(values) * (1 - test_fraction))
+    key_dir = os.path.join(cache_dir, f"{data_key(data)}_{n_train}")
+
+    rows, tasks = {}, {}
+    for family in families:
+        for n_states in state_range:
+            for seed in range(n_seeds):
+                cache_file = os.path.join(key_dir, f"{family}_{n_states}_{seed}.json")
+                if os.path.exists(cache_file):
+                    with open(cache_file) as f:
+                        rows[family, n_states, seed] = json.load(f)
+                else:
+                    tasks[family, n_states, seed] = cache_file
+
+    if tasks:
+        with ProcessPoolExecutor(max_workers=n_workers) as executor:
+            futures = {executor.submit(cached_fit, cache_file, family, values, n_train, n_states, seed):
+                       (family, n_states, seed) for (family, n_states, seed), cache_file in tasks.items()}
+            for future in as_completed(futures):
+                rows[futures[future]] = future.result()
+
+    fits = pd.DataFrame.from_dict(rows, orient='index')
+    fits.index = pd.MultiIndex.from_tuples(fits.index, names=['family', 'n_states', 'seed'])
+    return fits.reindex(columns=SCORE_COLUMNS + (['error'] if 'error' in fits else [])).sort_index()
+
+
+def comparison_table(fits):
+    """Best restart, by training log-likelihood, of each family and number of regimes."""
+    fits = fits.dropna(subset=['log_likelihood'])
+    best = fits.groupby(level=['family', 'n_states'])['log_likelihood'].idxmax()
+    table = fits.loc[best.to_numpy()].droplevel('seed')
+    table['n_seeds'] = fits.groupby(level=['family', 'n_states']).size()
+    return table
+
+
+def best_n_states(table, family, criterion='bic'):
+    """Number of regimes of a family with the lowest BIC/AIC or the highest out-of-sample log-likelihood."""
+    scores = table.loc[family, criterion]
+    return int(scores.idxmax() if criterion == 'oos_log_likelihood' else scores.idxmin())
+
+
+if __name__ == "__main__":
+    from macro_view import get_market_data
+
+    returns = get_market_data('2010-01-01', '2023-09-19', returnChange=True)
+    table = comparison_table(run_model_selection(returns[['ZN', 'DXY', 'CL', 'GC', 'NQ']]))
+    print(table)
+    for family in table.index.unique('family'):
+        print(family, {c: best_n_states(table, family, c) for c in ['bic', 'aic', 'oos_log_likelihood']})
@@ -1,73 +1,49 @@
-import blpapi
+from bbg_session import RequestError
+from chain_store import capture_chain, write_snapshot
+from market_data import get_market_data_service
+from reference_data import fetch_reference_data
 
-def get_bond_option_data(option_tickers, field_list):
-    options_data = {}
-
-    sessionOptions = blpapi.SessionOptions()
-    sessionOptions.setServerHost("localhost")
-    sessionOptions.setServerPort(8194)  # This is the default port for Bloomberg's API
-
-    session = blpapi.Session(sessionOptions)
-    if not session.start():
-        print("Failed to start session.")
-        return
 
+def get_bond_option_data(option_tickers, field_list, manager=None):
     try:
-        service = session.getService("//blp/refdata")
-        request = service.createRequest("ReferenceDataRequest")
-
-        for option_ticker in option_tickers:
-            request.append("securities", option_ticker)
-
-        for field in field_list:
-            request.append("fields", field)
-
-        session.sendRequest(request)
-
-        while True:
-            event = session.nextEvent(500)  # 500 milliseconds timeout
-            if event.eventType() == blpapi.Event.RESPONSE:
-                for msg in event:
-                    security_data = msg.getElement("securityData")
-                    for sec_data in security_data.values():
-                        option_ticker = sec_data.getElementAsString("security")
-                        field_data = sec_data.getElement("fieldData")
-
-                        option_info = {}
-                        for field in field_list:
-                            value = field_data.getElement(field).getValue()
-                            option_info[field] = value
+        # All options and fields in one request over the shared session
+        options_frame = fetch_reference_data(option_tickers, field_list, manager=manager)
+    except RequestError as exc:
+        print(f"Reference data request failed: {exc}")
+        return
 
-                        options_data[option_ticker] = option_info
-            elif event.eventType() == blpapi.Event.RESPONSE_TIMEOUT:
-                break
-            else:
-                print("Non-Response event received.")
+    return options_frame.to_dict(orient='index')
 
-    finally:
-        session.stop()
 
-    return options_data
+def stream_bond_option_data(option_tickers, on_update, fields=None, service=None):
+    """Stream option quotes to on_update({ticker: fields}) instead of polling snapshots."""
+    service = service or get_market_data_service()
+    service.subscribe(option_tickers, fields=fields)
+    return service.add_consumer(on_update, securities=option_tickers)
 
 
 def main():
     option_tickers = ["TYX 09/23 P150", "TYX 09/23 P155", "TYX 09/23 P160"]
-    field_list = ["PX_LAST", "OPT_EXPIRE_DT", "STRIKE_PX", "IVOL_MID", "OPT_DELTA", "OPT_VEGA", "OPT_THETA",
-                  "OPT_GAMMA", "OPT_RHO"]
 
-    options_data = get_bond_option_data(option_tickers, field_list)
-
-    for option_ticker, option_info in options_data.items():
-        print(f"Option: {option_ticker}")
-        print(f"Last Price: {option_info['PX_LAST']}")
-        print(f"Expiry Date: {option_info['OPT_EXPIRE_DT']}")
-        print(f"Strike Price: {option_info['STRIKE_PX']}")
-        print(f"Implied Volatility: {option_info['IVOL_MID']}")
-        print(f"Delta: {option_info['OPT_DELTA']}")
-        print(f"Vega: {option_info['OPT_VEGA']}")
-        print(f"Theta: {option_info['OPT_THETA']}")
-        print(f"Gamma: {option_info['OPT_GAMMA']}")
-        print(f"Rho: {option_info['OPT_RHO']}")
+    try:
+        # Capture the whole chain and keep it in the chain history store
+        chain = capture_chain(option_tickers)
+    except RequestError as exc:
+        print(f"Reference data request failed: {exc}")
+        return
+    write_snapshot(chain)
+
+    for _, option_info in chain.iterrows():
+        print(f"Option: {option_info['ticker']}")
+        print(f"Last Price: {option_info['price']}")
+        print(f"Expiry Date: {option_info['expiry']}")
+        print(f"Strike Price: {option_info['strike']}")
+        print(f"Implied Volatility: {option_info['iv']}")
+        print(f"Delta: {option_info['delta']}")
+        print(f"Vega: {option_info['vega']}")
+        print(f"Theta: {option_info['theta']}")
+        print(f"Gamma: {option_info['gamma']}")
+        print(f"Rho: {option_info['rho']}")
         print("=" * 50)
 
 
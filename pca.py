@@ -1,24 +1,30 @@
-import matplotlib.pyplot as plt
+from collections import namedtuple
+
 import pandas as pd
 from sklearn.decomposition import PCA
 from sklearn.preprocessing import StandardScaler
-from statsmodels.multivariate.pca import PCA
 
-from core.analytics.macro_view import get_market_data
+from macro_view import get_market_data
 
+PcaResults = namedtuple('PcaResults', ['returns', 'scores', 'loadings', 'explained_variance_ratio'])
 
-def run():
-    start_date = '2010-01-01'
-    end_date = '2023-09-09'
-    returns = get_market_data(start_date, end_date, returnChange=False)
-    print(returns.T.cov())
-    x = StandardScaler().fit_transform(returns.T.cov())  # normalizing the features
-    pca_ = PCA(n_components=2)
+
+def pca_analysis(start_date, end_date, n_components=2):
+    """Principal components of the standardised daily returns, scores per day and loadings per market."""
+    returns = get_market_data(start_date, end_date, returnChange=True)
+    x = StandardScaler().fit_transform(returns)  # normalizing the features, one row per day
+    pca_ = PCA(n_components=n_components)
     pca_returns = pca_.fit_transform(x)
-    pca_Df = pd.DataFrame(data=pca_returns
-                          , columns=['principal component 1', 'principal component 2'])
-    print(pca_Df)
-    print('Explained variation per principal component: {}'.format(pca_.explained_variance_ratio_))
+    names = [f'principal component {i + 1}' for i in range(n_components)]
+    pca_Df = pd.DataFrame(data=pca_returns, index=returns.index, columns=names)
+    loadings = pd.DataFrame(pca_.components_.T, index=returns.columns, columns=names)
+    return PcaResults(returns, pca_Df, loadings, pca_.explained_variance_ratio_)
+
+
+def plot_pca(results):
+    import matplotlib.pyplot as plt
+
+    returns, pca_Df = results.returns, results.scores
     plt.figure()
     plt.figure(figsize=(10, 10))
     plt.xticks(fontsize=12)
@@ -27,16 +33,28 @@ def run():
     plt.ylabel('Principal Component - 2', fontsize=20)
     plt.title("Principal Component Analysis ", fontsize=20)
 
-    indicesToKeep = returns['ZN=F'] > 0
+    indicesToKeep = returns['ZN'] > 0
     plt.scatter(pca_Df.loc[indicesToKeep]['principal component 1']
                 , pca_Df.loc[indicesToKeep]['principal component 2'], c='b', s=50)
 
-    indicesToKeep = returns['ZN=F'] <= 0
+    indicesToKeep = returns['ZN'] <= 0
     plt.scatter(pca_Df.loc[indicesToKeep]['principal component 1']
                 , pca_Df.loc[indicesToKeep]['principal component 2'], c='r', s=50)
 
     plt.show()
 
 
+def run(plot=True):
+    start_date = '2010-01-01'
+    end_date = '2023-09-09'
+    results = pca_analysis(start_date, end_date)
+    print(results.returns.cov())
+    print(results.scores)
+    print('Explained variation per principal component: {}'.format(results.explained_variance_ratio))
+    if plot:
+        plot_pca(results)
+    return results
+
+
 if __name__ == "__main__":
     run()
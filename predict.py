@@ -4,9 +4,12 @@ import pmdarima as pm
 import yfinance as yf
 from prophet import Prophet
 
+from forecast_service import load_closes, run_forecasts
+from request_scheduler import scheduled_call
+
 
 def getMarketData(bond_future_symbol, start_date, end_date):
-    bond_future_data = yf.download(bond_future_symbol, start=start_date, end=end_date)
+    bond_future_data = scheduled_call('yahoo', yf.download, bond_future_symbol, start=start_date, end=end_date)
     return bond_future_data
 
 
@@ -97,6 +100,17 @@ def runPredictProphet():
     plt.show()
 
 
+def runForecastService():
+    # Every stored futures series, fitted in parallel from the cached orders and parameters
+    from intraday_data_store import FUTURE_SYMBOLS
+
+    forecasts = run_forecasts(load_closes(FUTURE_SYMBOLS))
+    for (symbol, model), forecast in sorted(forecasts.items()):
+        print(f'{symbol} {model}')
+        print(forecast)
+
+
 if __name__ == "__main__":
     #runPredictSARMIA()
+    #runForecastService()
     runPredictProphet()
@@ -1,6 +1,8 @@
 import QuantLib as ql
 import matplotlib.pyplot as plt
 
+import chain_analytics
+
 
 def premium_at_different_spots(today=ql.Date(25, ql.August, 2023),
                                spot_price=109.5,
@@ -67,8 +69,6 @@ def premium_at_different_spots(today=ql.Date(25, ql.August, 2023),
 
 
 def probabilities_at_different_strike():
-    import QuantLib as ql
-
     # Constants
     spot_price = 109.5  # Current bond future price
     strike_price = 109.5  # Option strike price
@@ -80,36 +80,10 @@ def probabilities_at_different_strike():
     strike_prices = [107.75, 108, 108.25, 108.5, 108.75, 109, 109.25, 109.5, 109.75, 110, 110.25, 110.5, 110.75,
                      112]  # np.linspace(120, 150, 31)  # Adjust the range as needed
 
-    # Initialize QuantLib
-    today = ql.Date(28, ql.August, 2023)
-    ql.Settings.instance().evaluationDate = today
-    calendar = ql.NullCalendar()
-    day_count = ql.Actual360()
-
-    # Initialize QuantLib Black-Scholes process
-    u = ql.SimpleQuote(spot_price)
-    r = ql.SimpleQuote(interest_rate)
-    sigma = ql.SimpleQuote(volatility)
-    risk_free_curve = ql.FlatForward(today, ql.QuoteHandle(r), day_count)
-    volatility_curve = ql.BlackConstantVol(today, calendar, ql.QuoteHandle(sigma), day_count)
-    process = ql.BlackScholesProcess(ql.QuoteHandle(u), ql.YieldTermStructureHandle(risk_free_curve),
-                                     ql.BlackVolTermStructureHandle(volatility_curve))
-
-    # Initialize option pricing engine
-    engine = ql.AnalyticEuropeanEngine(process)
-
-    # Calculate probabilities for each strike
-    probabilities = []
-
-    for strike_price in strike_prices:
-        payoff = ql.PlainVanillaPayoff(ql.Option.Call, strike_price)
-        exercise = ql.EuropeanExercise(today + ql.Period(int(maturity * 365), ql.Days))
-        option = ql.EuropeanOption(payoff, exercise)
-        option.setPricingEngine(engine)
-
-        option_price = option.NPV()
-        probability = option.delta() if option_price > 0 else 0.0
-        probabilities.append(probability)
+    # Risk-neutral probability of finishing in the money, N(d2), for all strikes at once
+    T = int(maturity * 365) / chain_analytics.DAYS_PER_YEAR
+    _, _, d2 = chain_analytics.black76(spot_price, strike_prices, T, volatility, interest_rate, True)
+    probabilities = chain_analytics.itm_probability(d2, True)
 
     # Print probabilities
     for strike, probability in zip(strike_prices, probabilities):
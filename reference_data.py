@@ -0,0 +1,84 @@
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from bbg_session import get_session_manager
+from request_scheduler import get_scheduler
+
+REFDATA_TTL = 5.0  # Seconds a reference data response is reused for an identical request
+
+_cache = {}
+_cache_lock = threading.Lock()
+
+
+def decode_security_data(msg, fields):
+    """Rows of one ReferenceDataResponse message, {security: {field: value}}, errors become missing values."""
+    rows = {}
+    for security_data in msg.getElement("securityData").values():
+        security = security_data.getElementAsString("security")
+        row = {}
+        if not security_data.hasElement("securityError"):
+            field_data = security_data.getElement("fieldData")
+            for field in fields:
+                if field_data.hasElement(field):
+                    row[field] = field_data.getElement(field).getValue()
+        rows[security] = row
+    return rows
+
+
+def typed_frame(rows, securities, fields):
+    """One row per requested security, date fields as datetimes and numeric fields as floats."""
+    frame = pd.DataFrame.from_dict(rows, orient='index').reindex(index=securities, columns=fields)
+    frame.index.name = 'security'
+    for field in fields:
+        if field.endswith('_DT') or field.endswith('_DATE'):
+            frame[field] = pd.to_datetime(frame[field])
+        else:
+            numeric = pd.to_numeric(frame[field], errors='coerce')
+            if numeric.notna().sum() == frame[field].notna().sum():
+                frame[field] = numeric.astype(np.float64)
+    return frame
+
+
+def fetch_reference_data(securities, fields, ttl=REFDATA_TTL, manager=None):
+    """
+    Reference data for all securities and fields in a single ReferenceDataRequest.
+
+    The full securityData array is decoded from every partial and final response. Identical requests within
+    ttl seconds are served from the cache without a round-trip.
+    """
+    securities, fields = list(securities), list(fields)
+    key = (tuple(securities), tuple(fields))
+    now = time.monotonic()
+    with _cache_lock:
+        cached = _cache.get(key)
+    if cached is not None and now - cached[0] < ttl:
+        return cached[1].copy()
+
+    manager = manager or get_session_manager()
+    request = manager.create_request("ReferenceDataRequest")
+    for security in securities:
+        request.append("securities", security)
+    for field in fields:
+        request.append("fields", field)
+
+    # Identical requests in flight from other threads share this one
+    responses = get_scheduler().call('bloomberg', ('ReferenceDataRequest',) + key, manager.send, request,
+                                     on_message=lambda msg: decode_security_data(msg, fields))
+    rows = {}
+    for message_rows in responses:
+        rows.update(message_rows)
+    frame = typed_frame(rows, securities, fields)
+
+    with _cache_lock:
+        for stale in [k for k, (stamp, _) in _cache.items() if now - stamp >= ttl]:
+            del _cache[stale]
+        _cache[key] = (now, frame)
+    return frame.copy()
+
+
+def clear_cache():
+    with _cache_lock:
+        _cache.clear()
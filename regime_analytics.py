@@ -0,0 +1,180 @@
+import hashlib
+import threading
+
+import numpy as np
+import pandas as pd
+
+# Analytics settings
+MAX_CACHED = 64  # Analytics objects kept by get_regime_analytics
+
+_analytics = {}
+_analytics_lock = threading.Lock()
+
+
+def one_hot(labels, n_states):
+    weights = np.zeros((len(labels), n_states))
+    weights[np.arange(len(labels)), labels] = 1.0
+    return weights
+
+
+def transition_counts(labels, n_states=None):
+    """Number of moves from each regime (rows) to each regime (columns) in a label series."""
+    labels = np.asarray(labels, dtype=np.int64)
+    n_states = labels.max() + 1 if n_states is None else n_states
+    counts = np.zeros((n_states, n_states))
+    np.add.at(counts, (labels[:-1], labels[1:]), 1)
+    return counts
+
+
+def expected_transition_counts(probabilities):
+    """Expected transition counts of a (bars, states) probability series, sum over t of p[t-1] p[t]^T."""
+    probabilities = np.asarray(probabilities, dtype=float)
+    return probabilities[:-1].T @ probabilities[1:]
+
+
+def transition_matrix(counts):
+    """Row-normalised transition counts, NaN for regimes that are never left from."""
+    totals = counts.sum(axis=1, keepdims=True)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return counts / totals
+
+
+def regime_spells(labels, index=None):
+    """One row per uninterrupted spell of a regime: regime, start and end position (or label) and length."""
+    labels = np.asarray(labels, dtype=np.int64)
+    starts = np.concatenate([[0], np.flatnonzero(np.diff(labels)) + 1])
+    ends = np.concatenate([starts[1:], [len(labels)]]) - 1
+    spells = pd.DataFrame({'regime': labels[starts], 'start': starts, 'end': ends, 'length': ends - starts + 1})
+    if index is not None:
+        spells['start'] = np.asarray(index)[starts]
+        spells['end'] = np.asarray(index)[ends]
+    return spells
+
+
+def duration_summary(spells, transmat=None, n_states=None):
+    """Spell count and mean, median and max length per regime, with the expected length 1/(1-p_ii) if given."""
+    n_states = spells['regime'].max() + 1 if n_states is None else n_states
+    summary = spells.groupby('regime')['length'].agg(['count', 'mean', 'median', 'max'])
+    summary = summary.reindex(range(n_states))
+    if transmat is not None:
+        with np.errstate(divide='ignore'):
+            summary['expected'] = 1.0 / (1.0 - np.diagonal(transmat))
+    return summary
+
+
+def weighted_moments(returns, weights):
+    """Per regime weighted mean and variance of each asset, both shape (states, assets)."""
+    totals = weights.sum(axis=0)[:, None]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = weights.T @ returns / totals
+        variance = weights.T @ returns ** 2 / totals - mean ** 2
+    return mean, np.maximum(variance, 0.0)
+
+
+def weighted_correlations(returns, weights):
+    """Per regime weighted correlation matrix of the assets, shape (states, assets, assets)."""
+    mean, variance = weighted_moments(returns, weights)
+    totals = weights.sum(axis=0)
+    correlations = np.empty((weights.shape[1], returns.shape[1], returns.shape[1]))
+    for k in range(weights.shape[1]):
+        centred = returns - mean[k]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            covariance = (centred * weights[:, k, None]).T @ centred / totals[k]
+            scale = np.sqrt(np.diagonal(covariance))
+            correlations[k] = covariance / np.outer(scale, scale)
+    return correlations
+
+
+class RegimeAnalytics:
+    """
+    Transition, duration and regime conditional statistics of one fitted model's regime series.
+
+    states is a label series or a (bars, states) probability series, returns a frame of asset returns on the
+    same bars. Labels give hard statistics and probabilities give the probability weighted ones, e.g. expected
+    transition counts. Every statistic is computed once on first use.
+    """
+
+    def __init__(self, states, returns=None, n_states=None):
+        states = np.asarray(states)
+        if states.ndim == 2:
+            self.probabilities = states.astype(float)
+            self.labels = self.probabilities.argmax(axis=1)
+        else:
+            self.labels = states.astype(np.int64)
+            self.probabilities = None
+        self.n_states = n_states or (self.probabilities.shape[1] if self.probabilities is not None
+                                     else int(self.labels.max()) + 1)
+        self.weights = self.probabilities if self.probabilities is not None else one_hot(self.labels, self.n_states)
+        self.returns = returns
+        self.index = returns.index if returns is not None else None
+        self.results = {}
+
+    def cached(self, name, compute):
+        if name not in self.results:
+            self.results[name] = compute()
+        return self.results[name]
+
+    def transition_counts(self):
+        if self.probabilities is not None:
+            return self.cached('counts', lambda: expected_transition_counts(self.probabilities))
+        return self.cached('counts', lambda: transition_counts(self.labels, self.n_states))
+
+    def transition_matrix(self):
+        return self.cached('transmat', lambda: transition_matrix(self.transition_counts()))
+
+    def spells(self):
+        return self.cached('spells', lambda: regime_spells(self.labels, self.index))
+
+    def durations(self):
+        return self.cached('durations', lambda: duration_summary(self.spells(), self.transition_matrix(),
+                                                                 self.n_states))
+
+    def occupancy(self):
+        """Share of bars (or of probability mass) in each regime."""
+        return self.cached('occupancy', lambda: self.weights.sum(axis=0) / len(self.weights))
+
+    def majority_regime(self):
+        return int(np.argmax(self.occupancy()))
+
+    def conditional_stats(self, periods_per_year=None):
+        """Mean return and volatility of each asset in each regime, annualised if periods_per_year is given."""
+        def compute():
+            mean, variance = weighted_moments(self.returns.to_numpy(dtype=float), self.weights)
+            return mean, np.sqrt(variance)
+
+        mean, vol = self.cached('moments', compute)
+        if periods_per_year is not None:
+            mean, vol = mean * periods_per_year, vol * np.sqrt(periods_per_year)
+        regimes = pd.Index(range(self.n_states), name='regime')
+        return pd.concat({'mean': pd.DataFrame(mean, index=regimes, columns=self.returns.columns),
+                          'vol': pd.DataFrame(vol, index=regimes, columns=self.returns.columns)}, axis=1)
+
+    def conditional_correlations(self):
+        """Correlation matrix of the assets in each regime, keyed by regime."""
+        correlations = self.cached('correlations', lambda: weighted_correlations(
+            self.returns.to_numpy(dtype=float), self.weights))
+        return {k: pd.DataFrame(correlations[k], index=self.returns.columns, columns=self.returns.columns)
+                for k in range(self.n_states)}
+
+
+def states_key(states, returns=None):
+    """Hash of a regime series and the returns it is analysed with, the cache key of a fitted model's results."""
+    digest = hashlib.sha1(np.ascontiguousarray(states).tobytes())
+    digest.update(str(np.asarray(states).shape).encode())
+    if returns is not None:
+        digest.update(np.ascontiguousarray(returns.to_numpy(dtype=float)).tobytes())
+        digest.update(','.join(map(str, returns.columns)).encode())
+    return digest.hexdigest()
+
+
+def get_regime_analytics(states, returns=None, n_states=None):
+    """Shared analytics of a regime series, reused while the same model output is analysed again."""
+    key = states_key(states, returns)
+    with _analytics_lock:
+        analytics = _analytics.get(key)
+        if analytics is None:
+            analytics = RegimeAnalytics(states, returns, n_states)
+            if len(_analytics) >= MAX_CACHED:
+                _analytics.pop(next(iter(_analytics)))
+            _analytics[key] = analytics
+        return analytics
@@ -0,0 +1,168 @@
+import os
+import pickle
+import threading
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+from sklearn.cluster import MiniBatchKMeans
+
+from correlation_engine import CHUNK_ELEMENTS, RollingCorrelation, pair_names, rolling_pair_correlations
+
+# Clustering settings
+MODEL_DIR = 'regime_models'  # Persisted clusterers, next to the regime service models
+PRICE_CACHE = 'aligned_prices.parquet'  # Aligned prices of all assets, one column each
+BATCH_SIZE = 1024  # Windows per partial_fit
+RANDOM_STATE = 0
+
+_clusterers = {}
+_clusterers_lock = threading.Lock()
+
+
+def load_aligned_prices(assets, csv_pattern='{asset}_prices.csv', cache_file=PRICE_CACHE, freq='D'):
+    """
+    Prices of all assets as one frame, aligned on a common calendar and forward filled.
+
+    The per asset CSV files are parsed and aligned once and stored as a single Parquet file, later runs read
+    only the requested columns from it, and rebuild it when a CSV is newer than the cache.
+    """
+    files = [csv_pattern.format(asset=asset) for asset in assets]
+    if cache_file and os.path.exists(cache_file) and set(assets) <= set(pq.read_schema(cache_file).names) and \
+            all(os.path.getmtime(f) <= os.path.getmtime(cache_file) for f in files if os.path.exists(f)):
+        return pd.read_parquet(cache_file, columns=assets)
+
+    prices = pd.concat([pd.read_csv(f, index_col='Date', parse_dates=True, usecols=['Date', 'Price'])['Price']
+                        .rename(asset) for asset, f in zip(assets, files)], axis=1).sort_index()
+    prices = prices.resample(freq).last().ffill()
+    if cache_file:
+        prices.to_parquet(cache_file)
+    return prices
+
+
+class RegimeClusterer:
+    """
+    Streaming k-means regimes of rolling pair correlations.
+
+    The centroids are learnt with MiniBatchKMeans.partial_fit over batches of correlation windows, so new
+    windows move them without a refit on the full history. A new bar is assigned to the nearest centroid
+    straight away and buffered until a batch is complete. The model and the last clustered timestamp are
+    persisted, so a later run only learns from the windows after it.
+    """
+
+    def __init__(self, name, n_clusters, batch_size=BATCH_SIZE, model_dir=MODEL_DIR):
+        self.name = name
+        self.n_clusters = n_clusters
+        self.batch_size = batch_size
+        self.model_file = os.path.join(model_dir, f"{name}_kmeans.pkl")
+        self.model = MiniBatchKMeans(n_clusters=n_clusters, batch_size=batch_size, random_state=RANDOM_STATE,
+                                     n_init=3)
+        self.last_timestamp = None
+        self.buffer = []
+        self.rolling = None  # RollingCorrelation of live bars
+
+    def partial_fit(self, features):
+        """Learn from the windows of a (timestamp x pair) frame after the last clustered one, in batches."""
+        if self.last_timestamp is not None:
+            features = features[features.index > self.last_timestamp]
+        values = features.to_numpy(dtype=np.float32)
+        if self.buffer:
+            values = np.concatenate([np.asarray(self.buffer), values])
+        n_batches = len(values) // self.batch_size
+        for batch in range(n_batches):
+            self.model.partial_fit(values[batch * self.batch_size:(batch + 1) * self.batch_size])
+        rest = values[n_batches * self.batch_size:]
+        if not self.fitted() and len(rest) >= self.n_clusters:
+            # History shorter than a batch, start from what there is
+            self.model.partial_fit(rest)
+            rest = rest[:0]
+        self.buffer = list(rest)
+        if len(features):
+            self.last_timestamp = features.index[-1]
+        return self
+
+    def fit_returns(self, returns, window, chunk_elements=CHUNK_ELEMENTS):
+        """
+        Learn from and label the rolling correlation windows of a return frame, chunk of rows by chunk.
+
+        Each chunk of correlation windows is computed, learnt from and labelled, then dropped, so the feature
+        history of hundreds of pairs at intraday frequency is never held in memory at once.
+        """
+        n_pairs = returns.shape[1] * (returns.shape[1] - 1) // 2
+        chunk = max(chunk_elements // max(n_pairs, 1), self.batch_size)
+        labels = []
+        for start in range(0, len(returns), chunk):
+            lead = max(start - window + 1, 0)  # Rows before the chunk that fall in its first windows
+            features = correlation_features(returns.iloc[lead:start + chunk], window)
+            features = features[features.index >= returns.index[start]]
+            self.partial_fit(features)
+            labels.append(self.labels(features))
+        return pd.concat(labels)
+
+    def fitted(self):
+        return hasattr(self.model, 'cluster_centers_')
+
+    def centroids(self, columns=None):
+        return pd.DataFrame(self.model.cluster_centers_, columns=columns)
+
+    def predict(self, features):
+        """Nearest centroid of every window."""
+        centers = self.model.cluster_centers_
+        # |x - c|^2 without the |x|^2 term shared by all centroids, (windows, clusters) in memory
+        distances = np.sum(centers ** 2, axis=1)[None, :] - 2 * np.asarray(features, dtype=float) @ centers.T
+        return distances.argmin(axis=1)
+
+    def labels(self, features):
+        return pd.Series(self.predict(features.to_numpy(dtype=np.float32)), index=features.index, name='Cluster')
+
+    def start_stream(self, returns, window):
+        """Prime the live rolling correlations with the trailing window of a return history."""
+        self.rolling = RollingCorrelation.from_history(returns.to_numpy(dtype=float), window)
+
+    def update(self, row, timestamp=None):
+        """Add one bar of returns, return the cluster of its window, or None until the window is full."""
+        correlations = self.rolling.update(row)
+        if np.isnan(correlations).any():
+            return None
+        self.buffer.append(correlations)
+        if len(self.buffer) >= self.batch_size:
+            self.model.partial_fit(np.asarray(self.buffer))
+            self.buffer = []
+        self.last_timestamp = timestamp if timestamp is not None else self.last_timestamp
+        return int(self.predict(correlations[None, :])[0])
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.model_file) or '.', exist_ok=True)
+        tmp_file = self.model_file + '.tmp'
+        with open(tmp_file, 'wb') as f:
+            pickle.dump({'model': self.model, 'last_timestamp': self.last_timestamp, 'buffer': self.buffer}, f)
+        os.replace(tmp_file, self.model_file)
+
+    def load(self):
+        """Restore a persisted clusterer, returns False when there is none with this number of clusters."""
+        if not os.path.exists(self.model_file):
+            return False
+        with open(self.model_file, 'rb') as f:
+            stored = pickle.load(f)
+        if stored['model'].n_clusters != self.n_clusters:
+            return False
+        self.model, self.last_timestamp, self.buffer = stored['model'], stored['last_timestamp'], stored['buffer']
+        return True
+
+
+def correlation_features(returns, window):
+    """Rolling pair correlations of a return frame, one column per pair, complete windows only."""
+    return pd.DataFrame(rolling_pair_correlations(returns.to_numpy(dtype=float), window), index=returns.index,
+                        columns=pair_names(list(returns.columns))).dropna()
+
+
+def get_regime_clusterer(name, features, n_clusters, **kwargs):
+    """Shared clusterer restored from disk and trained on the windows it has not seen yet."""
+    with _clusterers_lock:
+        clusterer = _clusterers.get(name)
+        if clusterer is None:
+            clusterer = RegimeClusterer(name, n_clusters, **kwargs)
+            clusterer.load()
+            clusterer.partial_fit(features)
+            clusterer.save()
+            _clusterers[name] = clusterer
+        return clusterer
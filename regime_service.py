@@ -0,0 +1,254 @@
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+from hmmlearn import hmm
+from sklearn.mixture import GaussianMixture
+
+# Service settings
+MODEL_DIR = 'regime_models'  # Directory of the persisted regime models
+REFIT_EVERY = 250  # New bars between full refits
+MAX_HISTORY = 5000  # Bars kept for refits
+N_ITER = 100  # EM iterations of a full refit, warm starts converge well within this
+TOL = 1e-3  # EM convergence tolerance
+
+_services = {}
+_services_lock = threading.Lock()
+
+
+class RegimeService:
+    """
+    Online regime detector over a Gaussian HMM or Gaussian mixture.
+
+    The model is fitted once, then every new bar only advances the forward filter, which costs O(states^2) for
+    the transition step plus one Gaussian density per state. A mixture is handled as an HMM whose transition
+    rows all equal the mixture weights. Every refit_every bars the model is refitted in a background thread,
+    warm-started from the current parameters, and swapped in atomically. The current regime and its
+    probabilities are plain attributes, so live strategies read them without any computation.
+    """
+
+    def __init__(self, name, n_states, kind='hmm', scale=1.0, model_dir=MODEL_DIR, refit_every=REFIT_EVERY,
+                 max_history=MAX_HISTORY, n_iter=N_ITER, random_state=6):
+        self.name = name
+        self.n_states = n_states
+        self.kind = kind
+        self.scale = scale
+        self.model_file = os.path.join(model_dir, f"{name}.npz")
+        self.refit_every = refit_every
+        self.max_history = max_history
+        self.n_iter = n_iter
+        self.random_state = random_state
+
+        self.params = None  # startprob, transmat, means, covars
+        self.history = np.empty((0, 0))
+        self.columns = None  # Columns of the bars the model was fitted on
+        self.first_timestamp = None  # First bar of the full fit
+        self.last_timestamp = None
+        self.log_alpha = None
+        self.probabilities = None
+        self.regime = None
+        self.bars_since_fit = 0
+        self.lock = threading.Lock()
+        self.save_lock = threading.Lock()
+        self.refitting = None
+
+    # Fitting
+
+    def fit(self, returns, timestamps=None):
+        """Full fit on a history of bars, warm-started from the current parameters when there are any."""
+        data = self.scale * np.asarray(returns, dtype=float)
+        params = self.fit_params(data, self.params)
+        with self.lock:
+            self.history = data[-self.max_history:]
+            self.first_timestamp = timestamps[0] if timestamps is not None and len(timestamps) else None
+            self.last_timestamp = timestamps[-1] if timestamps is not None and len(timestamps) else None
+            self.set_params(params)
+            self.bars_since_fit = 0
+        return self
+
+    def fit_params(self, data, warm=None):
+        if self.kind == 'hmm':
+            model = hmm.GaussianHMM(n_components=self.n_states, covariance_type="full", n_iter=self.n_iter,
+                                    tol=TOL, random_state=self.random_state,
+                                    init_params='' if warm is not None else 'stmc')
+            if warm is not None:
+                model.startprob_, model.transmat_, model.means_, model.covars_ = warm
+            model.fit(data)
+            return model.startprob_, model.transmat_, model.means_, model.covars_
+
+        if self.kind == 'gmm':
+            init = {}
+            if warm is not None:
+                init = {'weights_init': warm[0], 'means_init': warm[2],
+                        'precisions_init': np.linalg.inv(warm[3])}
+            model = GaussianMixture(n_components=self.n_states, covariance_type="full", max_iter=self.n_iter,
+                                    tol=TOL, random_state=self.random_state, **init)
+            model.fit(data)
+            # A mixture is an HMM whose next state does not depend on the current one
+            transmat = np.tile(model.weights_, (self.n_states, 1))
+            return model.weights_, transmat, model.means_, model.covariances_
+        raise ValueError(f"Unknown regime model {self.kind}")
+
+    def set_params(self, params):
+        """Install parameters and rerun the forward filter over the kept history."""
+        startprob, transmat, means, covars = (np.asarray(p, dtype=float) for p in params)
+        self.params = startprob, transmat, means, covars
+        self.log_transmat = np.log(np.maximum(transmat, 1e-300))
+        self.means = means
+        cholesky = np.linalg.cholesky(covars)
+        self.inverse_cholesky = np.linalg.inv(cholesky)
+        self.log_norm = (-0.5 * means.shape[1] * np.log(2 * np.pi)
+                         - np.log(np.diagonal(cholesky, axis1=1, axis2=2)).sum(axis=1))
+        log_alpha = self.forward(self.history, np.log(np.maximum(startprob, 1e-300)))
+        self.set_filter(log_alpha[-1] if len(log_alpha) else np.log(np.maximum(startprob, 1e-300)))
+
+    # Filtering
+
+    def log_emission(self, data):
+        """Log density of each bar under each state, shape (bars, states)."""
+        centred = data[:, None, :] - self.means[None, :, :]
+        whitened = np.einsum('kij,tkj->tki', self.inverse_cholesky, centred)
+        return self.log_norm[None, :] - 0.5 * np.sum(whitened ** 2, axis=2)
+
+    def forward(self, data, log_prior):
+        """Normalised log filtered state probabilities after each bar, the prior is for the first bar."""
+        emission = self.log_emission(data) if len(data) else np.empty((0, self.n_states))
+        log_alpha = np.empty_like(emission)
+        previous = None
+        for t in range(len(emission)):
+            predicted = log_prior if previous is None else logsumexp_rows(previous[:, None] + self.log_transmat)
+            current = predicted + emission[t]
+            previous = current - logsumexp_rows(current[:, None])
+            log_alpha[t] = previous
+        return log_alpha
+
+    def set_filter(self, log_alpha):
+        self.log_alpha = log_alpha
+        self.probabilities = np.exp(log_alpha)
+        self.regime = int(np.argmax(log_alpha))
+
+    def update(self, bar, timestamp=None):
+        """Filter one new bar, O(states^2), and start a background refit when one is due. Returns the regime."""
+        data = self.scale * np.asarray(bar, dtype=float).reshape(1, -1)
+        with self.lock:
+            predicted = logsumexp_rows(self.log_alpha[:, None] + self.log_transmat)
+            current = predicted + self.log_emission(data)[0]
+            self.set_filter(current - logsumexp_rows(current[:, None]))
+            self.history = np.vstack([self.history, data])[-self.max_history:]
+            self.last_timestamp = timestamp if timestamp is not None else self.last_timestamp
+            self.bars_since_fit += 1
+            due = self.bars_since_fit >= self.refit_every and self.refitting is None
+            if due:
+                self.refitting = threading.Thread(target=self.refit, daemon=True)
+        if due:
+            self.refitting.start()
+        return self.regime
+
+    def update_many(self, returns, timestamps=None):
+        timestamps = timestamps if timestamps is not None else [None] * len(returns)
+        for bar, timestamp in zip(np.asarray(returns, dtype=float), timestamps):
+            self.update(bar, timestamp)
+        return self.regime
+
+    def refit(self):
+        """Warm-started full refit on the kept history, bars filtered meanwhile are replayed on the new model."""
+        try:
+            with self.lock:
+                data, warm = self.history.copy(), self.params
+            params = self.fit_params(data, warm)
+            with self.lock:
+                self.set_params(params)
+                self.bars_since_fit = 0
+            self.save()
+        finally:
+            with self.lock:
+                self.refitting = None
+
+    def filter_states(self, returns):
+        """Filtered state probabilities of a block of bars from the start probabilities, without updating."""
+        startprob = self.params[0]
+        log_alpha = self.forward(self.scale * np.asarray(returns, dtype=float), np.log(np.maximum(startprob, 1e-300)))
+        return np.exp(log_alpha)
+
+    @property
+    def transmat(self):
+        return self.params[1]
+
+    # Persistence
+
+    def save(self):
+        """Write the parameters, kept history and filter state, replacing the stored model atomically."""
+        os.makedirs(os.path.dirname(self.model_file) or '.', exist_ok=True)
+        with self.lock:
+            startprob, transmat, means, covars = self.params
+            state = dict(startprob=startprob, transmat=transmat, means=means, covars=covars,
+                         history=self.history, log_alpha=self.log_alpha, kind=self.kind, scale=self.scale,
+                         columns=np.array(self.columns if self.columns is not None else [], dtype=str),
+                         first_timestamp=str(self.first_timestamp) if self.first_timestamp is not None else '',
+                         last_timestamp=str(self.last_timestamp) if self.last_timestamp is not None else '',
+                         bars_since_fit=self.bars_since_fit)
+        tmp_file = self.model_file + '.tmp.npz'
+        with self.save_lock:
+            np.savez(tmp_file, **state)
+            os.replace(tmp_file, self.model_file)
+
+    def load(self):
+        """Restore a persisted model, returns False when there is none."""
+        if not os.path.exists(self.model_file):
+            return False
+        with np.load(self.model_file) as stored:
+            if str(stored['kind']) != self.kind or stored['means'].shape[0] != self.n_states:
+                return False
+            self.scale = float(stored['scale'])
+            self.history = stored['history']
+            self.set_params(tuple(stored[k] for k in ('startprob', 'transmat', 'means', 'covars')))
+            self.set_filter(stored['log_alpha'])
+            self.columns = list(stored['columns']) if 'columns' in stored.files else None
+            self.first_timestamp = stored_timestamp(stored, 'first_timestamp')
+            self.last_timestamp = stored_timestamp(stored, 'last_timestamp')
+            self.bars_since_fit = int(stored['bars_since_fit'])
+        return True
+
+
+def stored_timestamp(stored, key):
+    value = str(stored[key]) if key in stored.files else ''
+    return pd.Timestamp(value) if value else None
+
+
+def fitted_on(service, returns):
+    """Whether a restored model was fitted on these columns from the same first bar, with no bars beyond them."""
+    return (service.columns == [str(c) for c in returns.columns] and len(returns) > 0
+            and service.first_timestamp == returns.index[0] and service.last_timestamp is not None
+            and service.last_timestamp <= returns.index[-1])
+
+
+def logsumexp_rows(values):
+    """Log of the column sums of exp(values), for a (states, states) or (states, 1) array."""
+    peak = values.max(axis=0)
+    return peak + np.log(np.exp(values - peak).sum(axis=0))
+
+
+def get_regime_service(name, returns, n_states, kind='hmm', **kwargs):
+    """
+    Shared regime service for a frame of bars, restored from disk and brought up to date when possible.
+
+    Services are shared per name, columns and first bar. A persisted model is reused only when it was fitted on
+    the same columns from the same first bar, then only the bars after its last timestamp are filtered.
+    Otherwise the model is fitted from scratch and replaces the stored one.
+    """
+    key = (name, tuple(returns.columns), returns.index[0] if len(returns) else None)
+    with _services_lock:
+        service = _services.get(key)
+        if service is None:
+            service = RegimeService(name, n_states, kind, **kwargs)
+            if service.load() and fitted_on(service, returns):
+                new_bars = returns[returns.index > service.last_timestamp]
+                service.update_many(new_bars.to_numpy(), list(new_bars.index))
+            else:
+                service = RegimeService(name, n_states, kind, **kwargs)
+                service.fit(returns.to_numpy(), list(returns.index))
+                service.columns = [str(c) for c in returns.columns]
+            service.save()
+            _services[key] = service
+        return service
@@ -0,0 +1,213 @@
+import asyncio
+import functools
+import inspect
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+import numpy as np
+import pandas as pd
+
+# Vendor limits, requests per second, burst size and maximum concurrent requests
+VENDOR_LIMITS = {
+    'yahoo': {'rate': 2.0, 'burst': 4, 'concurrency': 2},
+    'bloomberg': {'rate': 50.0, 'burst': 50, 'concurrency': 8},
+}
+DEFAULT_LIMITS = {'rate': 5.0, 'burst': 5, 'concurrency': 4}  # Vendors missing from VENDOR_LIMITS
+MAX_RETRIES = 3  # Attempts per request before its error is raised
+BACKOFF_BASE = 0.5  # Seconds, the retry delay is drawn from [0, min(BACKOFF_CAP, BACKOFF_BASE * 2**attempt)]
+BACKOFF_CAP = 10.0
+LATENCY_WINDOW = 1000  # Latest request latencies kept per vendor for the metrics
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+class TransientError(Exception):
+    """A failure worth retrying, e.g. a throttling rejection, a timeout or a dropped connection."""
+
+
+TRANSIENT_ERRORS = (TransientError, ConnectionError, TimeoutError)  # Retried by default, others raise at once
+
+
+class TokenBucket:
+    """Rate limit of rate requests per second with bursts of up to burst requests."""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class VendorState:
+    """Limits and counters of one vendor."""
+
+    def __init__(self, rate, burst, concurrency):
+        self.bucket = TokenBucket(rate, burst)
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.queued = 0
+        self.in_flight = 0
+        self.completed = 0
+        self.failed = 0
+        self.retries = 0
+        self.coalesced = 0
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+
+
+class RequestScheduler:
+    """
+    Shared scheduler for every vendor call in the process, running on its own event loop thread.
+
+    Each vendor gets a token bucket rate limit and a concurrency cap. Identical requests, i.e. the same vendor
+    and key, that are already in flight are merged into one call whose result every caller receives. Failed
+    calls raising one of retry_on, by default only transient errors, are retried with full-jitter exponential
+    backoff, any other error is raised at once. Synchronous functions run in the loop's thread pool,
+    coroutine functions on the loop and functions returning a concurrent Future (e.g. SessionManager.send) are
+    awaited without blocking a thread.
+    """
+
+    def __init__(self, limits=None, max_retries=MAX_RETRIES, retry_on=TRANSIENT_ERRORS):
+        self.limits = dict(VENDOR_LIMITS, **(limits or {}))
+        self.max_retries = max_retries
+        self.retry_on = retry_on
+        self.vendors = {}
+        self.in_flight = {}  # (vendor, key) -> asyncio future of the shared call
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self.thread.start()
+
+    def vendor(self, name):
+        if name not in self.vendors:
+            self.vendors[name] = VendorState(**self.limits.get(name, DEFAULT_LIMITS))
+        return self.vendors[name]
+
+    async def submit(self, vendor, key, fn, *args, **kwargs):
+        """Await fn(*args, **kwargs) under the vendor's limits, shared with identical in-flight requests."""
+        state = self.vendor(vendor)
+        flight_key = (vendor, key)
+        if flight_key in self.in_flight:
+            state.coalesced += 1
+            return await asyncio.shield(self.in_flight[flight_key])
+
+        shared = self.loop.create_future()
+        self.in_flight[flight_key] = shared
+        try:
+            result = await self._run(state, fn, args, kwargs)
+        except BaseException as exc:
+            shared.set_exception(exc)
+            shared.exception()  # Retrieved here so callers without a waiter do not log it
+            raise
+        else:
+            shared.set_result(result)
+            return result
+        finally:
+            del self.in_flight[flight_key]
+
+    async def _run(self, state, fn, args, kwargs):
+        for attempt in range(self.max_retries):
+            state.queued += 1
+            try:
+                await state.semaphore.acquire()
+            finally:
+                state.queued -= 1
+            try:
+                await state.bucket.acquire()
+                state.in_flight += 1
+                started = time.monotonic()
+                try:
+                    result = await self._call(fn, args, kwargs)
+                finally:
+                    state.in_flight -= 1
+            except self.retry_on:
+                if attempt + 1 == self.max_retries:
+                    state.failed += 1
+                    raise
+                state.retries += 1
+            except Exception:
+                state.failed += 1
+                raise
+            else:
+                state.latencies.append(time.monotonic() - started)
+                state.completed += 1
+                return result
+            finally:
+                state.semaphore.release()
+            await asyncio.sleep(random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt)))
+
+    async def _call(self, fn, args, kwargs):
+        if inspect.iscoroutinefunction(fn):
+            return await fn(*args, **kwargs)
+        result = await self.loop.run_in_executor(None, functools.partial(fn, *args, **kwargs))
+        if isinstance(result, Future):
+            result = await asyncio.wrap_future(result)
+        return result
+
+    def submit_threadsafe(self, vendor, key, fn, *args, **kwargs):
+        """Schedule a call from any thread, returns a concurrent Future."""
+        return asyncio.run_coroutine_threadsafe(self.submit(vendor, key, fn, *args, **kwargs), self.loop)
+
+    def call(self, vendor, key, fn, *args, **kwargs):
+        """Blocking call for synchronous code, must not be used from the scheduler's own loop."""
+        return self.submit_threadsafe(vendor, key, fn, *args, **kwargs).result()
+
+    def metrics(self):
+        """Queue depth, in-flight count, outcome counters and latency percentiles per vendor."""
+        rows = {}
+        for name, state in list(self.vendors.items()):
+            latencies = np.array(state.latencies)
+            rows[name] = {
+                'queue_depth': state.queued,
+                'in_flight': state.in_flight,
+                'completed': state.completed,
+                'failed': state.failed,
+                'retries': state.retries,
+                'coalesced': state.coalesced,
+                'latency_p50': np.percentile(latencies, 50) if len(latencies) else np.nan,
+                'latency_p95': np.percentile(latencies, 95) if len(latencies) else np.nan,
+            }
+        return pd.DataFrame.from_dict(rows, orient='index')
+
+    def stop(self):
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(timeout=1)
+
+
+def get_scheduler():
+    """The process-wide request scheduler."""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = RequestScheduler()
+        return _scheduler
+
+
+def request_key(*args, **kwargs):
+    """Hashable key of a call's arguments, lists become tuples and keyword order is ignored."""
+    def freeze(value):
+        if isinstance(value, (list, tuple)):
+            return tuple(freeze(v) for v in value)
+        if isinstance(value, dict):
+            return tuple(sorted((k, freeze(v)) for k, v in value.items()))
+        return value
+    return freeze(args), freeze(kwargs)
+
+
+def scheduled_call(vendor, fn, *args, **kwargs):
+    """Blocking fn(*args, **kwargs) through the shared scheduler, keyed by the function and its arguments."""
+    key = (getattr(fn, '__module__', None), getattr(fn, '__qualname__', repr(fn))) + request_key(*args, **kwargs)
+    return get_scheduler().call(vendor, key, fn, *args, **kwargs)
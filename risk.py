@@ -4,6 +4,8 @@ import QuantLib as ql
 import matplotlib.pyplot as plt
 import numpy as np
 
+from curve_builder import SofrCurveBuilder
+
 
 def calculate_greeks_black(calc_date, strike, spot, yield_curve, volatility, option_maturity_date):
     #calendar = ql.UnitedStates()
@@ -87,29 +89,10 @@ def run():
                     112]  # range(108, 111)
     volatility = 0.0611
 
-    # Create a yield curve (Term Structure)
+    # Create a yield curve (Term Structure), a 3M SOFR deposit bootstrapped by the shared curve builder
     today = ql.Date(28, ql.August, 2023)
-    calendar = ql.NullCalendar()
-    # Define the quoted rate
-    quoted_rate = 0.05
-
-    # Create a Quote object for the rate
-    rate_quote = ql.QuoteHandle(ql.SimpleQuote(quoted_rate))
-
-    # Define the rest of the parameters
-    tenor = ql.Period(3, ql.Months)
-    settlement_days = 0  # Adjust this according to your specific settlement convention
-    calendar = ql.NullCalendar()  # Use the appropriate calendar
-    business_day_convention = ql.ModifiedFollowing  # Use the appropriate convention
-    compoundable = False  # Depending on your requirements
-    day_counter = ql.Actual360()  # Use the appropriate day counter
-
-    # Create the DepositRateHelper
-    rate_helper = ql.DepositRateHelper(rate_quote, tenor, settlement_days, calendar, business_day_convention,
-                                       compoundable, day_counter)
-    # Add the rate helper to the list of rate helpers
-    rate_helpers = [rate_helper]
-    yield_curve = ql.PiecewiseFlatForward(today, rate_helpers, ql.Actual360())
+    curve_builder = SofrCurveBuilder(today, deposits={'3M': 0.05})
+    yield_curve = curve_builder.curve
 
     # Initialize lists to store Greek values
     delta_values = []
@@ -0,0 +1,132 @@
+from collections import namedtuple
+from itertools import combinations
+
+import numpy as np
+import pandas as pd
+
+from correlation_engine import window_sums
+
+# Engine settings
+CHUNK_ELEMENTS = 8_000_000  # Moment matrix values per chunk, bounds the working memory
+MIN_OBS_FACTOR = 2  # Windows need at least this many times the number of coefficients
+
+RollingResults = namedtuple('RollingResults', ['params', 'bse', 'tvalues', 'rsquared', 'nobs', 'forecast'])
+
+
+def expand_terms(rhs):
+    """
+    Column names of a formula right hand side, e.g. 'DXY + CL * GC' -> DXY, CL, GC, CL:GC.
+
+    a * b expands to a + b + a:b as in patsy, a:b is the interaction alone, repeated terms are kept once.
+    """
+    terms = []
+    for term in rhs.split('+'):
+        term = term.strip()
+        if '*' in term:
+            factors = [f.strip() for f in term.split('*')]
+            expanded = [':'.join(c) for n in range(1, len(factors) + 1) for c in combinations(factors, n)]
+        else:
+            expanded = [':'.join(f.strip() for f in term.split(':'))]
+        terms += [t for t in expanded if t not in terms]
+    return terms
+
+
+def design_matrix(data, rhs, intercept=True):
+    """Design matrix of a formula right hand side over the columns of data, built once for all windows."""
+    columns = {'Intercept': np.ones(len(data))} if intercept else {}
+    for term in expand_terms(rhs):
+        columns[term] = np.prod([data[f].to_numpy(dtype=float) for f in term.split(':')], axis=0)
+    return pd.DataFrame(columns, index=data.index)
+
+
+def from_formula(formula, data, intercept=True):
+    """Response and design matrix of a 'y ~ x1 + x2 * x3' formula."""
+    lhs, rhs = formula.split('~')
+    return data[lhs.strip()], design_matrix(data, rhs, intercept)
+
+
+def batched_inverse(matrices):
+    """Inverse of a stack of matrices, with the pseudo inverse for singular ones."""
+    try:
+        return np.linalg.inv(matrices)
+    except np.linalg.LinAlgError:
+        return np.linalg.pinv(matrices, hermitian=True)
+
+
+def rolling_ols(y, X, window=None, weights=None, min_obs=None, chunk_elements=CHUNK_ELEMENTS):
+    """
+    OLS, or WLS with observation weights, of y on X over every trailing window, or expanding when window is None.
+
+    X'X, X'y and y'y of each window come from running sums of the per-row outer products, i.e. a rank-one add
+    of the new row and drop of the row leaving the window, and all windows are solved in one batched inverse.
+    Rows are processed in chunks, each extended by the window-1 rows before it, so intraday histories fit in
+    memory. Row t of the results uses the window ending at t, the forecast at t uses the coefficients of the
+    window ending at t-1 with the regressors of row t.
+    """
+    index, names = X.index, list(X.columns)
+    y = np.asarray(y, dtype=float)
+    X = np.asarray(X, dtype=float)
+    w = np.ones(len(y)) if weights is None else np.asarray(weights, dtype=float)
+    n_rows, k = X.shape
+    min_obs = min_obs or MIN_OBS_FACTOR * k
+    valid_row = np.isfinite(y) & np.isfinite(X).all(axis=1) & np.isfinite(w)
+    w = np.where(valid_row, w, 0.0)
+    y, X = np.where(valid_row, y, 0.0), np.where(valid_row[:, None], X, 0.0)
+
+    params = np.full((n_rows, k), np.nan)
+    bse = np.full((n_rows, k), np.nan)
+    rsquared = np.full(n_rows, np.nan)
+    nobs = np.zeros(n_rows, dtype=np.int64)
+
+    span = window or n_rows
+    chunk = max(chunk_elements // (k * k) - (window or 0), 1)
+    carry = np.zeros(k * k + k + 4)  # Expanding window sums carried between chunks
+    for start in range(0, n_rows, chunk):
+        stop = min(start + chunk, n_rows)
+        lead = max(start - span + 1, 0) if window else start
+        Xc, yc, wc = X[lead:stop], y[lead:stop], w[lead:stop]
+        wX = Xc * wc[:, None]
+        # Per row: x x', x y, y^2, y, weight and the observation count, all weighted
+        rows = np.concatenate([(wX[:, :, None] * Xc[:, None, :]).reshape(len(Xc), -1), wX * yc[:, None],
+                               (wc * yc ** 2)[:, None], (wc * yc)[:, None], wc[:, None],
+                               valid_row[lead:stop, None]], axis=1)
+        if window:
+            sums = window_sums(rows, window)[start - lead:]
+        else:
+            sums = np.cumsum(rows, axis=0) + carry
+            carry = sums[-1]
+
+        xtx = sums[:, :k * k].reshape(-1, k, k)
+        xty = sums[:, k * k:k * k + k]
+        yy, sy, sw, count = sums[:, -4], sums[:, -3], sums[:, -2], sums[:, -1]
+
+        ready = count >= min_obs
+        if not ready.any():
+            continue
+        inverse = batched_inverse(xtx[ready])
+        beta = np.einsum('nij,nj->ni', inverse, xty[ready])
+        rss = np.maximum(yy[ready] - np.einsum('ni,ni->n', beta, xty[ready]), 0.0)
+        dof = count[ready] - k
+        sigma2 = rss / np.maximum(dof, 1)
+        tss = yy[ready] - sy[ready] ** 2 / sw[ready]
+
+        rows_ready = np.arange(start, stop)[ready]
+        params[rows_ready] = beta
+        bse[rows_ready] = np.sqrt(np.maximum(np.diagonal(inverse, axis1=1, axis2=2), 0.0) * sigma2[:, None])
+        with np.errstate(invalid='ignore', divide='ignore'):
+            rsquared[rows_ready] = 1 - rss / tss
+        nobs[start:stop] = count
+
+    forecast = np.full(n_rows, np.nan)
+    forecast[1:] = np.einsum('ni,ni->n', params[:-1], np.where(valid_row[1:, None], X[1:], np.nan))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        tvalues = params / bse
+    frame = lambda values: pd.DataFrame(values, index=index, columns=names)
+    return RollingResults(frame(params), frame(bse), frame(tvalues), pd.Series(rsquared, index=index),
+                          pd.Series(nobs, index=index), pd.Series(forecast, index=index))
+
+
+def rolling_formula(formula, data, window=None, weights=None, min_obs=None):
+    """rolling_ols of a 'y ~ x1 + x2 * x3' formula over the columns of data."""
+    y, X = from_formula(formula, data)
+    return rolling_ols(y, X, window, weights, min_obs)
@@ -1,78 +1,113 @@
-import blpapi
 import numpy as np
+import QuantLib as ql
 
-# Bloomberg session setup
-sessionOptions = blpapi.SessionOptions()
-sessionOptions.setServerHost("localhost")  # Replace with your Bloomberg Terminal API server host
-sessionOptions.setServerPort(8194)  # Bloomberg Terminal API server port
-session = blpapi.Session(sessionOptions)
-session.start()
-
-# Define the Bloomberg tickers for SOFR futures and swaps
-sofr_futures_tickers = ["SR1 Comdty", "SR3 Comdty"]  # 1-month and 3-month futures two years out
-sofr_swaps_tickers = ["US05YFRA Curncy", "US10YFRA Curncy", "US30YFRA Curncy"]  # 5Y, 10Y, and 30Y swaps
-
-# Initialize dictionaries to store responses
-sofr_futures_responses = {}
-sofr_swaps_responses = {}
-
-# Fetch SOFR futures data
-for ticker in sofr_futures_tickers:
-    sofr_futures_request = session.createRequest("ReferenceDataRequest")
-    sofr_futures_request.getElement("securities").appendValue(ticker)
-    sofr_futures_request.getElement("fields").appendValue("PX_LAST")
-    session.sendRequest(sofr_futures_request)
-
-# Fetch SOFR swap data
-for ticker in sofr_swaps_tickers:
-    sofr_swaps_request = session.createRequest("ReferenceDataRequest")
-    sofr_swaps_request.getElement("securities").appendValue(ticker)
-    sofr_swaps_request.getElement("fields").appendValue("PX_LAST")
-    session.sendRequest(sofr_swaps_request)
-
-# Process responses
-while True:
-    event = session.nextEvent()
-    if event.eventType() == blpapi.Event.RESPONSE:
-        for msg in event:
-            if msg.hasElement("securityData"):
-                securityData = msg.getElement("securityData")
-                fieldData = securityData.getElement("fieldData")
-                ticker = msg.correlationIds()[0].value()
-                if ticker in sofr_futures_tickers:
-                    sofr_futures_responses[ticker] = fieldData.getElementAsFloat("PX_LAST")
-                elif ticker in sofr_swaps_tickers:
-                    sofr_swaps_responses[ticker] = fieldData.getElementAsFloat("PX_LAST")
-    if len(sofr_futures_responses) == len(sofr_futures_tickers) and len(sofr_swaps_responses) == len(sofr_swaps_tickers):
-        break
-
-# Close the Bloomberg session
-session.stop()
-
-# Calculate SOFR rates for futures
-sofr_rates_futures = {}
-for ticker, price in sofr_futures_responses.items():
-    maturity = int(ticker[2])  # Extract the maturity (1 or 3 months)
-    sofr_rate = 100 - price  # Calculate SOFR rate (assuming futures prices are quoted in percentage terms)
-    sofr_rates_futures[f"{maturity}M"] = sofr_rate / 100  # Convert to decimal form
-
-# Calculate SOFR rates for swaps
-sofr_rates_swaps = {}
-for ticker, price in sofr_swaps_responses.items():
-    maturity = int(ticker[2:4])  # Extract the maturity (5, 10, or 30 years)
-    sofr_rate = 100 - price  # Calculate SOFR rate (assuming swaps prices are quoted in percentage terms)
-    sofr_rates_swaps[f"{maturity}Y"] = sofr_rate / 100  # Convert to decimal form
-
-# Create a term structure yield curve (linear interpolation)
-maturities = [1 / 12, 3 / 12, 5, 10, 30]  # Maturities in years (1 month, 3 months, 5 years, 10 years, 30 years)
-sofr_rates = [sofr_rates_futures["1M"], sofr_rates_futures["3M"], sofr_rates_swaps["5Y"], sofr_rates_swaps["10Y"], sofr_rates_swaps["30Y"]]
-sofr_curve = np.interp(maturities, [1 / 12, 3 / 12, 5, 10, 30], sofr_rates)
-
-# Estimated 10-year TSY bond price using the SOFR yield curve
-tsy_10yr_price = 100 / ((1 + sofr_curve[3]) ** maturities[3])
-
-# Print SOFR rates and estimated 10-year TSY bond price
-print("SOFR Rates (in decimal form):")
-for maturity, rate in zip(maturities, sofr_curve):
-    print(f"{maturity}-Year: {rate:.6f}")
-print("Estimated 10-Year TSY Bond Price:", tsy_10yr_price)
+from bbg_session import RequestError
+from curve_builder import SofrCurveBuilder
+from market_data import get_market_data_service
+from reference_data import fetch_reference_data
+
+# Define the Bloomberg tickers for the SOFR curve instruments
+SOFR_OVERNIGHT_TICKER = "SOFRRATE Index"  # Published SOFR fixing, in percent
+SOFR_SWAPS_TICKERS = {f"{n}Y": f"USOSFR{n} Curncy" for n in (3, 4, 5, 7, 10, 12, 15, 20, 25, 30)}  # OIS, in percent
+N_SOFR_FUTURES = 20  # Quarterly 3M SOFR futures in the strip
+MONTH_CODES = "HMUZ"  # Quarterly IMM months
+
+
+def sofr_futures_strip(today, n_contracts=N_SOFR_FUTURES):
+    """
+    Tickers of the next quarterly 3M SOFR futures, e.g. 'SFRZ3 Comdty'.
+
+    A contract whose reference period has started (from its IMM date, the third Wednesday of the month) is
+    skipped, its rate depends on SOFR fixings the curve's index does not have.
+    """
+    tickers = []
+    year, quarter = today.year(), (today.month() - 1) // 3
+    while len(tickers) < n_contracts:
+        if ql.Date.nthWeekday(3, ql.Wednesday, 3 * quarter + 3, year) > today:
+            tickers.append(f"SFR{MONTH_CODES[quarter]}{year % 10} Comdty")
+        quarter += 1
+        if quarter == 4:
+            year, quarter = year + 1, 0
+    return tickers
+
+
+def fetch_last_prices(tickers, manager=None):
+    """PX_LAST of every ticker in one batched reference data request."""
+    return fetch_reference_data(tickers, ["PX_LAST"], manager=manager)["PX_LAST"].to_dict()
+
+
+def curve_quotes(prices, futures_tickers):
+    """Split Bloomberg prices into the deposit, futures and swap quotes of the curve builder."""
+    deposits = {"1D": prices[SOFR_OVERNIGHT_TICKER] / 100}
+    futures = {ticker: prices[ticker] for ticker in futures_tickers}
+    swaps = {tenor: prices[ticker] / 100 for tenor, ticker in SOFR_SWAPS_TICKERS.items()}
+    return deposits, futures, swaps
+
+
+def build_sofr_curve(today, manager=None):
+    """Fetch the whole strip and swap ladder in one round-trip and bootstrap the curve."""
+    futures_tickers = sofr_futures_strip(today)
+    prices = fetch_last_prices([SOFR_OVERNIGHT_TICKER] + futures_tickers + list(SOFR_SWAPS_TICKERS.values()),
+                               manager=manager)
+    deposits, futures, swaps = curve_quotes(prices, futures_tickers)
+    return SofrCurveBuilder(today, deposits=deposits, futures=futures, swaps=swaps)
+
+
+def refresh_sofr_curve(builder, manager=None):
+    """Re-fetch the quotes of an existing curve and apply them as ticks, without rebuilding it."""
+    futures_tickers = [key for key in builder.quotes if key.endswith("Comdty")]
+    prices = fetch_last_prices([SOFR_OVERNIGHT_TICKER] + futures_tickers + list(SOFR_SWAPS_TICKERS.values()),
+                               manager=manager)
+    for quotes in curve_quotes(prices, futures_tickers):
+        builder.set_quotes({key: value for key, value in quotes.items() if key in builder.quotes})
+    return builder
+
+
+def stream_sofr_curve(builder, service=None):
+    """
+    Keep the curve live off //blp/mktdata, every futures, swap or fixing tick is applied as a quote update.
+
+    Ticks arrive on the market data consumer thread, a whole batch is applied under the builder's lock so readers
+    on other threads never see the curve mid-update.
+    """
+    tickers = {}  # Bloomberg ticker -> (builder quote key, scale)
+    for key in builder.quotes:
+        if key.endswith("Comdty"):
+            tickers[key] = (key, 1.0)
+        elif key in SOFR_SWAPS_TICKERS:
+            tickers[SOFR_SWAPS_TICKERS[key]] = (key, 0.01)
+        elif key == "1D":
+            tickers[SOFR_OVERNIGHT_TICKER] = (key, 0.01)
+
+    def on_update(batch):
+        builder.set_quotes({tickers[ticker][0]: values["LAST_PRICE"] * tickers[ticker][1]
+                            for ticker, values in batch.items() if "LAST_PRICE" in values})
+
+    service = service or get_market_data_service()
+    service.subscribe(tickers, fields=["LAST_PRICE"])
+    return service.add_consumer(on_update, securities=tickers)
+
+
+def main():
+    today = ql.Date.todaysDate()
+    try:
+        builder = build_sofr_curve(today)
+    except RequestError as exc:
+        print(f"Reference data request failed: {exc}")
+        return
+
+    maturities = np.array([1 / 12, 3 / 12, 1, 2, 5, 10, 30])  # Maturities in years
+    sofr_curve = builder.zero_rate(maturities)
+
+    # Estimated 10-year zero coupon TSY bond price off the SOFR curve
+    tsy_10yr_price = 100 * builder.discount(10.0)
+
+    # Print SOFR zero rates and estimated 10-year TSY bond price
+    print("SOFR Zero Rates (in decimal form):")
+    for maturity, rate in zip(maturities, sofr_curve):
+        print(f"{maturity:.4g}-Year: {rate:.6f}")
+    print("Estimated 10-Year TSY Bond Price:", tsy_10yr_price)
+
+
+if __name__ == "__main__":
+    main()
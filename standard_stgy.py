@@ -1,5 +1,7 @@
 import matplotlib.pyplot as plt
-import numpy as np
+
+from chain_analytics import black76
+from strategy_engine import Leg, evaluate
 '''
 Call Option Purchase:
 Useful When: You are bullish on the bond future and expect its price to rise.
@@ -41,92 +43,52 @@ Useful When: Similar to digital call, but you want a binary payout if the future
 
 '''
 
+def strategy_legs(future_price, volatility, expiry, rate):
+    # Premiums are priced off the future so the P&L and breakevens are net of the cost of the structure
+    def leg(option_type, strike, quantity):
+        premium, _, _ = black76(future_price, strike, expiry, volatility, rate, option_type == 'C')
+        return Leg(option_type, strike, expiry, quantity, float(premium))
+
+    return {
+        "Call Option Purchase": [leg('C', 110.0, 1)],
+        "Put Option Purchase": [leg('P', 109.0, 1)],
+        "Straddle": [leg('C', 110.0, 1), leg('P', 110.0, 1)],
+        "Strangle (Low)": [leg('C', 112.0, 1), leg('P', 108.0, 1)],
+        "Strangle (High)": [leg('C', 112.0, -1), leg('P', 108.0, -1)],
+        "Bull Call Spread": [leg('C', 110.0, 1), leg('C', 112.0, -1)],
+        "Bear Call Spread": [leg('C', 110.0, -1), leg('C', 112.0, 1)],
+        "Butterfly Spread": [leg('C', 108.0, 1), leg('C', 110.0, -2), leg('C', 112.0, 1)],
+        # Digitals approximated by a quarter-point call/put spread scaled to a unit payout
+        "Digital Call Option": [leg('C', 110.0, 4), leg('C', 110.25, -4)],
+        "Digital Put Option": [leg('P', 109.0, 4), leg('P', 108.75, -4)],
+    }
+
+
 def check_strategy():
     # Bond future price
     future_price = 109.75
+    volatility = 0.07
+    expiry = 1 / 12  # Time to expiry in years
+    rate = 0.05
 
-    # Strike prices for different strategies
-    strike_price_call = 110.0
-    strike_price_put = 109.0
-    strike_price_straddle = 110.0
-    strike_price_strangle_low = 108.0
-    strike_price_strangle_high = 112.0
-    strike_price_bull_call = 110.0
-    strike_price_bull_put = 108.0
-    strike_price_bear_call = 112.0
-    strike_price_bear_put = 108.0
-    strike_price_fly_low = 108.0
-    strike_price_fly_mid = 110.0
-    strike_price_fly_high = 112.0
-
-    # Create an array of underlying prices (for the x-axis)
-    underlying_prices = np.arange(100, 120, 0.5)
-
-    # Calculate payoffs for each strategy
-    call_payoff = np.maximum(underlying_prices - strike_price_call, 0)
-    put_payoff = np.maximum(strike_price_put - underlying_prices, 0)
-    straddle_payoff = call_payoff + put_payoff
-    strangle_low_payoff = np.maximum(underlying_prices - strike_price_strangle_low, 0) - np.maximum(underlying_prices - strike_price_strangle_high, 0)
-    bull_call_payoff = np.maximum(underlying_prices - strike_price_bull_call, 0)
-    bull_put_payoff = np.maximum(strike_price_bull_put - underlying_prices, 0)
-    bear_call_payoff = np.maximum(underlying_prices - strike_price_bear_call, 0)
-    bear_put_payoff = np.maximum(strike_price_bear_put - underlying_prices, 0)
-    fly_low_payoff = np.maximum(underlying_prices - strike_price_fly_low, 0) - np.maximum(underlying_prices - strike_price_fly_mid, 0) + np.maximum(underlying_prices - strike_price_fly_high, 0)
-    digital_call_payoff = np.where(underlying_prices > strike_price_call, 1, 0)
-    digital_put_payoff = np.where(underlying_prices < strike_price_put, 1, 0)
-
-    # Calculate breakeven points for each strategy
-    call_breakeven = strike_price_call
-    put_breakeven = strike_price_put
-    straddle_breakeven = strike_price_call + straddle_payoff[0]  # Straddle breakeven is at the initial option premium
-    strangle_low_breakeven = strike_price_strangle_low - strangle_low_payoff[0]  # Strangle breakevens are at the initial option premiums
-    strangle_high_breakeven = strike_price_strangle_high + strangle_low_payoff[0]
-    bull_call_breakeven = strike_price_call + bull_call_payoff[0]
-    bull_put_breakeven = strike_price_bull_put - bull_put_payoff[0]
-    bear_call_breakeven = strike_price_bear_call + bear_call_payoff[0]
-    bear_put_breakeven = strike_price_bear_put - bear_put_payoff[0]
-    fly_low_breakeven = strike_price_fly_low - fly_low_payoff[0]
-    fly_high_breakeven = strike_price_fly_high + fly_low_payoff[0]
-    digital_call_breakeven = strike_price_call
-    digital_put_breakeven = strike_price_put
-
-    # Create a dictionary of strategies and their payoffs
-    strategies = {
-        "Call Option Purchase": call_payoff,
-        "Put Option Purchase": put_payoff,
-        "Straddle": straddle_payoff,
-        "Strangle (Low)": strangle_low_payoff,
-        "Strangle (High)": -strangle_low_payoff,  # Opposite sign
-        "Bull Call Spread": bull_call_payoff - bull_put_payoff,
-        "Bear Call Spread": bear_call_payoff - bear_put_payoff,
-        "Butterfly Spread": fly_low_payoff,
-        "Digital Call Option": digital_call_payoff,
-        "Digital Put Option": -digital_put_payoff,  # Opposite sign
-    }
+    strategies = strategy_legs(future_price, volatility, expiry, rate)
+    underlying_prices, pnl, ranking = evaluate(strategies, future_price, volatility, rate, low=100, high=120, step=0.5)
+    print(ranking)
 
-    # Create a plot for each strategy
+    # Create a plot for each strategy with its breakevens in the same colour
     plt.figure(figsize=(12, 8))
-    for strategy, payoff in strategies.items():
-        plt.plot(underlying_prices, payoff, label=strategy)
-
-    # Plot breakeven points
-    plt.axvline(call_breakeven, color='r', linestyle='--', label='Call Breakeven')
-    plt.axvline(put_breakeven, color='g', linestyle='--', label='Put Breakeven')
-    plt.axvline(straddle_breakeven, color='b', linestyle='--', label='Straddle Breakeven')
-    plt.axvline(strangle_low_breakeven, color='m', linestyle='--', label='Strangle Low Breakeven')
-    plt.axvline(strangle_high_breakeven, color='c', linestyle='--', label='Strangle High Breakeven')
-    plt.axvline(bull_call_breakeven, color='y', linestyle='--', label='Bull Call Breakeven')
-    plt.axvline(bull_put_breakeven, color='orange', linestyle='--', label='Bull Put Breakeven')
-    plt.axvline(bear_call_breakeven, color='purple', linestyle='--', label='Bear Call Breakeven')
-    plt.axvline(bear_put_breakeven, color='brown', linestyle='--', label='Bear Put Breakeven')
-    plt.axvline(fly_low_breakeven, color='pink', linestyle='--', label='Butterfly Low Breakeven')
-    plt.axvline(fly_high_breakeven, color='lime', linestyle='--', label='Butterfly High Breakeven')
-    plt.axvline(digital_call_breakeven, color='gray', linestyle='--', label='Digital Call Breakeven')
-    plt.axvline(digital_put_breakeven, color='olive', linestyle='--', label='Digital Put Breakeven')
+    for strategy, strategy_pnl in zip(strategies, pnl):
+        line, = plt.plot(underlying_prices, strategy_pnl, label=strategy)
+        for breakeven in ranking.loc[strategy, 'breakevens']:
+            plt.axvline(breakeven, color=line.get_color(), linestyle='--', linewidth=0.8)
 
     plt.xlabel('Underlying Price')
-    plt.ylabel('Payoff')
+    plt.ylabel('P&L at Expiry')
     plt.title('Bond Future Option Payoff Diagrams')
     plt.legend()
     plt.grid(True)
     plt.show()
+
+
+if __name__ == "__main__":
+    check_strategy()
@@ -0,0 +1,148 @@
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+from scipy.stats import norm
+
+from chain_analytics import black76
+
+# A single strategy leg: option_type is 'C', 'P' or 'F' (the future itself, strike is the entry price),
+# expiry is in years from the valuation date, quantity is signed (+ long / - short) and premium is per unit.
+Leg = namedtuple('Leg', ['option_type', 'strike', 'expiry', 'quantity', 'premium'])
+
+CALL, PUT, FUTURE = 0, 1, 2
+LEG_TYPES = {'C': CALL, 'P': PUT, 'F': FUTURE}
+
+
+def pack_strategies(strategies):
+    """Pack a list of strategies (lists of legs) into padded (n_strategies, max_legs) arrays."""
+    n_legs = max(len(legs) for legs in strategies)
+    shape = (len(strategies), n_legs)
+    packed = {'type': np.full(shape, FUTURE, dtype=np.int8),
+              'strike': np.zeros(shape),
+              'expiry': np.zeros(shape),
+              'quantity': np.zeros(shape),  # zero quantity pads the shorter strategies
+              'premium': np.zeros(shape)}
+
+    for i, legs in enumerate(strategies):
+        for j, leg in enumerate(legs):
+            packed['type'][i, j] = LEG_TYPES[leg.option_type.upper()[0]]
+            packed['strike'][i, j] = leg.strike
+            packed['expiry'][i, j] = leg.expiry
+            packed['quantity'][i, j] = leg.quantity
+            packed['premium'][i, j] = leg.premium
+    return packed
+
+
+def take_strategies(packed, index):
+    """Subset of the packed strategy arrays, one row per entry of index."""
+    return {key: values[index] for key, values in packed.items()}
+
+
+def leg_values(packed, prices, horizon=None, volatility=None, rate=0.0):
+    """
+    Value of every leg on every price, shape (n_strategies, max_legs, n_prices).
+
+    prices is either a price grid shared by all strategies or an (n_strategies, n_prices) array.
+    With horizon=None each option is worth its intrinsic value at expiry, otherwise options are marked
+    to model with Black-76 on the time remaining from the horizon to their expiry.
+    """
+    prices = np.asarray(prices, dtype=float)
+    prices = prices[:, None, :] if prices.ndim == 2 else prices[None, None, :]
+    option_type = packed['type'][..., None]
+    strike = packed['strike'][..., None]
+
+    if horizon is None:
+        value = np.where(option_type == CALL, np.maximum(prices - strike, 0.0), np.maximum(strike - prices, 0.0))
+    else:
+        remaining = np.maximum(packed['expiry'] - horizon, 0.0)[..., None]
+        value, _, _ = black76(prices, strike, remaining, volatility, rate, option_type == CALL)
+
+    # Futures legs are linear whether or not we are at expiry
+    return np.where(option_type == FUTURE, prices - strike, value)
+
+
+def strategy_pnl(packed, prices, horizon=None, volatility=None, rate=0.0):
+    """P&L of every strategy on the prices, net of the premiums paid or received."""
+    value = leg_values(packed, prices, horizon, volatility, rate)
+    cost = np.where(packed['type'] == FUTURE, 0.0, packed['premium'])[..., None]
+    return np.einsum('sl,slp->sp', packed['quantity'], value - cost)
+
+
+def price_grid(low, high, step):
+    """Regular price grid on which the P&L curves are evaluated."""
+    return np.arange(low, high + step / 2, step)
+
+
+def breakevens(packed, pnl, prices, horizon=None, volatility=None, rate=0.0, tolerance=1e-10):
+    """
+    Breakeven prices of every strategy by root-finding on the P&L curve.
+
+    Roots are bracketed by sign changes between adjacent grid nodes and all brackets are then bisected
+    together, so the breakevens are exact to the tolerance and not limited by the grid step.
+    """
+    prices = np.asarray(prices, dtype=float)
+    left, right = pnl[:, :-1], pnl[:, 1:]
+    strategy, node = np.nonzero(np.signbit(left) != np.signbit(right))
+
+    bracketed = take_strategies(packed, strategy)
+    low, high = prices[node], prices[node + 1]
+    low_negative = np.signbit(left[strategy, node])
+    while low.size and np.max(high - low) > tolerance:
+        mid = 0.5 * (low + high)
+        mid_negative = np.signbit(strategy_pnl(bracketed, mid[:, None], horizon, volatility, rate)[:, 0])
+        same_side = mid_negative == low_negative
+        low = np.where(same_side, mid, low)
+        high = np.where(same_side, high, mid)
+    roots = 0.5 * (low + high)
+
+    splits = np.searchsorted(strategy, np.arange(1, pnl.shape[0]))
+    return np.split(roots, splits)
+
+
+def rank_strategies(names, pnl, prices, forward, volatility, horizon):
+    """Risk/reward table of all strategies, best reward per unit of risk first."""
+    prices = np.asarray(prices, dtype=float)
+
+    # Lognormal density of the future at the horizon, to weight the P&L curve
+    stddev = volatility * np.sqrt(horizon)
+    z = (np.log(prices / forward) + 0.5 * stddev ** 2) / stddev
+    density = norm.pdf(z) / (prices * stddev)
+    weights = density * np.gradient(prices)
+    weights = weights / weights.sum()
+
+    max_profit = pnl.max(axis=1)
+    max_loss = pnl.min(axis=1)
+    # P&L still sloping at the edge of the grid means the risk or reward is open ended
+    slope_low = pnl[:, 1] - pnl[:, 0]
+    slope_high = pnl[:, -1] - pnl[:, -2]
+    unbounded_loss = ((slope_low > 0) & (pnl[:, 0] < 0)) | ((slope_high < 0) & (pnl[:, -1] < 0))
+
+    with np.errstate(divide='ignore'):
+        reward_risk = np.where(max_loss < 0, max_profit / -max_loss, np.inf)
+
+    table = pd.DataFrame({'max_profit': max_profit,
+                          'max_loss': max_loss,
+                          'unbounded_loss': unbounded_loss,
+                          'expected_pnl': pnl @ weights,
+                          'prob_profit': (pnl > 0) @ weights,
+                          'reward_risk': np.where(unbounded_loss, 0.0, reward_risk)},
+                         index=pd.Index(names, name='strategy'))
+    return table.sort_values(['reward_risk', 'expected_pnl'], ascending=False)
+
+
+def evaluate(strategies, forward, volatility, rate=0.0, horizon=None, low=None, high=None, step=0.25):
+    """Evaluate a dict of named strategies on one price grid and return P&L, breakevens and ranking."""
+    names = list(strategies)
+    packed = pack_strategies([strategies[name] for name in names])
+    low = forward * 0.9 if low is None else low
+    high = forward * 1.1 if high is None else high
+    prices = price_grid(low, high, step)
+
+    pnl = strategy_pnl(packed, prices, horizon, volatility, rate)
+    roots = dict(zip(names, breakevens(packed, pnl, prices, horizon, volatility, rate)))
+
+    ranking_horizon = packed['expiry'][packed['quantity'] != 0].min() if horizon is None else horizon
+    ranking = rank_strategies(names, pnl, prices, forward, volatility, ranking_horizon)
+    ranking['breakevens'] = [roots[name] for name in ranking.index]
+    return prices, pnl, ranking
@@ -3,7 +3,9 @@ import datetime
 import numpy as np
 import yfinance as yf
 
-df = yf.download(['ZN=F'], start='2023-08-05', end=datetime.date(2023, 9, 28).strftime('%Y-%m-%d'), interval='15m')
+from request_scheduler import scheduled_call
+
+df = scheduled_call('yahoo', yf.download, ['ZN=F'], start='2023-08-05', end=datetime.date(2023, 9, 28).strftime('%Y-%m-%d'), interval='15m')
 print(df)
 # Define a function to calculate technical indicators
 def calculate_technical_indicators(data):
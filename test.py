@@ -1,7 +1,8 @@
 import matplotlib.pyplot as plt
 import numpy as np
 import pandas as pd
-from copulas.multivariate import GaussianMultivariate
+
+from copula_scenarios import CopulaScenarios
 
 # Generate synthetic data (replace this with your actual returns data)
 np.random.seed(42)
@@ -17,8 +18,7 @@ selected_assets = ['USDJPY', 'Nasdaq', 'USTreasuryBond']
 selected_data = returns_df[selected_assets]
 
 # Step 1: Fit a Multivariate Copula Model (Gaussian Copula)
-copula = GaussianMultivariate()
-copula.fit(selected_data)
+copula = CopulaScenarios(selected_data, copula='gaussian', marginals='empirical')
 
 # Step 2: Generate Synthetic Data from the Copula Model
 synthetic_data = copula.sample(n_samples)
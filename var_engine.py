@@ -0,0 +1,194 @@
+import numpy as np
+import pandas as pd
+from scipy.optimize import minimize
+from scipy.signal import lfilter
+from scipy.stats import norm
+
+# VaR settings
+CONFIDENCE = 0.99  # VaR and expected shortfall confidence level
+LOOKBACK = 500  # Scenarios kept in the historical window
+EWMA_LAMBDA = 0.94  # RiskMetrics decay for the EWMA volatility
+METHODS = ['hs', 'fhs_ewma', 'fhs_garch', 'parametric']
+
+
+def load_factor_returns(symbols, interval='1d', parquet_dir=None, resample=None):
+    """Aligned log returns of the stored closes of each symbol, optionally resampled, e.g. '1D' for daily."""
+    # The store needs yfinance and creates its directory on import, the VaR and ES functions do not
+    from intraday_data_store import PARQUET_DIR, load_data_from_parquet, table_name_for
+
+    closes = {}
+    for symbol in symbols:
+        data = load_data_from_parquet(parquet_dir or PARQUET_DIR, table_name_for(symbol, interval))
+        if not data.empty:
+            closes[symbol] = data['Close'].squeeze()
+    prices = pd.DataFrame(closes)
+    if resample is not None:
+        prices = prices.resample(resample).last()
+    # Empty bins (weekends, holidays) are dropped before the diff, so the move across a gap lands on the next bar
+    prices = prices.dropna(how='all').ffill()
+    # Only a symbol's bars before its first close are left missing, no move there
+    return np.log(prices).diff().iloc[1:].fillna(0.0)
+
+
+def ewma_variance(returns, lam=EWMA_LAMBDA, initial=None):
+    """
+    EWMA variance of each column, sigma2[t] = lam * sigma2[t-1] + (1 - lam) * r[t-1]^2.
+
+    Row t is the forecast made before seeing row t, one extra row holds the forecast for the next period.
+    """
+    returns = np.asarray(returns, dtype=float)
+    initial = np.var(returns, axis=0) if initial is None else initial
+    squared = np.vstack([initial[None, :], returns ** 2])
+    # sigma2[t] = lam * sigma2[t-1] + (1 - lam) * r[t-1]^2 as one linear filter per column
+    variance, _ = lfilter([1 - lam], [1, -lam], squared[1:], axis=0, zi=lam * initial[None, :])
+    return np.vstack([initial[None, :], variance])
+
+
+def garch_variance(returns, omega, alpha, beta, initial=None):
+    """GARCH(1,1) variance recursion of each column with its own parameters, next-period forecast as last row."""
+    returns = np.asarray(returns, dtype=float)
+    initial = np.var(returns, axis=0) if initial is None else np.broadcast_to(initial, returns.shape[1])
+    omega, alpha, beta = (np.broadcast_to(x, returns.shape[1]) for x in (omega, alpha, beta))
+    variance = np.empty((len(returns) + 1, returns.shape[1]))
+    variance[0] = initial
+    for j in range(returns.shape[1]):
+        # sigma2[t+1] = omega + alpha * r[t]^2 + beta * sigma2[t] as a linear filter
+        variance[1:, j], _ = lfilter([1], [1, -beta[j]], omega[j] + alpha[j] * returns[:, j] ** 2,
+                                     zi=[beta[j] * initial[j]])
+    return variance
+
+
+def fit_garch(returns):
+    """Gaussian GARCH(1,1) (omega, alpha, beta) per column, with variance targeting on the sample variance."""
+    returns = np.asarray(returns, dtype=float)
+    params = np.empty((3, returns.shape[1]))
+    for j in range(returns.shape[1]):
+        r = returns[:, j]
+        sample_variance = r.var()
+
+        def neg_log_likelihood(x):
+            alpha, beta = x
+            if alpha + beta >= 0.999:
+                return 1e10
+            omega = sample_variance * (1 - alpha - beta)
+            variance = garch_variance(r[:, None], omega, alpha, beta, sample_variance)[:-1, 0]
+            return 0.5 * np.sum(np.log(variance) + r ** 2 / variance)
+
+        result = minimize(neg_log_likelihood, [0.05, 0.9], bounds=[(1e-6, 0.5), (0.0, 0.999)], method='L-BFGS-B')
+        alpha, beta = result.x
+        params[:, j] = sample_variance * (1 - alpha - beta), alpha, beta
+    return params
+
+
+def var_es(pnl, confidence=CONFIDENCE):
+    """Value at risk and expected shortfall, as positive losses, of the scenario P&L along axis 0."""
+    pnl = np.asarray(pnl, dtype=float)
+    cutoff = np.quantile(pnl, 1 - confidence, axis=0)
+    tail = np.where(pnl <= cutoff, pnl, np.nan)
+    return -cutoff, -np.nanmean(tail, axis=0)
+
+
+class VaREngine:
+    """
+    Historical, filtered historical and parametric VaR of a book over a rolling window of factor returns.
+
+    Scenarios are factor return vectors, one per historical day (or bar). Filtered HS rescales each day's
+    return by the ratio of today's volatility forecast to that day's, with EWMA or GARCH(1,1) volatility.
+    Linear positions are given as dollar exposures per factor and the P&L of every scenario is one matrix
+    product; non-linear books are fully revalued through a vectorised pricer. update() rolls the window by one
+    day and advances the volatility recursions without recomputing the history.
+    """
+
+    def __init__(self, returns, lookback=LOOKBACK, lam=EWMA_LAMBDA, garch=True):
+        returns = returns.iloc[-lookback:]
+        self.factors = list(returns.columns)
+        self.index = list(returns.index)
+        self.lookback = lookback
+        self.lam = lam
+        self.returns = returns.to_numpy(dtype=float)
+
+        variance = ewma_variance(self.returns, lam)
+        self.ewma_sigma = np.sqrt(variance[:-1])
+        self.ewma_next = variance[-1]
+        self.garch_params = None
+        if garch:
+            self.refit_garch()
+
+    def refit_garch(self):
+        """Fit GARCH(1,1) on the current window, done on a schedule rather than on every update."""
+        self.garch_params = fit_garch(self.returns)
+        variance = garch_variance(self.returns, *self.garch_params)
+        self.garch_sigma = np.sqrt(variance[:-1])
+        self.garch_next = variance[-1]
+
+    def update(self, new_returns):
+        """Append one or more days of factor returns (rows in self.factors order), dropping the oldest."""
+        new_returns = new_returns.reindex(columns=self.factors).fillna(0.0)
+        for when, row in zip(new_returns.index, new_returns.to_numpy(dtype=float)):
+            self.ewma_sigma = np.vstack([self.ewma_sigma, np.sqrt(self.ewma_next)])[-self.lookback:]
+            self.ewma_next = self.lam * self.ewma_next + (1 - self.lam) * row ** 2
+            if self.garch_params is not None:
+                omega, alpha, beta = self.garch_params
+                self.garch_sigma = np.vstack([self.garch_sigma, np.sqrt(self.garch_next)])[-self.lookback:]
+                self.garch_next = omega + alpha * row ** 2 + beta * self.garch_next
+            self.returns = np.vstack([self.returns, row])[-self.lookback:]
+            self.index = (self.index + [when])[-self.lookback:]
+
+    def scenarios(self, method='hs'):
+        """Factor return scenarios, shape (scenarios, factors)."""
+        if method == 'hs':
+            return self.returns
+        if method == 'fhs_ewma':
+            return self.returns / self.ewma_sigma * np.sqrt(self.ewma_next)
+        if method == 'fhs_garch':
+            return self.returns / self.garch_sigma * np.sqrt(self.garch_next)
+        raise ValueError(f"Unknown scenario method {method}")
+
+    def linear_pnl(self, exposures, method='hs'):
+        """Scenario P&L of dollar exposures per factor, (factors,) for a book or (factors, positions)."""
+        exposures = exposures.reindex(self.factors).fillna(0.0).to_numpy(dtype=float)
+        return self.scenarios(method) @ exposures
+
+    def revaluation_pnl(self, levels, revalue, method='hs'):
+        """
+        Scenario P&L from full revaluation.
+
+        levels are today's factor levels indexed by factor, e.g. futures prices. revalue maps an array of
+        levels of shape (scenarios, factors) to book values of shape (scenarios,) or (scenarios, positions).
+        """
+        levels = levels.reindex(self.factors).to_numpy(dtype=float)
+        shocked = levels * np.exp(self.scenarios(method))
+        return revalue(shocked) - revalue(levels[None, :])
+
+    def covariance(self, ewma=True):
+        if not ewma:
+            return np.cov(self.returns, rowvar=False)
+        weights = (1 - self.lam) * self.lam ** np.arange(len(self.returns))[::-1]
+        weights /= weights.sum()
+        return (self.returns * weights[:, None]).T @ self.returns
+
+    def parametric(self, exposures, confidence=CONFIDENCE, ewma=True):
+        """Delta-normal VaR and ES from the (EWMA) covariance of factor returns."""
+        exposures = exposures.reindex(self.factors).fillna(0.0).to_numpy(dtype=float)
+        sigma = np.sqrt(exposures @ self.covariance(ewma) @ exposures)
+        z = norm.ppf(confidence)
+        return z * sigma, sigma * norm.pdf(z) / (1 - confidence)
+
+    def report(self, exposures, confidence=CONFIDENCE):
+        """VaR and ES of a linear book by every method."""
+        rows = {}
+        for method in METHODS:
+            if method == 'parametric':
+                rows[method] = self.parametric(exposures, confidence)
+            elif method != 'fhs_garch' or self.garch_params is not None:
+                rows[method] = var_es(self.linear_pnl(exposures, method), confidence)
+        return pd.DataFrame.from_dict(rows, orient='index', columns=['VaR', 'ES'])
+
+
+if __name__ == "__main__":
+    from intraday_data_store import FUTURE_SYMBOLS
+
+    returns = load_factor_returns(FUTURE_SYMBOLS, interval='5m', resample='1D')
+    engine = VaREngine(returns)
+    book = pd.Series(1_000_000.0, index=returns.columns)  # $1mm long each future
+    print(engine.report(book))